@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoRest.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from voting.streaming import results_websocket  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    # Live results use a plain ASGI WebSocket handler; everything else is Django
+    if scope['type'] == 'websocket':
+        return await results_websocket(scope, receive, send)
+    return await django_application(scope, receive, send)
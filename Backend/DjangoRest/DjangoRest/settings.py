@@ -51,8 +51,8 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'voting.api.authentication.ProfileTokenAuthentication',
+        'voting.api.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -60,23 +60,39 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_THROTTLE_RATES': {
+        # Daily caps over all requests
         'anon': '100/day',
         'user': '1000/day',
+        # Per action, see voting.api.throttles.ActionRateThrottle
+        'read': '300/min',
+        'anon_read': '60/min',
+        'write': '60/min',
+        'anon_write': '10/min',
+        'comment': '10/min',
         'vote': '3/min',
         'anon_vote': '1/min',
+        # Per IP, see voting.api.throttles.JoinTokenThrottle
+        'join': '10/min',
     },
+    # Proxies in front of the app that append to X-Forwarded-For. Throttles key
+    # anonymous clients on the address the outermost of them saw; with 0 it is
+    # REMOTE_ADDR, so a client cannot choose its own key by sending the header
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'voting.api.throttles.AnonDailyThrottle',
+        'voting.api.throttles.UserDailyThrottle',
+        'voting.api.throttles.ActionRateThrottle',
     ],
 }
 
 MIDDLEWARE = [
+    'voting.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'voting.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -114,7 +130,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL: readers never wait for the writer. Transactions take the write
+        # lock at BEGIN and wait up to `timeout` seconds for it; see voting.db
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
+        # Keep connections open between requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas: DATABASE_REPLICAS=replica.sqlite3[,...] adds SQLite copies of
+# the primary as replica0, replica1, ... which `manage.py sync_replica --loop`
+# keeps up to date. Tests read the primary (MIRROR).
+for index, replica_path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(','))):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / replica_path,
+        'TEST': {'MIRROR': 'default'},
     }
+
+# Safe-method requests read from a replica lagging at most MAX_LAG seconds;
+# after a successful write the client (its user and session) reads from the
+# primary for STICKY_SECONDS, in every worker. See voting.replicas.
+REPLICATION = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 5,
+    'MAX_LAG': 5,
+    'LAG_CHECK_INTERVAL': 1,
+}
+
+DATABASE_ROUTERS = ['voting.replicas.ReplicaRouter']
+
+# Vote, comment and favorite writes that still find the database locked after
+# `timeout` are retried up to ATTEMPTS times, sleeping a random 0 to
+# min(MAX_DELAY, BASE_DELAY * 2^attempt) seconds in between.
+DATABASE_WRITES = {
+    'ATTEMPTS': 4,
+    'BASE_DELAY': 0.02,
+    'MAX_DELAY': 0.5,
+}
+
+# Responses to writes sent with an Idempotency-Key header are replayed to
+# retries with the same key for TTL seconds; `manage.py
+# purge_idempotency_keys` deletes older ones. See voting.idempotency.
+IDEMPOTENCY = {
+    'TTL': 24 * 3600,
 }
 
 
@@ -141,6 +211,10 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Provisioned voters start without a usable password and set one through a
+# password reset token (see PROVISIONING below)
+DJANGO_REST_MULTITOKENAUTH_REQUIRE_USABLE_PASSWORD = False
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -184,4 +258,165 @@ ADMIN_REORDER = (
 )
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Vote ingestion
+# 'sync' writes every ballot inside the request. 'queued' appends it to a local
+# queue file and acknowledges with 202; a drainer thread in each worker (or
+# `manage.py drain_votes`) writes the queue in batched transactions. The 202
+# carries a ticket; GET /api/events/<id>/tickets/<ticket>/ tells the voter
+# whether the ballot was applied or rejected, for TICKET_RETENTION seconds.
+VOTE_INGESTION = {
+    'MODE': os.environ.get('VOTE_INGESTION_MODE', 'sync'),
+    'QUEUE_PATH': BASE_DIR / 'vote_queue.sqlite3',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.2,  # seconds between drains when the queue is empty
+    'CLAIM_TIMEOUT': 60,  # seconds before a claimed but unacknowledged batch is retried
+    'AUTODRAIN': True,
+    'TICKET_RETENTION': 24 * 60 * 60,
+}
+
+# Live results (SSE at /api/events/<id>/results/stream/, WebSocket at
+# /ws/events/<id>/results/; both need the ASGI application).
+# 'local' fans out within one process; 'sqlite' shares deltas between worker
+# processes through BROKER_PATH as a stand-in for a real message broker.
+RESULTS_STREAM = {
+    'BROKER': os.environ.get('RESULTS_STREAM_BROKER', 'local'),
+    'BROKER_PATH': BASE_DIR / 'results_broker.sqlite3',
+    'BROKER_POLL_INTERVAL': 0.25,
+    'BROKER_RETENTION': 300,
+    'COALESCE_INTERVAL': 1.0,  # at most one frame per client per interval
+    'HEARTBEAT_INTERVAL': 15,
+}
+
+# Candidate vote counters are split over SHARDS rows per candidate; totals are
+# cached for CACHE_TIMEOUT seconds, which bounds how far a shown total lags
+# behind the votes. `manage.py reconcile_votes` checks or rebuilds them from
+# the Vote rows.
+VOTE_COUNTERS = {
+    'SHARDS': 8,
+    'CACHE_TIMEOUT': 2,
+}
+
+# Per-minute vote rollups behind events/<id>/timeline/ are recounted from the
+# Vote rows every INTERVAL seconds by a thread in each worker that took votes
+# (AUTO), or by `manage.py roll_up_votes`, rather than written with each vote.
+VOTE_ROLLUPS = {
+    'INTERVAL': 5,
+    'BATCH_SIZE': 5000,
+    'AUTO': True,
+}
+
+# Throttle token buckets live in BUCKET_PATH, shared by all worker processes;
+# `manage.py throttle_stats` reports allowed/denied requests per scope.
+THROTTLING = {
+    'BUCKET_PATH': BASE_DIR / 'throttle_buckets.sqlite3',
+    'STATS_RETENTION': 7 * 24 * 3600,
+}
+
+# Response cache versions, unread-count generations and primary pins, which
+# every worker process must agree on, live in PATH, a SQLite file like the
+# throttle buckets. See voting.shared_state.
+SHARED_STATE = {
+    'PATH': BASE_DIR / 'shared_state.sqlite3',
+}
+
+# ActivityLog rows are written behind the request by a thread in each worker:
+# bulk inserts of up to BATCH_SIZE every FLUSH_INTERVAL seconds, with at most
+# MAX_PENDING rows held in memory. 'sync' writes each row immediately.
+ACTIVITY_LOG = {
+    'MODE': 'buffered',
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 10_000,
+}
+
+# event_start / event_reminder notifications for everyone who favorited an
+# event, sent by `manage.py send_event_notifications [--loop]`. Reminders go
+# out REMINDER_LEADS seconds before the start; times missed by more than
+# MAX_LATENESS seconds (scheduler down) are skipped.
+NOTIFICATION_FANOUT = {
+    'CHUNK_SIZE': 5000,
+    'REMINDER_LEADS': [3600],
+    'MAX_LATENESS': 3600,
+    'LEASE_TIMEOUT': 120,
+    'INTERVAL': 30,
+}
+
+# Per-user unread notification counts are cached for up to TIMEOUT seconds
+# and dropped, in every worker, whenever the user's notifications change.
+UNREAD_COUNTS = {
+    'TIMEOUT': 300,
+}
+
+# Event list/detail bodies are cached under per-event versions (bumped by
+# writes and committed votes) for up to TIMEOUT seconds and revalidated with
+# ETag / If-None-Match.
+RESPONSE_CACHE = {
+    'TIMEOUT': 300,
+}
+
+# Per-route latency, query, view, render and response size metrics, served in
+# the Prometheus text format at /metrics to ALLOWED_IPS and staff. Requests
+# slower than SLOW_REQUEST_SECONDS are logged with their slowest queries, at
+# most once per route every SLOW_SAMPLE_INTERVAL seconds. See voting.metrics.
+METRICS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_SECONDS': 0.5,
+    'SLOW_SAMPLE_INTERVAL': 60,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Ballot and result exports (events/<id>/export/ballots/, .../results/) are
+# streamed CHUNK_SIZE rows at a time. See voting.exports.
+EXPORTS = {
+    'CHUNK_SIZE': 2000,
+}
+
+# Candidate and profile pictures are stored once per distinct content;
+# WORKERS threads per process render the thumbnail and WebP variants after
+# upload ('sync' renders them inside the request). Variants are served at
+# /api/images/<sha256>/<variant> with an immutable Cache-Control of
+# CACHE_MAX_AGE seconds; serializers pick one with ?image=. See voting.images.
+IMAGES = {
+    'MODE': 'background',
+    'WORKERS': 2,
+    'QUALITY': 80,
+    'DEFAULT_VARIANT': 'original',
+    'CACHE_MAX_AGE': 365 * 24 * 3600,
+}
+
+# Private event tokens resolved by events/join/ are kept in a per-process LRU
+# of CACHE_SIZE entries, dropped when the event is saved. See voting.event_tokens.
+EVENT_TOKENS = {
+    'CACHE_SIZE': 10_000,
+}
+
+# POST /api/events/import/ takes at most MAX_EVENTS events per request
+# (`manage.py import_events` has no limit); rows are inserted BATCH_SIZE per
+# statement. See voting.imports.
+IMPORTS = {
+    'MAX_EVENTS': 500,
+    'BATCH_SIZE': 500,
+}
+
+# Users authenticated by JWT are loaded with their profile in one query and
+# kept per process for TTL seconds (at most MAX_SIZE of them), dropped when
+# the user or profile is saved here. See voting.principals.
+PRINCIPAL_CACHE = {
+    'TTL': 30,
+    'MAX_SIZE': 10_000,
+}
+
+# manage.py provision_voters and POST /api/users/provision/ (staff only, at
+# most MAX_ROWS rows) create voters from CSV. Passwords are hashed by
+# HASH_WORKERS processes (one per CPU when None), HASH_CHUNK_SIZE per task;
+# rows without one get a setup token, shown as SETUP_URL with {token} filled
+# in when set. See voting.provisioning.
+PROVISIONING = {
+    'MAX_ROWS': 10_000,
+    'BATCH_SIZE': 1000,
+    'HASH_WORKERS': None,
+    'HASH_CHUNK_SIZE': 20,
+    'SETUP_URL': None,
+}
@@ -0,0 +1,135 @@
+"""
+Write-behind activity logging.
+
+``record()`` turns an action into an ``ActivityLog`` row and, once the
+surrounding transaction has committed, hands it to a per-process
+``ActivityLogWriter``: a background thread that writes rows with
+``bulk_create`` in batches of up to ``BATCH_SIZE``, at least every
+``FLUSH_INTERVAL`` seconds. At most ``MAX_PENDING`` rows wait in memory; past
+that the caller writes the backlog itself, so a slow database slows requests
+down instead of dropping audit rows. Pending rows are flushed at interpreter
+exit. ``MODE = 'sync'`` writes every row straight away.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'buffered',
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 10_000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'ACTIVITY_LOG', {}).get(name, DEFAULTS[name])
+
+
+class ActivityLogWriter(threading.Thread):
+    """Background thread that batches ``ActivityLog`` inserts for this process."""
+
+    def __init__(self, batch_size, flush_interval, max_pending):
+        super().__init__(name='activity-log-writer', daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.stopped = threading.Event()
+        # Only one thread writes at a time, so a batch is never split between two inserts
+        self.write_lock = threading.Lock()
+
+    def put(self, log):
+        try:
+            self.pending.put_nowait(log)
+        except queue.Full:
+            # Backpressure: write the backlog from the caller's thread
+            self.flush()
+            self.pending.put(log)
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write activity logs')
+            finally:
+                close_old_connections()
+
+    def take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything pending; returns the number of rows written."""
+        written = 0
+        with self.write_lock:
+            while batch := self.take_batch():
+                ActivityLog.objects.bulk_create(batch)
+                written += len(batch)
+        return written
+
+    def close(self):
+        """Stop the thread and write what is left."""
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to write %d activity logs on shutdown', self.pending.qsize())
+
+
+_writer = None
+_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = ActivityLogWriter(
+                get_setting('BATCH_SIZE'), get_setting('FLUSH_INTERVAL'), get_setting('MAX_PENDING'),
+            )
+            _writer.start()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def flush():
+    """Write pending rows now (tests, management commands, benchmarks)."""
+    return _writer.flush() if _writer is not None else 0
+
+
+def record(action_type, user=None, event=None, candidate=None, ip_address=None, action=''):
+    """Log ``action_type`` after the current transaction commits.
+
+    ``user``, ``event`` and ``candidate`` may be instances or ids.
+    """
+    log = ActivityLog(
+        user_id=_pk(user), action_type=action_type, event_id=_pk(event), candidate_id=_pk(candidate),
+        ip_address=ip_address, action=action[:100],
+    )
+    if get_setting('MODE') == 'sync':
+        transaction.on_commit(log.save)
+    else:
+        transaction.on_commit(lambda: get_writer().put(log))
+
+
+def _pk(value):
+    if value is None or isinstance(value, int):
+        return value
+    # Anonymous users have no row to point at
+    return value.pk if getattr(value, 'is_authenticated', True) else None
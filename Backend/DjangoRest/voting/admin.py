@@ -1,8 +1,11 @@
 # admin.py
+from django import forms
 from django.contrib import admin
 from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.forms import UserChangeForm
 from django.contrib.auth.models import User
+from . import email_index
 from .models import (
     Profile, Category, VotingEvent, Candidate,
     Comment, Favorite, Notification, ActivityLog, Report
@@ -15,8 +18,17 @@ class ProfileInline(admin.StackedInline):
     verbose_name_plural = 'Profile'
     fields = ['timezone', 'profile_picture']
 
+class CustomUserChangeForm(UserChangeForm):
+    def clean_email(self):
+        # Addresses are unique ignoring case (see voting.email_index)
+        email = self.cleaned_data.get('email')
+        if email and email_index.is_taken(email, exclude_user=self.instance):
+            raise forms.ValidationError('A user with this email already exists.')
+        return email
+
 # Extend User Admin
 class CustomUserAdmin(UserAdmin):
+    form = CustomUserChangeForm
     inlines = (ProfileInline,)
     list_display = ('username', 'email', 'date_joined', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
@@ -87,9 +99,10 @@ class ReportAdmin(admin.ModelAdmin):
 
 @admin.register(ActivityLog)
 class ActivityLogAdmin(admin.ModelAdmin):
-    list_display = ('user', 'action', 'ip_address', 'timestamp')
-    list_filter = ('timestamp',)
+    list_display = ('user', 'action_type', 'event_id', 'candidate_id', 'ip_address', 'timestamp')
+    list_filter = ('action_type', 'timestamp')
     search_fields = ('action', 'user__username')
+    list_select_related = ('user',)
     readonly_fields = ('timestamp',)
     date_hierarchy = 'timestamp'
 
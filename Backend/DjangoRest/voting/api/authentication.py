@@ -0,0 +1,48 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .. import principals
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that takes the user, with its profile, from ``voting.principals``."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != 'id':
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+        user = principals.get_user(user_id)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise exceptions.AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class ProfileTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that reads the token, its user and the profile in one query."""
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user__profile').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token.user.tzinfo = principals.timezone_of(token.user)
+        return (token.user, token)
@@ -0,0 +1,17 @@
+from rest_framework.filters import OrderingFilter
+
+
+class RankedOrderingFilter(OrderingFilter):
+    """``OrderingFilter`` that orders search results by relevance unless ``?ordering=`` is given.
+
+    Applies when the queryset carries a ``search_rank`` annotation
+    (see ``voting.search.search_events``); lower ranks come first.
+    """
+    rank_ordering = ['search_rank', 'id']
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            params = request.query_params.get(self.ordering_param)
+            if not params or not self.remove_invalid_fields(queryset, params.split(','), view, request):
+                return self.rank_ordering
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,225 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db.models import Model, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Seek pagination over the queryset's ordering, with ``id`` as the tiebreaker.
+
+    The cursor holds the ordering values of the last (or first) row shown, and
+    the next page is ``WHERE (created_at, id) < (:created_at, :id)`` instead of
+    an ``OFFSET`` scan, so deep pages cost the same as the first one and there
+    is no ``COUNT(*)``. Works with any ``OrderingFilter`` ordering over plain,
+    non-null columns or annotations.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.bind(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        queryset = queryset.order_by(*[
+            ('-' if descending != reverse else '') + name for name, descending in self.ordering
+        ])
+        if cursor is not None:
+            queryset = queryset.filter(self.seek(cursor['values'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def bind(self, queryset):
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self.get_ordering(queryset)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = []
+        for item in queryset.query.order_by or self.model._meta.ordering:
+            if not isinstance(item, str) or '__' in item:
+                raise ImproperlyConfigured(
+                    f'{self.__class__.__name__} only supports ordering by fields of the model, got {item!r}'
+                )
+            name = item.lstrip('-')
+            ordering.append(('id' if name == 'pk' else name, item.startswith('-')))
+        if not any(name == 'id' for name, _ in ordering):
+            ordering.append(('id', ordering[-1][1] if ordering else False))
+        return ordering
+
+    def seek(self, values, reverse):
+        """``(a, b, id) > (:a, :b, :id)`` spelled out for mixed directions."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column so the planner can seek the index
+        # instead of scanning from the start of it
+        name, descending = self.ordering[0]
+        lookup = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & condition
+
+    def get_field(self, name):
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def signature(self):
+        return ','.join(('-' if descending else '') + name for name, descending in self.ordering)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if payload['o'] != self.signature() or len(payload['v']) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, payload['v'])
+            ]
+        except (BinasciiError, FieldDoesNotExist, KeyError, TypeError, UnicodeEncodeError,
+                ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'values': values, 'reverse': bool(payload.get('r'))}
+
+    def cursor_for(self, obj, reverse=False):
+        """The opaque cursor that continues after (or, reversed, before) ``obj``."""
+        values = []
+        for name, _ in self.ordering:
+            value = getattr(obj, name)
+            values.append(value.pk if isinstance(value, Model) else value)
+        return self.encode_values(values, reverse)
+
+    def encode_values(self, values, reverse=False):
+        payload = {'o': self.signature(), 'v': values}
+        if reverse:
+            payload['r'] = 1
+        return urlsafe_b64encode(json.dumps(payload, default=self.encode_value).encode()).decode('ascii')
+
+    @staticmethod
+    def encode_value(value):
+        # Not DjangoJSONEncoder: it rounds datetimes to milliseconds, and the seek
+        # needs the exact value to match ties
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def encode_cursor(self, obj, reverse):
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.cursor_for(obj, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class CommentReplyPagination(KeysetPagination):
+    page_size = 10
+
+
+class DeltaPagination(KeysetPagination):
+    """Forward-only pages over ``id`` for polling clients.
+
+    Every response carries ``since``, the cursor to send with the next poll.
+    Without ``?since=`` the response has no rows and a cursor at the newest
+    row, so a client asks for one when it loads and afterwards only ever
+    receives rows created after it. Ids of committed rows only grow because
+    SQLite serializes writers.
+    """
+    cursor_query_param = 'since'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = queryset.order_by('id')
+        self.request = request
+        if request.query_params.get(self.cursor_query_param):
+            results = super().paginate_queryset(queryset, request, view)
+            if self.decode_cursor(request)['reverse']:
+                raise NotFound(self.invalid_cursor_message)
+            return results
+        self.bind(queryset)
+        self.page = []
+        self.has_next = False
+        self.head = queryset.values_list('id', flat=True).last() or 0
+        return []
+
+    def get_paginated_response(self, data):
+        if self.page:
+            since = self.cursor_for(self.page[-1])
+        elif self.request.query_params.get(self.cursor_query_param):
+            since = self.request.query_params[self.cursor_query_param]
+        else:
+            since = self.encode_values([self.head])
+        return Response({'since': since, 'has_more': self.has_next, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['since', 'results'],
+            'properties': {
+                'since': {'type': 'string'},
+                'has_more': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
@@ -6,7 +6,12 @@ class IsEventCreatorOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.created_by == request.user
-    
+
+
+class IsEventCreatorOrStaff(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_staff or obj.created_by == request.user
+
 class IsCandidateEditable(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
@@ -1,5 +1,9 @@
 from .user import UserRegisterSerializer, UserSerializer, ProfileSerializer
-from .event import CategorySerializer, CandidateSerializer, VotingEventSerializer, VotingEventCreateSerializer
+from .event import (
+    CategorySerializer, CandidateSerializer, VotingEventSerializer, VotingEventCreateSerializer,
+    VotingEventImportSerializer,
+)
 from .comment import CommentSerializer
 from .notification import NotificationSerializer
-from .report import ReportSerializer
\ No newline at end of file
+from .report import ReportSerializer
+from .activity import ActivityLogSerializer
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+from voting.models import ActivityLog
+
+class ActivityLogSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = ActivityLog
+        fields = [
+            'id', 'action_type', 'user', 'username', 'event', 'candidate',
+            'action', 'ip_address', 'timestamp'
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Event owners see that votes happened, not who cast them
+        if self.context.get('hide_voters') and instance.action_type == 'vote':
+            data.update(user=None, username=None, ip_address=None)
+        return data
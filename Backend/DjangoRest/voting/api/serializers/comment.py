@@ -1,15 +1,41 @@
 from rest_framework import serializers
+from ...comment_tree import load_replies
 from ...models import Comment
+from ...models.comments import MAX_DEPTH
 
 class CommentSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     replies = serializers.SerializerMethodField()
+    has_more_replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'content', 'parent_comment', 'created_at', 'replies']
-        read_only_fields = ['user', 'created_at']
+        fields = [
+            'id', 'user', 'content', 'parent_comment', 'created_at',
+            'depth', 'reply_count', 'has_more_replies', 'replies'
+        ]
+        read_only_fields = ['user', 'created_at', 'depth', 'reply_count']
+
+    def validate_parent_comment(self, parent):
+        if self.instance is not None:
+            # path, depth and the reply counts are set when a comment is created
+            if parent != self.instance.parent_comment:
+                raise serializers.ValidationError("A comment cannot be moved to another parent.")
+            return parent
+        if parent is None:
+            return parent
+        view = self.context.get('view')
+        if view is not None and str(parent.event_id) != str(view.kwargs.get('event_pk')):
+            raise serializers.ValidationError("Parent comment belongs to another event.")
+        if parent.depth >= MAX_DEPTH:
+            raise serializers.ValidationError(f"Replies can be nested at most {MAX_DEPTH} levels deep.")
+        return parent
 
     def get_replies(self, obj):
-        replies = Comment.objects.filter(parent_comment=obj)
-        return CommentSerializer(replies, many=True).data
\ No newline at end of file
+        # CommentViewSet loads whole windows of the tree up front (see voting.comment_tree)
+        if not hasattr(obj, 'loaded_replies'):
+            load_replies([obj])
+        return CommentSerializer(obj.loaded_replies, many=True, context=self.context).data
+
+    def get_has_more_replies(self, obj):
+        return obj.reply_count > len(getattr(obj, 'loaded_replies', ()))
@@ -1,8 +1,10 @@
+from django.db import models
 from django.utils import timezone
 from rest_framework import serializers
-from ...models import Category, Candidate, VotingEvent
+from ... import counters, imports
+from ...models import Category, Candidate, Vote, VotingEvent
+from .fields import PictureField
 from django.utils.timezone import is_aware, make_aware
-import pytz
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,17 +12,40 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 class CandidateSerializer(serializers.ModelSerializer):
+    profile_pic = PictureField(required=False, allow_null=True)
+    votes_count = serializers.SerializerMethodField()
+
     class Meta:
         model = Candidate
         fields = ['id', 'name', 'description', 'profile_pic', 'votes_count']
         read_only_fields = ['id','votes_count']
 
+    def get_votes_count(self, obj):
+        # Views may pass totals for a whole page as context['vote_counts']
+        vote_counts = self.context.get('vote_counts')
+        if vote_counts is None or obj.id not in vote_counts:
+            vote_counts = counters.get_counts(obj.voting_event_id)
+        return vote_counts.get(obj.id, obj.votes_count)
+
+
+class VotingEventListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Fetch vote totals for the whole page at once instead of per event
+        events = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['vote_counts'] = {
+            candidate_id: votes
+            for counts in counters.get_counts_for_events([event.id for event in events]).values()
+            for candidate_id, votes in counts.items()
+        }
+        return super().to_representation(events)
+
 
 class VotingEventSerializer(serializers.ModelSerializer):
     candidates = CandidateSerializer(many=True, required=False)
     categories = CategorySerializer(many=True)
     status = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
+    event_token = serializers.SerializerMethodField()
 
     class Meta:
         model = VotingEvent
@@ -29,37 +54,47 @@ class VotingEventSerializer(serializers.ModelSerializer):
             'created_by', 'categories', 'candidates', 'status', 'is_favorited'
         ]
         read_only_fields = ['created_by', 'event_token']
+        list_serializer_class = VotingEventListSerializer
 
     def get_status(self, obj):
-        request = self.context.get('request')
-        now = timezone.now()
-
-         # Convert to user's timezone if available
-        if request and request.user.is_authenticated:
-            try:
-                profile = request.user.profile
-                if profile.timezone:
-                    user_tz = pytz.timezone(profile.timezone)
-                    now = now.astimezone(user_tz)  # Convert UTC to user's local time
-            except (AttributeError, pytz.UnknownTimeZoneError):
-                # Handle missing profile or invalid timezone
-                pass
-
-        # Ensure event times are in the same timezone as 'now'
-        start_time = obj.start_time.astimezone(now.tzinfo)
-        end_time = obj.end_time.astimezone(now.tzinfo)
-
-        if start_time <= now <= end_time:
+        # Querysets built with VotingEvent.objects.for_listing() carry the status
+        status = getattr(obj, 'current_status', None)
+        if status is not None:
+            return status
+
+        # Comparing aware datetimes is independent of the user's timezone, so
+        # 'now' only has to be read once per request
+        now = self.context.setdefault('now', timezone.now())
+        if obj.start_time <= now <= obj.end_time:
             return 'ongoing'
-        return 'upcoming' if now < start_time else 'ended'
+        return 'upcoming' if now < obj.start_time else 'ended'
+
+    def get_event_token(self, obj):
+        # Only the owner may hand the token out. The response cache needs every
+        # token and hides them per user itself (see voting.response_cache)
+        if self.context.get('reveal_event_tokens'):
+            return obj.event_token
+        user = self.context.get('request').user
+        return obj.event_token if user.is_authenticated and user.id == obj.created_by_id else None
 
     def get_is_favorited(self, obj):
+        favorited = getattr(obj, 'favorited', None)
+        if favorited is not None:
+            return favorited
         user = self.context.get('request').user
         return user.is_authenticated and obj.favorites.filter(user=user).exists()
 
 
+class CandidateWriteSerializer(CandidateSerializer):
+    # Names an existing candidate when an event is updated
+    id = serializers.IntegerField(required=False)
+
+    class Meta(CandidateSerializer.Meta):
+        read_only_fields = ['votes_count']
+
+
 class VotingEventCreateSerializer(serializers.ModelSerializer):
-    candidates = CandidateSerializer(many=True)
+    candidates = CandidateWriteSerializer(many=True)
     categories = serializers.PrimaryKeyRelatedField(many=True, queryset=Category.objects.all())
 
     class Meta:
@@ -67,51 +102,71 @@ class VotingEventCreateSerializer(serializers.ModelSerializer):
         fields = ['event_name', 'start_time', 'end_time', 'is_private', 'categories', 'candidates']
 
     def validate(self, data):
-        start_time = data['start_time']
-        end_time = data['end_time']
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
         if not is_aware(start_time):
             start_time = make_aware(start_time)
         if not is_aware(end_time):
             end_time = make_aware(end_time)
         if start_time >= end_time:
             raise serializers.ValidationError("End time must be after start time")
+        if self.instance is not None and 'candidates' in data:
+            self.validate_candidate_changes(data['candidates'])
         return data
 
-    def create(self, validated_data):
-        categories_data = validated_data.pop('categories', [])
-        candidates_data = validated_data.pop('candidates', [])
+    def validate_candidate_changes(self, candidates):
+        existing = set(self.instance.candidates.values_list('id', flat=True))
+        listed = {candidate['id'] for candidate in candidates if candidate.get('id') is not None}
+        if unknown := listed - existing:
+            raise serializers.ValidationError({
+                'candidates': f'Not candidates of this event: {", ".join(map(str, sorted(unknown)))}.'
+            })
+        removed = existing - listed
+        if removed and (voted := sorted(
+            Vote.objects.filter(candidate_id__in=removed).values_list('candidate_id', flat=True).distinct()
+        )):
+            raise serializers.ValidationError({
+                'candidates': f'Candidates with votes cannot be removed: {", ".join(map(str, voted))}.'
+            })
 
-        event = VotingEvent.objects.create(**validated_data)
-        
-        event.categories.set(categories_data)
+    def create(self, validated_data):
+        created_by = validated_data.pop('created_by')
+        return imports.create_events([validated_data], created_by)[0]
 
-        for candidate_data in candidates_data:
-            Candidate.objects.create(voting_event=event, **candidate_data)
-        return event
-    
     def update(self, instance, validated_data):
-        # Extract nested data
-        categories_data = validated_data.pop('categories', [])
-        candidates_data = validated_data.pop('candidates', [])
+        # Nested lists left out of a partial update stay as they are
+        categories_data = validated_data.pop('categories', None)
+        candidates_data = validated_data.pop('candidates', None)
 
-        # Update the VotingEvent instance
         instance = super().update(instance, validated_data)
+        if categories_data is not None:
+            instance.categories.set(categories_data)
+        if candidates_data is not None:
+            imports.sync_candidates(instance, candidates_data)
+        return instance
+
+
+class EventImportListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        # Every category id of the batch checked with one query
+        wanted = {category for row in attrs for category in row.get('categories', [])}
+        if unknown := wanted - set(Category.objects.filter(id__in=wanted).values_list('id', flat=True)):
+            raise serializers.ValidationError(f'Unknown categories: {", ".join(map(str, sorted(unknown)))}.')
+        return attrs
+
+
+class CandidateImportSerializer(serializers.ModelSerializer):
+    # Only the plain fields, which keeps validating thousands of nested rows cheap
+    class Meta:
+        model = Candidate
+        fields = ['name', 'description']
+
+
+class VotingEventImportSerializer(VotingEventCreateSerializer):
+    """One row of a bulk import; use with ``many=True``."""
+    candidates = CandidateImportSerializer(many=True, required=False)
+    # Plain ids, checked for the whole batch by EventImportListSerializer
+    categories = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
 
-        # Update categories (many-to-many field)
-        instance.categories.set(categories_data)
-
-        # Update or create candidates
-        existing_candidates = {c.id: c for c in instance.candidates.all()}
-        for candidate_data in candidates_data:
-            candidate_id = candidate_data.get('id')
-            if candidate_id and candidate_id in existing_candidates:
-                # Update existing candidate
-                candidate = existing_candidates[candidate_id]
-                for key, value in candidate_data.items():
-                    setattr(candidate, key, value)
-                candidate.save()
-            else:
-                # Create new candidate
-                Candidate.objects.create(voting_event=instance, **candidate_data)
-
-        return instance
\ No newline at end of file
+    class Meta(VotingEventCreateSerializer.Meta):
+        list_serializer_class = EventImportListSerializer
@@ -0,0 +1,16 @@
+from rest_framework import serializers
+
+from ... import images
+
+
+class PictureField(serializers.ImageField):
+    """An uploaded picture, shown as the variant named by the request's ``?image=`` parameter."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = images.variant_url(value.name, images.requested_variant(self.context))
+        if url is None:
+            return super().to_representation(value)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
@@ -1,7 +1,24 @@
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from ... import email_index
 from ...models import Profile
+from .fields import PictureField
+
+EMAIL_TAKEN = "A user with this email already exists."
+
+
+def save_user(user):
+    """Save ``user``, turning an address taken meanwhile (the index's unique constraint) into a 400."""
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        if user.email and email_index.is_taken(user.email, exclude_user=user if user.pk else None):
+            raise serializers.ValidationError({"email": EMAIL_TAKEN})
+        raise
+
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -20,20 +37,22 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         email = attrs.get('email')
         if not email:
             raise serializers.ValidationError({"email": "Email is required."})
-        if User.objects.filter(email=email).exists():
-            raise serializers.ValidationError({"email": "A user with this email already exists."})
+        if email_index.is_taken(email):
+            raise serializers.ValidationError({"email": EMAIL_TAKEN})
         return attrs
 
     def create(self, validated_data):
-        user = User.objects.create(
+        user = User(
             username=validated_data['username'],
             email=validated_data.get('email', '')
         )
         user.set_password(validated_data['password'])
-        user.save()
+        save_user(user)
         return user
 
 class ProfileSerializer(serializers.ModelSerializer):
+    profile_picture = PictureField(required=False, allow_null=True)
+
     class Meta:
         model = Profile
         fields = ['timezone', 'profile_picture', 'birthday']
@@ -45,11 +64,16 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'profile']
 
+    def validate_email(self, value):
+        if email_index.is_taken(value, exclude_user=self.instance):
+            raise serializers.ValidationError(EMAIL_TAKEN)
+        return value
+
     def update(self, instance, validated_data):
         profile_data = validated_data.pop('profile', {})
         instance.username = validated_data.get('username', instance.username)
         instance.email = validated_data.get('email', instance.email)
-        instance.save()
+        save_user(instance)
         profile = instance.profile
         for attr, value in profile_data.items():
             setattr(profile, attr, value)
@@ -1,10 +1,90 @@
 # throttles.py
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
 
+from ..ratelimit import get_store
 
-class VoteThrottle(UserRateThrottle):
-    scope = 'vote'
 
+class TokenBucketThrottle(SimpleRateThrottle):
+    """``SimpleRateThrottle`` on a shared token bucket (see ``voting.ratelimit``).
 
-class AnonVoteThrottle(AnonRateThrottle):
-    scope = 'anon_vote'
+    A rate of ``'3/min'`` allows bursts of 3 requests and refills one token
+    every 20 seconds. Users are identified by id, anonymous clients by IP
+    (``get_ident``, which only trusts ``NUM_PROXIES`` entries of
+    X-Forwarded-For).
+    """
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return str(ident)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+        allowed, self._wait = get_store().take(self.scope, ident, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class UserDailyThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return str(request.user.pk)
+
+
+class AnonDailyThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class ActionRateThrottle(TokenBucketThrottle):
+    """Rate by what the request does rather than by view.
+
+    The scope comes from ``view.throttle_scopes[view.action]``, falling back to
+    ``'read'`` for safe methods and ``'write'`` otherwise. Anonymous clients
+    use ``'anon_<scope>'`` when such a rate is configured.
+    """
+
+    def allow_request(self, request, view):
+        # The scope, and so the rate, is only known once the request is seen;
+        # until then get_rate() leaves the throttle without one
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if scope is None:
+            scope = 'read' if request.method in SAFE_METHODS else 'write'
+        anon_scope = f'anon_{scope}'
+        if not (request.user and request.user.is_authenticated) and anon_scope in self.THROTTLE_RATES:
+            return anon_scope
+        return scope
+
+    def get_rate(self):
+        # Unconfigured scopes are not throttled
+        return self.THROTTLE_RATES.get(self.scope)
+
+
+class JoinTokenThrottle(TokenBucketThrottle):
+    """Token guesses per client IP, signed in or not, so extra accounts buy no extra guesses."""
+    scope = 'join'
+
+    def get_cache_key(self, request, view):
+        return self.get_ident(request)
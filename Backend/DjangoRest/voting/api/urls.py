@@ -1,10 +1,11 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
 from .views import *
+from ..images import variant_view
 
 router = DefaultRouter()
 router.register(r'events', VotingEventViewSet, basename='votingevent')  # Add basename
@@ -19,6 +20,8 @@ urlpatterns = [
     path('', include(router.urls)),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('events/<int:pk>/results/stream/', results_stream, name='votingevent-results-stream'),
+    re_path(r'^images/(?P<digest>[0-9a-f]{64})/(?P<variant>\w+)$', variant_view, name='image-variant'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/password/reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
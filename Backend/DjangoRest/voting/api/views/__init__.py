@@ -2,4 +2,5 @@ from .event import VotingEventViewSet, CandidateViewSet, CategoryListView
 from .user import UserViewSet, RegisterView
 from .comment import CommentViewSet
 from .notification import NotificationViewSet
-from .report import ReportViewSet
\ No newline at end of file
+from .report import ReportViewSet
+from .results import results_stream
\ No newline at end of file
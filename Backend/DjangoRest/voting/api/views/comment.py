@@ -1,17 +1,63 @@
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
 
+from ... import db
+from ...comment_tree import load_replies
 from ...models import Comment, VotingEvent
+from ..pagination import KeysetPagination, CommentReplyPagination
 from ..serializers import CommentSerializer
 
 class CommentViewSet(viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    throttle_scopes = {'create': 'comment', 'update': 'comment', 'partial_update': 'comment'}
 
     def get_queryset(self):
-        event_id = self.kwargs.get('event_pk')
-        return Comment.objects.filter(event_id=event_id, parent_comment__isnull=True)
+        queryset = Comment.objects.filter(event_id=self.kwargs.get('event_pk')).select_related('user')
+        if self.action == 'list':
+            # Newest threads first
+            queryset = queryset.filter(parent_comment__isnull=True).order_by('-created_at', '-id')
+        return queryset
+
+    def get_tree_window(self):
+        """``?depth=`` levels of replies and ``?replies=`` replies per comment to inline."""
+        def bounded(name, default, upper):
+            try:
+                return max(0, min(int(self.request.query_params.get(name, default)), upper))
+            except ValueError:
+                return default
+        return bounded('depth', 3, 10), bounded('replies', 5, 50)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        threads = load_replies(page, *self.get_tree_window())
+        return self.get_paginated_response(self.get_serializer(threads, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        comment = self.get_object()
+        load_replies([comment], *self.get_tree_window())
+        return Response(self.get_serializer(comment).data)
+
+    @action(detail=True, methods=['get'], pagination_class=CommentReplyPagination)
+    def replies(self, request, event_pk=None, pk=None):
+        """Load more: the next page of a comment's direct replies, each with its own subtree window."""
+        comment = self.get_object()
+        page = self.paginate_queryset(
+            Comment.objects.filter(event_id=comment.event_id, parent_comment=comment)
+            .select_related('user').order_by('created_at', 'id')
+        )
+        depth, per_node = self.get_tree_window()
+        replies = load_replies(page, max(depth - 1, 0), per_node)
+        return self.get_paginated_response(self.get_serializer(replies, many=True).data)
 
     def perform_create(self, serializer):
-        event = VotingEvent.objects.get(pk=self.kwargs.get('event_pk'))
-        serializer.save(user=self.request.user, event=event)
\ No newline at end of file
+        event = get_object_or_404(VotingEvent, pk=self.kwargs.get('event_pk'))
+        # The insert, its path and the parent's reply count commit together
+        db.run_in_transaction(serializer.save, user=self.request.user, event=event)
+
+    def perform_update(self, serializer):
+        db.run_in_transaction(serializer.save)
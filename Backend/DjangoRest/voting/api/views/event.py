@@ -1,35 +1,62 @@
-from uuid import uuid4
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import Throttled
+from rest_framework.exceptions import Throttled, ValidationError
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django.utils import timezone
-from django.db.models import F
-from rest_framework.filters import OrderingFilter
+from django.utils.dateparse import parse_datetime
 
+from ... import (
+    activity, counters, db, event_tokens, exports, idempotency, imports, ingest, principals, response_cache,
+    rollups, search as event_search,
+)
 from ...models import VotingEvent, Candidate, Category, Favorite, ActivityLog, Vote
-from ..throttles import VoteThrottle, AnonVoteThrottle
-from ..serializers import VotingEventSerializer, VotingEventCreateSerializer, CandidateSerializer, CategorySerializer
-from ..permissions import IsEventCreatorOrReadOnly, IsCandidateEditable
+from ...signals import votes_committed
+from ..filters import RankedOrderingFilter
+from ..pagination import KeysetPagination
+from ..renderers import CSVRenderer, NDJSONRenderer
+from ..serializers import (
+    VotingEventSerializer, VotingEventCreateSerializer, VotingEventImportSerializer, CandidateSerializer,
+    CategorySerializer, ActivityLogSerializer,
+)
+from ..permissions import IsEventCreatorOrReadOnly, IsEventCreatorOrStaff, IsCandidateEditable
+from ..throttles import JoinTokenThrottle
 
 class VotingEventViewSet(viewsets.ModelViewSet):
-    filter_backends = [OrderingFilter]
+    filter_backends = [RankedOrderingFilter]
     ordering_fields = ['created_at', 'start_time', 'event_name']
-    ordering = ['-created_at'] 
+    ordering = ['-created_at', '-id']
     serializer_class = VotingEventSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsEventCreatorOrReadOnly]
     queryset = VotingEvent.objects.all().order_by('-created_at')
-    throttle_classes = [VoteThrottle, AnonVoteThrottle]
+    # Scopes for ActionRateThrottle; other actions are 'read' or 'write'
+    throttle_scopes = {'vote': 'vote'}
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:  # 👈 Include update actions
             return VotingEventCreateSerializer
         return VotingEventSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # These go through the response cache, which hides the tokens per user
+        context['reveal_event_tokens'] = self.action in ('list', 'retrieve', 'join')
+        return context
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action == 'join':
+            throttles.append(JoinTokenThrottle())
+        return throttles
+
     def get_queryset(self):
-        queryset = VotingEvent.objects.all().order_by('-created_at')
+        queryset = VotingEvent.objects.all().order_by('-created_at', '-id')
         user = self.request.user
 
         # Filtering parameters
@@ -38,60 +65,218 @@ class VotingEventViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get('search')
         is_private = self.request.query_params.get('is_private')
 
+        # Status and favorited flags are computed in SQL (see VotingEventQuerySet)
+        queryset = queryset.for_listing(user)
+
         # Apply filters
-        if status:
-            now = timezone.now()
-            if status == 'ongoing':
-                queryset = queryset.filter(start_time__lte=now, end_time__gte=now)
-            elif status == 'upcoming':
-                queryset = queryset.filter(start_time__gt=now)
-            elif status == 'ended':
-                queryset = queryset.filter(end_time__lt=now)
+        if status in ('ongoing', 'upcoming', 'ended'):
+            queryset = queryset.filter(current_status=status)
 
         if category:
             queryset = queryset.filter(categories__name=category)
 
         if search:
-            queryset = queryset.filter(event_name__icontains=search)
+            # Ranked full-text match over event, candidate and category names
+            queryset = event_search.search_events(queryset, search)
 
         if is_private:
             queryset = queryset.filter(is_private=is_private.lower() == 'true')
 
-        return queryset.prefetch_related('categories', 'candidates')
+        return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Shared bodies cached per list version; see voting.response_cache
+        return response_cache.cached_response(
+            request, response_cache.list_key(request),
+            lambda: super(VotingEventViewSet, self).list(request, *args, **kwargs),
+            many=True,
+            time_dependent='status' in request.query_params,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return response_cache.cached_response(
+            request, response_cache.detail_key(request, kwargs['pk']),
+            lambda: super(VotingEventViewSet, self).retrieve(request, *args, **kwargs),
+            many=False,
+        )
 
     def perform_create(self, serializer):
-        event = serializer.save(created_by=self.request.user)
+        # Private events get their token as they are inserted (voting.imports)
+        event = db.run_in_transaction(serializer.save, created_by=self.request.user)
+        activity.record('event_create', self.request.user, event, ip_address=self.get_client_ip(self.request))
+
+    def perform_update(self, serializer):
+        event = db.run_in_transaction(serializer.save)
+        if event.is_private and not event.event_token:
+            event_tokens.assign(event)
+        activity.record('event_update', self.request.user, event, ip_address=self.get_client_ip(self.request))
+
+    def perform_destroy(self, instance):
+        event_id = instance.id
+        instance.delete()
+        activity.record('event_delete', self.request.user, event_id, ip_address=self.get_client_ip(self.request))
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def join(self, request):
+        """The private event whose ``event_token`` is posted as ``{"token": ...}``."""
+        event_id = event_tokens.resolve(request.data.get('token'))
+        if event_id is not None:
+            self.kwargs['pk'] = event_id
+            try:
+                return self.retrieve(request, pk=event_id)
+            except Http404:
+                # Deleted in another worker since this one cached the token
+                event_tokens.forget(event_id)
+        return Response({'error': 'No event has this token.'}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAuthenticated])
+    @idempotency.idempotent
+    def bulk_import(self, request):
+        """Create a batch of events with nested candidates and category ids: all of them, or none.
+
+        Takes a list of events, or ``{"events": [...]}``; errors are listed per event.
+        """
+        rows = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'Expected a list of events, or {"events": [...]}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > imports.get_setting('MAX_EVENTS'):
+            return Response({'error': f'At most {imports.get_setting("MAX_EVENTS")} events per import.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = VotingEventImportSerializer(data=rows, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        ip_address = self.get_client_ip(request)
 
-        if event.is_private:
-            event.event_token = uuid4().hex[:10].upper()
-            event.save()
+        def write():
+            events = imports.create_events(serializer.validated_data, request.user)
+            for event in events:
+                activity.record('event_create', request.user, event, ip_address=ip_address)
+            return events
 
+        events = db.run_in_transaction(write)
+        return Response({'created': len(events), 'events': [event.id for event in events]},
+                        status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
         event = self.get_object()
         if request.method == 'POST':
-            Favorite.objects.get_or_create(user=request.user, event=event)
+            db.run_in_transaction(Favorite.objects.get_or_create, user=request.user, event=event)
+            activity.record('favorite', request.user, event, ip_address=self.get_client_ip(request))
             return Response({'status': 'favorited'})
         else:
-            Favorite.objects.filter(user=request.user, event=event).delete()
+            db.run_in_transaction(Favorite.objects.filter(user=request.user, event=event).delete)
+            activity.record('unfavorite', request.user, event, ip_address=self.get_client_ip(request))
             return Response({'status': 'unfavorited'})
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsEventCreatorOrStaff])
+    def audit(self, request, pk=None):
+        """Audit trail of the event, newest first; voters stay hidden from non-staff owners."""
+        event = self.get_object()
+        logs = ActivityLog.objects.filter(event_id=event.id).select_related('user').order_by('-timestamp', '-id')
+        if action_type := request.query_params.get('action_type'):
+            logs = logs.filter(action_type=action_type)
+        page = self.paginate_queryset(logs)
+        serializer = ActivityLogSerializer(page, many=True, context={
+            'request': request, 'hide_voters': not request.user.is_staff,
+        })
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """Votes per ``?resolution=minute|hour|day`` (default hour), read from the per-minute rollups.
+
+        ``?start=`` and ``?end=`` (ISO 8601) narrow the window; ``?tz=`` sets
+        where hours and days begin (default: the user's profile time zone).
+        """
+        event = self.get_object()
+        resolution = request.query_params.get('resolution', 'hour')
+        if resolution not in rollups.RESOLUTIONS:
+            raise ValidationError({'resolution': f'One of {", ".join(rollups.RESOLUTIONS)}.'})
+        bounds = {}
+        for name in ('start', 'end'):
+            if value := request.query_params.get(name):
+                moment = parse_datetime(value)
+                if moment is None:
+                    raise ValidationError({name: 'An ISO 8601 date and time is required.'})
+                bounds[name] = moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+        tz_name = request.query_params.get('tz')
+        try:
+            tzinfo = ZoneInfo(tz_name) if tz_name else principals.timezone_of(request.user)
+        except (ValueError, ZoneInfoNotFoundError):
+            raise ValidationError({'tz': 'Unknown time zone.'})
+
+        periods = rollups.timeline(event.id, resolution, tzinfo=tzinfo, **bounds)
+        return Response({
+            'event': event.id,
+            'resolution': resolution,
+            'buckets': [
+                {'start': period, 'votes': sum(candidates.values()), 'candidates': candidates}
+                for period, candidates in periods
+            ],
+        })
+
+    @action(
+        detail=True, methods=['get'], url_path='export/ballots', renderer_classes=[CSVRenderer, NDJSONRenderer],
+        permission_classes=[IsAuthenticated, IsEventCreatorOrStaff],
+    )
+    def export_ballots(self, request, pk=None):
+        """Every ballot as CSV or NDJSON, streamed; resumable with ``?after=`` or ``Range: votes=``."""
+        event = self.get_object()
+        return exports.ballots_response(
+            event, request.accepted_renderer.format,
+            after=request.query_params.get('after'), range_header=request.headers.get('Range'),
+        )
+
+    @action(
+        detail=True, methods=['get'], url_path='export/results', renderer_classes=[CSVRenderer, NDJSONRenderer],
+        permission_classes=[IsAuthenticated, IsEventCreatorOrStaff],
+    )
+    def export_results(self, request, pk=None):
+        event = self.get_object()
+        return exports.results_response(event, request.accepted_renderer.format)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotency.idempotent
     def vote(self, request, pk=None):
-        event = self.get_object()
         candidate_id = request.data.get('candidate')
 
-        self.check_throttles(request)
-
-        # Check existing vote (using the Vote model directly)
-        if Vote.objects.filter(voter=request.user, voting_event=event).exists():
-            return Response(
-                {'error': 'You have already voted in this event'},
-                status=status.HTTP_400_BAD_REQUEST
+        if ingest.is_queued():
+            # Nothing here reads the main database: the drainer checks the
+            # candidate and earlier votes, and the ticket tells the voter
+            # whether the ballot was applied or rejected
+            try:
+                event_id = int(pk)
+            except ValueError:
+                raise Http404
+            try:
+                candidate_id = int(candidate_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'Invalid candidate'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Hand the ballot to the local queue; the drainer writes it in a batch.
+            # The queue file is outside the transaction that @idempotent retries
+            # while the database is locked: the key makes a retry find its ticket
+            ticket = ingest.submit(
+                event_id, candidate_id, request.user.id,
+                is_anonymous=request.data.get('anonymous', False),
+                ip_address=self.get_client_ip(request),
+                request_key=request.headers.get(idempotency.HEADER),
             )
+            if ticket is None:
+                return Response(
+                    {'error': 'You have already voted in this event'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response({
+                'status': 'Vote queued.',
+                'ticket': ticket,
+                'ticket_url': reverse('votingevent-ticket', kwargs={'pk': event_id, 'ticket': ticket}, request=request),
+            }, status=status.HTTP_202_ACCEPTED)
 
+        event = self.get_object()
         try:
             candidate = event.candidates.get(id=candidate_id)
         except Candidate.DoesNotExist:
@@ -100,29 +285,49 @@ class VotingEventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Increment votes_count (not the reverse relation)
-        candidate.votes_count = F('votes_count') + 1
-        candidate.save(update_fields=['votes_count'])
+        # One short IMMEDIATE transaction, retried while the database is locked.
+        # The unique (voting_event, voter) constraint decides whether this is a
+        # second vote; the counter only moves once the insert has succeeded.
+        @db.write_transaction
+        def cast_vote():
+            vote = Vote.objects.create(
+                voting_event=event,
+                candidate=candidate,
+                voter=request.user,
+                is_anonymous=request.data.get('anonymous', False)
+            )
 
-        # Create Vote record
-        Vote.objects.create(
-            voting_event=event,
-            candidate=candidate,
-            voter=request.user,
-            is_anonymous=request.data.get('anonymous', False)
-        )
+            # Increment one shard of the candidate's counter (see voting.counters)
+            counters.add_votes(candidate.id)
+
+            transaction.on_commit(lambda: votes_committed.send(
+                sender=Vote, event_id=event.id, deltas={candidate.id: 1}, through=vote.id,
+            ))
+
+            activity.record('vote', request.user, event, candidate, ip_address=self.get_client_ip(request))
 
         try:
-            ActivityLog.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                action=f'Voted for {candidate.name} (ID: {candidate.id}) in {event.event_name} (ID: {event.id})',
-                ip_address=self.get_client_ip(request)
+            cast_vote()
+        except IntegrityError:
+            if not Vote.objects.filter(voter=request.user, voting_event=event).exists():
+                raise
+            return Response(
+                {'error': 'You have already voted in this event'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
-            logger.error(f"Failed to create activity log: {e}")
-
         return Response({'status': 'Vote Completed.'})
 
+    @action(detail=True, methods=['get'], url_path=r'tickets/(?P<ticket>[0-9]+)', permission_classes=[IsAuthenticated])
+    def ticket(self, request, pk=None, ticket=None):
+        """What became of a ballot queued by ``vote``; only its voter can see it."""
+        found = ingest.get_queue().status(int(ticket))
+        if found is None or str(found[0]) != pk or found[1] != request.user.id:
+            raise Http404
+        body = {'ticket': int(ticket), 'status': found[2]}
+        if found[3]:
+            body['reason'] = found[3]
+        return Response(body)
+
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -147,7 +352,7 @@ class CandidateViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Candidate.objects.filter(
             voting_event_id=self.kwargs['voting_event_pk']
-        )
+        ).order_by('id')
 
 
 class CategoryListView(ListAPIView):
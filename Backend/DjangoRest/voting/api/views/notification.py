@@ -1,21 +1,64 @@
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from ... import unread
 from ...models import Notification
+from ..pagination import DeltaPagination, KeysetPagination
 from ..serializers import NotificationSerializer
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+
+    def mark_unread_read(self, queryset):
+        """Mark ``queryset`` read with a single UPDATE; returns the number of rows changed."""
+        updated = queryset.filter(is_read=False).update(is_read=True)
+        if updated:
+            unread.invalidate([self.request.user.id])
+        return updated
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
-        return Response({'status': 'marked as read'})
\ No newline at end of file
+        self.mark_unread_read(Notification.objects.filter(pk=notification.pk))
+        return Response({'status': 'marked as read'})
+
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValidationError({'ids': 'A list of notification ids is required.'})
+        updated = self.mark_unread_read(self.get_queryset().filter(id__in=ids))
+        return Response({'updated': updated, 'unread_count': unread.get_unread_count(request.user.id)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        queryset = self.get_queryset()
+        # Optional upper bound, so notifications that arrived after the client
+        # last looked stay unread
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            if not isinstance(up_to, int):
+                raise ValidationError({'up_to': 'A notification id is required.'})
+            queryset = queryset.filter(id__lte=up_to)
+        updated = self.mark_unread_read(queryset)
+        return Response({'updated': updated, 'unread_count': unread.get_unread_count(request.user.id)})
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return Response({'unread_count': unread.get_unread_count(request.user.id)})
+
+    @action(detail=False, methods=['get'], pagination_class=DeltaPagination)
+    def since(self, request):
+        """Notifications created after ``?since=<cursor>``, oldest first, plus the next cursor."""
+        page = self.paginate_queryset(self.get_queryset())
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['unread_count'] = unread.get_unread_count(request.user.id)
+        return response
@@ -2,16 +2,18 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 
 from ...models import Report
+from ..pagination import KeysetPagination
 from ..serializers import ReportSerializer
 
 class ReportViewSet(viewsets.ModelViewSet):
     serializer_class = ReportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Report.objects.all()
-        return Report.objects.filter(reporter=self.request.user).order_by('-created_at')
+            return Report.objects.order_by('-created_at', '-id')
+        return Report.objects.filter(reporter=self.request.user).order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
         serializer.save(reporter=self.request.user)
\ No newline at end of file
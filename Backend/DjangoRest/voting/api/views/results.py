@@ -0,0 +1,29 @@
+import json
+
+from django.http import Http404, StreamingHttpResponse
+
+from ...models import VotingEvent
+from ...streaming import result_frames
+
+
+async def results_stream(request, pk):
+    """Server-sent events with live ``votes_count`` deltas for one event.
+
+    Needs an ASGI server (``DjangoRest.asgi``); under WSGI Django would buffer
+    the endless stream instead of flushing it.
+    """
+    if not await VotingEvent.objects.filter(pk=pk).aexists():
+        raise Http404('No VotingEvent matches the given query.')
+
+    async def frames():
+        async for frame in result_frames(pk):
+            if frame is None:
+                yield ': keep-alive\n\n'
+                continue
+            kind, payload = frame
+            yield f'event: {kind}\ndata: {json.dumps(payload)}\n\n'
+
+    response = StreamingHttpResponse(frames(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
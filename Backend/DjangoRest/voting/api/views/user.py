@@ -1,13 +1,19 @@
+import json
+
+from django.http import StreamingHttpResponse
 from rest_framework import mixins, viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import action
 
-from ...models import User, VotingEvent
-from ..serializers import UserSerializer, UserRegisterSerializer, VotingEventSerializer
+from ... import db, provisioning
+from ...models import ActivityLog, User, VotingEvent
+from ..pagination import KeysetPagination
+from ..serializers import ActivityLogSerializer, UserSerializer, UserRegisterSerializer, VotingEventSerializer
 
 class UserViewSet(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet):
     serializer_class = UserSerializer
@@ -20,24 +26,68 @@ class UserViewSet(mixins.RetrieveModelMixin, mixins.UpdateModelMixin, viewsets.G
     @action(detail=False, methods=['get', 'patch'])
     def me(self, request):
         user = self.get_object()
+        if request.method == 'GET':
+            return Response(self.get_serializer(user).data)
         serializer = self.get_serializer(user, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        db.run_in_transaction(serializer.save)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def events(self, request):
-        events = VotingEvent.objects.filter(created_by=request.user)
-        serializer = self.get_serializer(events, many=True)
+        events = VotingEvent.objects.filter(created_by=request.user).for_listing(request.user)
+        serializer = VotingEventSerializer(events, many=True, context={'request': request})
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def favorites(self, request):
         user = request.user
-        favorite_events = VotingEvent.objects.filter(favorites__user=user)  # 👈 Query favorited events
+        favorite_events = VotingEvent.objects.filter(favorites__user=user).for_listing(user)  # 👈 Query favorited events
         serializer = VotingEventSerializer(favorite_events, many=True, context={'request': request})
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def provision(self, request):
+        """Create voters from an uploaded CSV ``file`` of username,email[,password], all of them or none.
+
+        The rows are checked first (400 with errors per line); then the
+        progress is streamed as NDJSON, including a setup token for each
+        voter without a password.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the CSV as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = provisioning.parse(upload.read())
+        except provisioning.ProvisioningError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({'error': 'The file has no rows.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > provisioning.get_setting('MAX_ROWS'):
+            return Response({'error': f'At most {provisioning.get_setting("MAX_ROWS")} rows per upload.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if errors := provisioning.check(rows):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = (json.dumps(progress) + '\n' for progress in provisioning.provision(rows))
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
+    def audit(self, request):
+        """The user's own audit trail, newest first; staff may pass ``?user=<id>``."""
+        user_id = request.user.id
+        if request.user.is_staff and request.query_params.get('user', '').isdigit():
+            user_id = int(request.query_params['user'])
+        logs = ActivityLog.objects.filter(user_id=user_id).select_related('user').order_by('-timestamp', '-id')
+        if action_type := request.query_params.get('action_type'):
+            logs = logs.filter(action_type=action_type)
+        page = self.paginate_queryset(logs)
+        serializer = ActivityLogSerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(APIView):
     permission_classes = [AllowAny]
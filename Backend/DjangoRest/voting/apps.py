@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VotingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'voting'
+
+    def ready(self):
+        from . import email_index, event_tokens, principals, response_cache, rollups, search, streaming, unread  # noqa: F401 (connects signal receivers)
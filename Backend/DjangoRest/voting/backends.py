@@ -1,16 +1,17 @@
 from django.contrib.auth.backends import ModelBackend
-from django.contrib.auth import get_user_model
-from django.db.models import Q
 
-User = get_user_model()
+from . import email_index
+
 
 class EmailAuthBackend(ModelBackend):
+    """Log in with an email address, matched case-insensitively (see voting.email_index)."""
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(Q(email__iexact=username))
-        except User.DoesNotExist:
+        if not username or password is None:
+            return None
+        user = email_index.find_user(username)
+        if user is None:
             return None
-        else:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
-        return None
\ No newline at end of file
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
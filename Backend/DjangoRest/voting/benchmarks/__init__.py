@@ -0,0 +1,105 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the development database: every run builds a
+throwaway schema with Django's test database machinery and drops it again.
+"""
+import contextlib
+import math
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from .. import activity
+
+
+@contextlib.contextmanager
+def isolated_database(on_disk=True):
+    """Create a scratch copy of every configured database for the duration of the block.
+
+    SQLite test databases default to ``:memory:``, which hides fsync and
+    locking costs; ``on_disk`` puts them in a temporary directory instead.
+    Yields that directory so callers can keep side files (queues, brokers) there;
+    throttle buckets and shared cache versions are moved there too, so runs
+    neither trip nor pollute the real limits and versions.
+    """
+    workdir = tempfile.mkdtemp(prefix='votex-bench-')
+    test_names = {}
+    if on_disk:
+        for alias in connections:
+            conn = connections[alias]
+            if conn.vendor == 'sqlite':
+                test_names[alias] = conn.settings_dict['TEST']['NAME']
+                conn.settings_dict['TEST']['NAME'] = os.path.join(workdir, f'{alias}.sqlite3')
+    # Test environment: 'testserver' allowed as a host, in-memory email, etc.
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    side_files = override_settings(
+        THROTTLING={
+            **getattr(settings, 'THROTTLING', {}), 'BUCKET_PATH': os.path.join(workdir, 'throttle_buckets.sqlite3'),
+        },
+        SHARED_STATE={**getattr(settings, 'SHARED_STATE', {}), 'PATH': os.path.join(workdir, 'shared_state.sqlite3')},
+    )
+    side_files.enable()
+    try:
+        yield workdir
+    finally:
+        # Buffered activity rows belong to the scratch database; written at exit they would hit the real one
+        activity.flush()
+        side_files.disable()
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        for alias, name in test_names.items():
+            connections[alias].settings_dict['TEST']['NAME'] = name
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (``pct`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Stopwatch:
+    """Collects per-operation latencies and the wall time around them."""
+
+    def __init__(self):
+        self.samples = []
+        self.started = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def lap(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def summary(self, operations=None):
+        operations = len(self.samples) if operations is None else operations
+        return {
+            'operations': operations,
+            'seconds': round(self.elapsed, 4),
+            'per_second': round(operations / self.elapsed, 1) if self.elapsed else 0.0,
+            'p50_ms': round(percentile(self.samples, 50) * 1000, 3),
+            'p95_ms': round(percentile(self.samples, 95) * 1000, 3),
+            'p99_ms': round(percentile(self.samples, 99) * 1000, 3),
+        }
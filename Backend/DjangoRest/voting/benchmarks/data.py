@@ -0,0 +1,183 @@
+"""
+Synthetic data for the benchmark suite.
+
+``generate()`` fills the (scratch) database with users, events, candidates,
+votes, favorites, one deep comment thread and notifications, in bulk and from
+a seeded random generator, so two runs at the same scale and seed build the
+same data. Every user has the password ``PASSWORD``; it is hashed once.
+"""
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .. import email_index, rollups, search
+from ..models import (
+    Candidate, Category, Comment, Favorite, Notification, Profile, Vote, VotingEvent,
+)
+from ..models.comments import MAX_DEPTH
+
+PASSWORD = 'bench-password-1'
+
+DEFAULT_SCALE = {
+    'users': 500,
+    'events': 200,
+    'candidates': 4,  # per event
+    'votes': 5000,
+    'favorites': 2000,
+    'comment_depth': 8,
+    'comment_fanout': 3,  # replies per level of the thread
+    'notifications': 300,  # for the polling user
+}
+
+Dataset = namedtuple('Dataset', 'scale users events storm_event thread_event thread_root poller')
+
+
+def generate(scale=None, seed=0):
+    """Build a dataset at ``scale`` (overrides of ``DEFAULT_SCALE``) and return its handles."""
+    scale = {**DEFAULT_SCALE, **(scale or {})}
+    rng = random.Random(seed)
+    with transaction.atomic():
+        users = create_users(scale['users'])
+        events = create_events(rng, users, scale['events'], scale['candidates'])
+        create_votes(rng, users, events, scale['votes'])
+        create_favorites(rng, users, events, scale['favorites'])
+        # The storm and thread events are kept free of generated votes and comments
+        storm_event = create_events(rng, users, 1, scale['candidates'], name='Vote storm')[0]
+        thread_event = create_events(rng, users, 1, 2, name='Deep thread')[0]
+        thread_root = create_thread(users, thread_event, scale['comment_depth'], scale['comment_fanout'])
+        poller = users[0]
+        create_notifications(poller, events, scale['notifications'])
+    # bulk_create skips the signals that keep the search index current
+    if search.create_index():
+        search.clear_index()
+        search.index_events(VotingEvent.objects.values_list('id', flat=True))
+    return Dataset(scale, users, events, storm_event, thread_event, thread_root, poller)
+
+
+def create_users(count):
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(username=f'bench-user-{i}', email=f'bench-user-{i}@example.com', password=password)
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    users = list(User.objects.filter(username__startswith='bench-user-').order_by('id'))
+    # The post_save receiver does not run for bulk inserts
+    Profile.objects.bulk_create([Profile(user=user) for user in users], batch_size=1000)
+    # Nor the one that indexes email addresses for login
+    email_index.rebuild()
+    return users
+
+
+def create_events(rng, users, count, candidates, name=None):
+    """``count`` public and private events spread over the past and next three days; with ``name``, one ongoing public event."""
+    now = timezone.now()
+    categories = list(Category.objects.all()) or Category.objects.bulk_create(
+        [Category(name=label) for label in ('Music', 'Sports', 'Politics', 'Science', 'Art')]
+    )
+    events = []
+    for i in range(count):
+        start = now - timedelta(hours=1) if name else now + timedelta(hours=rng.randint(-72, 72))
+        events.append(VotingEvent(
+            event_name=name or f'Event {i}',
+            created_by=rng.choice(users),
+            start_time=start, end_time=start + timedelta(hours=rng.randint(2, 48)),
+            is_private=not name and rng.random() < 0.1,
+        ))
+    events = VotingEvent.objects.bulk_create(events, batch_size=500)
+    Through = VotingEvent.categories.through
+    Through.objects.bulk_create(
+        [
+            Through(votingevent_id=event.id, category_id=category.id)
+            for event in events for category in rng.sample(categories, rng.randint(1, 2))
+        ],
+        batch_size=1000,
+    )
+    Candidate.objects.bulk_create(
+        [Candidate(voting_event=event, name=f'Candidate {j}') for event in events for j in range(candidates)],
+        batch_size=1000,
+    )
+    return events
+
+
+def create_votes(rng, users, events, count):
+    """``count`` votes over the past three days, at most one per user and event, tallied and rolled up."""
+    candidates = {}
+    for event_id, candidate_id in Candidate.objects.filter(voting_event__in=events).values_list('voting_event_id', 'id'):
+        candidates.setdefault(event_id, []).append(candidate_id)
+    count = min(count, len(users) * len(events))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.randrange(len(events)), rng.randrange(len(users))))
+    now = timezone.now()
+    votes = []
+    tallies = {}
+    for event_index, user_index in sorted(pairs):
+        event = events[event_index]
+        candidate_id = rng.choice(candidates[event.id])
+        tallies[candidate_id] = tallies.get(candidate_id, 0) + 1
+        votes.append(Vote(
+            voting_event=event, candidate_id=candidate_id, voter=users[user_index],
+            created_at=now - timedelta(seconds=rng.randrange(72 * 3600)),
+        ))
+    Vote.objects.bulk_create(votes, batch_size=1000)
+    rollups.rebuild([event.id for event in events])
+    Candidate.objects.bulk_update(
+        [Candidate(id=candidate_id, votes_count=tally) for candidate_id, tally in tallies.items()],
+        ['votes_count'], batch_size=1000,
+    )
+
+
+def create_favorites(rng, users, events, count):
+    count = min(count, len(users) * len(events))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.randrange(len(users)), rng.randrange(len(events))))
+    Favorite.objects.bulk_create(
+        [Favorite(user=users[u], event=events[e]) for u, e in sorted(pairs)], batch_size=1000,
+    )
+
+
+def create_thread(users, event, depth, fanout):
+    """A root comment and ``depth`` levels of ``fanout`` replies, each level under the first reply of the one above."""
+    depth = min(depth, MAX_DEPTH)
+    root = Comment.objects.create(event=event, user=users[0], content='Root of the deep thread')
+    level = [root]
+    for d in range(1, depth + 1):
+        replies = Comment.objects.bulk_create([
+            Comment(
+                event=event, user=users[(d * fanout + i) % len(users)], content=f'Reply at depth {d}',
+                parent_comment=parent, depth=d,
+            )
+            for parent in level for i in range(fanout)
+        ])
+        for reply in replies:
+            reply.path = f'{reply.parent_comment.path}{reply.pk:010d}/'
+        Comment.objects.bulk_update(replies, ['path'])
+        for parent in level:
+            parent.reply_count = fanout
+        Comment.objects.bulk_update(level, ['reply_count'])
+        # Only the first reply gets replies of its own: deep rather than wide
+        level = replies[:1]
+    return root
+
+
+def create_notifications(user, events, count):
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                user=user, notification_type='event_reminder',
+                message=f'"{events[i % len(events)].event_name}" starts soon.',
+                related_event=events[i % len(events)], is_read=i % 3 == 0,
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
@@ -0,0 +1,151 @@
+"""
+Scenario drivers for the benchmark suite.
+
+A scenario is a generator over a ``Dataset`` (see ``voting.benchmarks.data``)
+that yields ``Request`` tuples and is sent each response back, so it can
+follow cursors the way a client would. ``run()`` sends the requests through
+``django.test.Client`` (URLconf, middleware, authentication and throttling
+included) and times each one, counting its queries on the default database.
+
+Throttles stay on: scenarios spread their requests over many users, and a
+throttled request counts as an error.
+"""
+import random
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import percentile
+from .data import PASSWORD
+
+Request = namedtuple('Request', 'method path data user expect ip', defaults=(None, None, (200,), None))
+
+
+def event_list(dataset, iterations, rng):
+    filters = [
+        '', '?status=ongoing', '?status=upcoming', '?category=Music', '?search=Event 1',
+        '?is_private=false', '?ordering=start_time', '?ordering=-event_name',
+    ]
+    for i in range(iterations):
+        yield Request('get', f'/api/events/{filters[i % len(filters)]}', user=rng.choice(dataset.users))
+
+
+def event_detail(dataset, iterations, rng):
+    public = [event for event in dataset.events if not event.is_private]
+    for _ in range(iterations):
+        yield Request('get', f'/api/events/{rng.choice(public).id}/', user=rng.choice(dataset.users))
+
+
+def event_timeline(dataset, iterations, rng):
+    for i in range(iterations):
+        resolution = ('minute', 'hour', 'day')[i % 3]
+        event = rng.choice(dataset.events)
+        yield Request('get', f'/api/events/{event.id}/timeline/?resolution={resolution}', user=rng.choice(dataset.users))
+
+
+def vote_storm(dataset, iterations, rng):
+    event = dataset.storm_event
+    candidate_ids = list(event.candidates.values_list('id', flat=True))
+    # One vote per user: everybody votes on the same event
+    for user in dataset.users[:iterations]:
+        yield Request(
+            'post', f'/api/events/{event.id}/vote/', {'candidate': rng.choice(candidate_ids)},
+            user=user, expect=(200, 202),
+        )
+
+
+def comment_thread(dataset, iterations, rng):
+    event_id = dataset.thread_event.id
+    depth = dataset.scale['comment_depth']
+    base = f'/api/events/{event_id}/comments/'
+    for i in range(iterations):
+        user = rng.choice(dataset.users)
+        if i % 3 == 0:
+            yield Request('get', f'{base}?depth={depth}&replies=50', user=user)
+        elif i % 3 == 1:
+            yield Request('get', f'{base}{dataset.thread_root.id}/?depth={depth}', user=user)
+        else:
+            yield Request('get', f'{base}{dataset.thread_root.id}/replies/?depth=3', user=user)
+
+
+def notification_polling(dataset, iterations, rng):
+    user = dataset.poller
+    cursor = None
+    for i in range(iterations):
+        if i % 2:
+            yield Request('get', '/api/notifications/unread_count/', user=user)
+            continue
+        path = '/api/notifications/since/' + (f'?since={cursor}' if cursor else '')
+        response = yield Request('get', path, user=user)
+        # The cursor to poll from next time
+        cursor = response.json().get('since', cursor)
+
+
+def login(dataset, iterations, rng):
+    for i, user in enumerate(rng.sample(dataset.users, min(iterations, len(dataset.users)))):
+        # From many clients, as anonymous writes are throttled per IP
+        yield Request(
+            'post', '/api/token/', {'username': user.email, 'password': PASSWORD},
+            ip=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+        )
+
+
+# In the order they run: reads first, so the vote storm does not change what they see
+SCENARIOS = {
+    'event_list': event_list,
+    'event_detail': event_detail,
+    'event_timeline': event_timeline,
+    'comment_thread': comment_thread,
+    'notification_polling': notification_polling,
+    'vote_storm': vote_storm,
+    'login': login,
+}
+
+
+def run(scenario, dataset, iterations, seed=0):
+    """Drive ``scenario``; returns throughput, latency percentiles, queries per request and errors."""
+    client = Client()
+    tokens = {}
+    samples, queries, errors = [], [], []
+    requests = scenario(dataset, iterations, random.Random(seed))
+    response = None
+    began = time.perf_counter()
+    while True:
+        try:
+            request = requests.send(response)
+        except StopIteration:
+            break
+        headers = {'REMOTE_ADDR': request.ip} if request.ip else {}
+        if request.user is not None:
+            if request.user.pk not in tokens:
+                tokens[request.user.pk] = str(AccessToken.for_user(request.user))
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {tokens[request.user.pk]}'
+        send = getattr(client, request.method)
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as captured:
+            if request.data is None:
+                response = send(request.path, **headers)
+            else:
+                response = send(request.path, request.data, content_type='application/json', **headers)
+        samples.append(time.perf_counter() - start)
+        queries.append(len(captured))
+        if response.status_code not in request.expect:
+            errors.append(f'{request.method.upper()} {request.path}: {response.status_code}')
+    elapsed = time.perf_counter() - began
+
+    return {
+        'requests': len(samples),
+        'seconds': round(elapsed, 4),
+        'per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+    }
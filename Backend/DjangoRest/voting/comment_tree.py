@@ -0,0 +1,54 @@
+"""
+Comment thread loading.
+
+Every ``Comment`` stores its materialized ``path``, so all descendants of a
+set of comments, down to a given depth, come back from one query ordered by
+path, i.e. parents before children and siblings in creation order. The tree
+is then assembled in memory.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Comment
+
+
+def load_replies(comments, max_depth=3, per_node=5):
+    """Attach up to ``per_node`` replies to every comment, ``max_depth`` levels deep.
+
+    Each comment gets a ``loaded_replies`` list; ``reply_count`` tells the
+    caller whether more replies exist than were attached. All ``comments``
+    are expected to sit at the same depth (a page of threads or of siblings).
+    """
+    comments = list(comments)
+    for comment in comments:
+        comment.loaded_replies = []
+    if max_depth < 1 or not any(comment.reply_count for comment in comments):
+        return comments
+
+    base_depth = comments[0].depth
+    nodes = {comment.id: comment for comment in comments}
+    descendants = (
+        Comment.objects.filter(
+            reduce(or_, (Q(path__startswith=comment.path) for comment in comments)),
+            event_id=comments[0].event_id,
+            depth__gt=base_depth,
+            depth__lte=base_depth + max_depth,
+        )
+        # Rank siblings so that a parent with thousands of replies only sends per_node of them
+        .annotate(sibling_rank=Window(RowNumber(), partition_by=F('parent_comment_id'), order_by=F('path').asc()))
+        .filter(sibling_rank__lte=per_node)
+        .select_related('user')
+        .order_by('path')
+    )
+    for comment in descendants:
+        parent = nodes.get(comment.parent_comment_id)
+        # Skip replies whose parent fell outside the window
+        if parent is None:
+            continue
+        comment.loaded_replies = []
+        parent.loaded_replies.append(comment)
+        nodes[comment.id] = comment
+    return comments
@@ -0,0 +1,143 @@
+"""
+Sharded candidate vote counters.
+
+Writes add to one of ``VOTE_COUNTERS['SHARDS']`` rows per candidate, picked at
+random, instead of all contending for ``Candidate.votes_count``. That column
+stays as the compacted base: a candidate's total is ``votes_count`` plus the
+sum of its shards, and ``manage.py reconcile_votes --rebuild`` folds the
+shards back into it.
+
+Totals are cached per event, in each worker, for ``CACHE_TIMEOUT`` seconds,
+and votes do not drop them: a hot event is summed once per timeout, and a
+shown total lags by at most that long. Whatever is built from them and kept
+longer (voting.response_cache) reads them inside ``tracking_expiry()`` and
+expires with them.
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Candidate, Vote, VoteCounterShard
+
+DEFAULTS = {
+    'SHARDS': 8,
+    'CACHE_TIMEOUT': 2,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'VOTE_COUNTERS', {}).get(name, DEFAULTS[name])
+
+
+def cache_key(event_id):
+    return f'vote-counts:{event_id}'
+
+
+class TotalsExpiry:
+    """When the earliest cached totals read inside ``tracking_expiry()`` expire; ``None`` if none were cached."""
+
+    def __init__(self):
+        self.expires_at = None
+
+    def saw(self, expires_at):
+        if self.expires_at is None or expires_at < self.expires_at:
+            self.expires_at = expires_at
+
+
+_tracker = contextvars.ContextVar('vote_counts_expiry', default=None)
+
+
+@contextmanager
+def tracking_expiry():
+    tracker = TotalsExpiry()
+    token = _tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _tracker.reset(token)
+
+
+def add_votes(candidate_id, count=1):
+    """Add ``count`` votes to a random shard of the candidate's counter."""
+    slot = random.randrange(get_setting('SHARDS'))
+    shard = VoteCounterShard.objects.filter(candidate_id=candidate_id, slot=slot)
+    if not shard.update(count=F('count') + count):
+        VoteCounterShard.objects.bulk_create(
+            [VoteCounterShard(candidate_id=candidate_id, slot=slot, count=0)],
+            ignore_conflicts=True,
+        )
+        shard.update(count=F('count') + count)
+
+
+def count_votes(event_ids):
+    """Uncached totals as ``{event_id: {candidate_id: votes}}`` in one query."""
+    totals = {event_id: {} for event_id in event_ids}
+    rows = (
+        Candidate.objects.filter(voting_event_id__in=event_ids)
+        .annotate(sharded=Coalesce(Sum('vote_shards__count'), 0))
+        .values_list('voting_event_id', 'id', 'votes_count', 'sharded')
+    )
+    for event_id, candidate_id, base, sharded in rows:
+        totals[event_id][candidate_id] = base + sharded
+    return totals
+
+
+def count_votes_through(event_id):
+    """Uncached ``({candidate_id: votes}, last vote id)`` for one event.
+
+    Both come from one statement, so they describe the same committed state:
+    the totals include exactly the votes up to that id.
+    """
+    last_vote = Vote.objects.filter(voting_event_id=OuterRef('voting_event_id')).order_by('-id').values('id')[:1]
+    rows = (
+        Candidate.objects.filter(voting_event_id=event_id)
+        .annotate(sharded=Coalesce(Sum('vote_shards__count'), 0), last_vote=Subquery(last_vote))
+        .values_list('id', 'votes_count', 'sharded', 'last_vote')
+    )
+    totals, through = {}, 0
+    for candidate_id, base, sharded, last_vote_id in rows:
+        totals[candidate_id] = base + sharded
+        through = last_vote_id or 0
+    return totals, through
+
+
+def get_counts_for_events(event_ids):
+    """Cached totals for several events; misses are computed together."""
+    event_ids = list(event_ids)
+    cached = cache.get_many([cache_key(event_id) for event_id in event_ids])
+    tracker = _tracker.get()
+    totals = {}
+    missing = []
+    for event_id in event_ids:
+        entry = cached.get(cache_key(event_id))
+        if entry is None:
+            missing.append(event_id)
+            continue
+        # Stored with their expiry, for tracking_expiry()
+        expires_at, totals[event_id] = entry
+        if tracker is not None:
+            tracker.saw(expires_at)
+    if missing:
+        fresh = count_votes(missing)
+        timeout = get_setting('CACHE_TIMEOUT')
+        expires_at = time.time() + timeout
+        cache.set_many({cache_key(event_id): (expires_at, counts) for event_id, counts in fresh.items()}, timeout)
+        totals.update(fresh)
+    return totals
+
+
+def get_counts(event_id, use_cache=True):
+    """``{candidate_id: votes}`` for one event."""
+    if not use_cache:
+        return count_votes([event_id])[event_id]
+    return get_counts_for_events([event_id])[event_id]
+
+
+def invalidate(event_ids):
+    cache.delete_many([cache_key(event_id) for event_id in event_ids])
@@ -0,0 +1,71 @@
+"""
+SQLite write path.
+
+The database connections (see ``DATABASES`` in settings) run in WAL mode, so
+readers never wait for the writer, are kept open between requests, and begin
+every transaction with ``BEGIN IMMEDIATE``: a writer takes the lock up front
+and waits up to ``timeout`` seconds for it, instead of failing with
+"database is locked" when a read transaction tries to upgrade to a write.
+
+``write_transaction`` runs the short write sections of the vote, comment and
+favorite endpoints in such a transaction, and retries one that still times
+out up to ``ATTEMPTS`` times with jittered exponential backoff.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ATTEMPTS': 4,
+    'BASE_DELAY': 0.02,
+    'MAX_DELAY': 0.5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'DATABASE_WRITES', {}).get(name, DEFAULTS[name])
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def backoff(attempt):
+    """Seconds to wait before retry ``attempt`` (1-based): full jitter over an exponential cap."""
+    return random.uniform(0, min(get_setting('MAX_DELAY'), get_setting('BASE_DELAY') * 2 ** attempt))
+
+
+def run_in_transaction(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Call ``func`` inside ``transaction.atomic()``, retrying it while the database is locked.
+
+    Inside an outer transaction there is nothing to retry on its own, so
+    ``func`` then runs once in a savepoint.
+    """
+    if connections[using].in_atomic_block:
+        with transaction.atomic(using=using):
+            return func(*args, **kwargs)
+    attempts = get_setting('ATTEMPTS')
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            if attempt == attempts or not is_lock_error(exc):
+                raise
+            logger.info('Database locked, retrying %s (attempt %d of %d)', func.__qualname__, attempt, attempts)
+            time.sleep(backoff(attempt))
+
+
+def write_transaction(func):
+    """Decorator form of ``run_in_transaction``."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_in_transaction(func, *args, **kwargs)
+    return wrapper
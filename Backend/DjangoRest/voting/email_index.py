@@ -0,0 +1,97 @@
+"""
+Case-insensitive email lookups through ``EmailAddressIndex``.
+
+Saving a user writes its normalized address (trimmed, lowercased) into the
+index; saves that name their ``update_fields`` without ``email``, like the
+``last_login`` update at every login, skip that. ``find_user()`` is then one
+query on a unique index instead of an ``iexact`` scan of ``auth_user``.
+
+Users written before the index existed (or with ``bulk_create``) have no
+row: on a miss ``find_user()`` falls back to the ``iexact`` scan, over users
+without a row only, and indexes the user it finds, so they can log in
+straight away. ``manage.py rebuild_email_index`` indexes all of them at once
+and keeps misses cheap.
+
+An address that another user already has, in any case, is refused by the
+unique constraint; the API and the admin validate with ``is_taken()`` first.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import EmailAddressIndex
+
+
+def normalize(email):
+    return (email or '').strip().lower()
+
+
+def unindexed(normalized):
+    """Users with the address ``normalized``, in any case, who have no index row yet."""
+    return User.objects.filter(email__iexact=normalized, email_index__isnull=True).order_by('id')
+
+
+def find_user(email):
+    normalized = normalize(email)
+    if not normalized:
+        return None
+    user = User.objects.filter(email_index__email=normalized).first()
+    if user is None:
+        user = unindexed(normalized).first()
+        if user is not None:
+            try:
+                with transaction.atomic():
+                    EmailAddressIndex.objects.create(user_id=user.pk, email=normalized)
+            except IntegrityError:
+                # Indexed meanwhile, by a concurrent login or a save
+                pass
+    return user
+
+
+def is_taken(email, exclude_user=None):
+    """Whether another user has ``email``, in any case."""
+    normalized = normalize(email)
+    addresses = EmailAddressIndex.objects.filter(email=normalized)
+    legacy = unindexed(normalized)
+    if exclude_user is not None:
+        addresses = addresses.exclude(user_id=exclude_user.pk)
+        legacy = legacy.exclude(pk=exclude_user.pk)
+    return addresses.exists() or legacy.exists()
+
+
+def sync(user):
+    normalized = normalize(user.email)
+    if not normalized:
+        EmailAddressIndex.objects.filter(user_id=user.pk).delete()
+        return
+    if not EmailAddressIndex.objects.filter(user_id=user.pk).update(email=normalized):
+        EmailAddressIndex.objects.create(user_id=user.pk, email=normalized)
+
+
+def rebuild(chunk_size=5000):
+    """Index every user's address, replacing the current rows; returns ``(indexed, duplicates)``.
+
+    Of several users sharing an address, the one with the lowest id gets it.
+    """
+    EmailAddressIndex.objects.all().delete()
+    with_email = User.objects.exclude(email='').order_by('id').values_list('id', 'email')
+    batch = []
+    addresses = 0
+    for user_id, email in with_email.iterator(chunk_size=chunk_size):
+        if normalized := normalize(email):
+            batch.append(EmailAddressIndex(user_id=user_id, email=normalized))
+            addresses += 1
+        if len(batch) >= chunk_size:
+            EmailAddressIndex.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    EmailAddressIndex.objects.bulk_create(batch, ignore_conflicts=True)
+    indexed = EmailAddressIndex.objects.count()
+    return indexed, addresses - indexed
+
+
+@receiver(post_save, sender=User)
+def sync_saved_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'email' not in update_fields):
+        return
+    sync(instance)
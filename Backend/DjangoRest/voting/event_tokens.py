@@ -0,0 +1,122 @@
+"""
+Private event tokens.
+
+A private event gets a random ``event_token`` when it is created (or first
+made private), unique under a database index. ``resolve()`` maps a token to
+its event id. A string that cannot be a token is refused without a query;
+anything else is answered from a per-process LRU cache, or with one lookup
+on the unique index. Cached entries are dropped when their event is saved
+or deleted in this process. A token never moves to another event, so the
+only stale entry another process can hold is for a deleted event, which the
+caller then finds missing (and drops with ``forget()``).
+
+Misses are not cached: guessing costs one indexed query per attempt, and
+the join endpoint limits attempts per IP address.
+"""
+import re
+import secrets
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import VotingEvent
+
+DEFAULTS = {
+    'CACHE_SIZE': 10_000,
+}
+
+TOKEN_BYTES = 5
+TOKEN_PATTERN = re.compile(r'[0-9A-F]{10}')
+MAX_ATTEMPTS = 5
+
+
+def get_setting(name):
+    return getattr(settings, 'EVENT_TOKENS', {}).get(name, DEFAULTS[name])
+
+
+class TokenCache:
+    """Least recently used ``token -> event id`` entries, at most ``maxsize`` of them."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            event_id = self.entries.get(token)
+            if event_id is not None:
+                self.entries.move_to_end(token)
+            return event_id
+
+    def set(self, token, event_id):
+        with self.lock:
+            self.entries[token] = event_id
+            self.entries.move_to_end(token)
+            self.tokens[event_id] = token
+            while len(self.entries) > self.maxsize:
+                _, evicted = self.entries.popitem(last=False)
+                self.tokens.pop(evicted, None)
+
+    def discard_event(self, event_id):
+        with self.lock:
+            token = self.tokens.pop(event_id, None)
+            if token is not None:
+                self.entries.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens.clear()
+
+
+cache = TokenCache(get_setting('CACHE_SIZE'))
+
+
+def generate():
+    return secrets.token_hex(TOKEN_BYTES).upper()
+
+
+def normalize(token):
+    return token.strip().upper() if isinstance(token, str) else ''
+
+
+def assign(event):
+    """Give ``event`` a new unique token and save it."""
+    for attempt in range(MAX_ATTEMPTS):
+        event.event_token = generate()
+        try:
+            with transaction.atomic():
+                event.save(update_fields=['event_token'])
+            return event.event_token
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+
+
+def resolve(token):
+    """The id of the event with ``token``, or None."""
+    token = normalize(token)
+    if not TOKEN_PATTERN.fullmatch(token):
+        return None
+    event_id = cache.get(token)
+    if event_id is None:
+        event_id = VotingEvent.objects.filter(event_token=token).values_list('id', flat=True).first()
+        if event_id is not None:
+            cache.set(token, event_id)
+    return event_id
+
+
+def forget(event_id):
+    cache.discard_event(event_id)
+
+
+@receiver(post_save, sender=VotingEvent)
+@receiver(post_delete, sender=VotingEvent)
+def forget_saved_event(sender, instance, **kwargs):
+    forget(instance.pk)
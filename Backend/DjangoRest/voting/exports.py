@@ -0,0 +1,128 @@
+"""
+Streaming exports of event results and ballots.
+
+Ballots are read in id order with ``.iterator(chunk_size=CHUNK_SIZE)``. They
+go out through ``StreamingHttpResponse`` one chunk of rows at a time, so
+memory use stays flat however large the event. Anonymous ballots are
+exported without the voter's id and username.
+
+A ballot export can be resumed by vote id. Use ``?after=<id>``, or a
+``Range: votes=<first>-[<last>]`` header (ids inclusive), which is
+answered with 206 and ``Content-Range``. Each response carries
+``X-Export-Through``, the highest vote id when it started. Pass that id
+back as the last id of the range to resume the same snapshot.
+"""
+import csv
+import json
+import re
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from . import counters
+from .models import Candidate, Vote
+
+DEFAULTS = {
+    'CHUNK_SIZE': 2000,
+}
+
+BALLOT_FIELDS = ['vote_id', 'candidate_id', 'candidate', 'voter_id', 'voter', 'is_anonymous']
+RESULT_FIELDS = ['candidate_id', 'candidate', 'votes']
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson; charset=utf-8'}
+RANGE_PATTERN = re.compile(r'votes=(\d*)-(\d*)$')
+
+
+def get_setting(name):
+    return getattr(settings, 'EXPORTS', {}).get(name, DEFAULTS[name])
+
+
+class RangeNotSatisfiable(APIException):
+    status_code = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    default_detail = 'Range not satisfiable.'
+    default_code = 'range_not_satisfiable'
+
+
+class Echo:
+    """File-like object for ``csv.writer`` that hands back each line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def encode(rows, fields, output):
+    """Yield the rows as CSV (with a header line) or NDJSON, ``CHUNK_SIZE`` rows per piece."""
+    rows = iter(rows)
+    chunk_size = get_setting('CHUNK_SIZE')
+    if output == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        while chunk := list(islice(rows, chunk_size)):
+            yield ''.join(writer.writerow(row) for row in chunk)
+    else:
+        while chunk := list(islice(rows, chunk_size)):
+            yield ''.join(json.dumps(dict(zip(fields, row))) + '\n' for row in chunk)
+
+
+def parse_range(header, through):
+    """``(first, last)`` vote ids from a ``Range: votes=...`` header, or ``None`` for another unit."""
+    if not header or not header.startswith('votes='):
+        # Other units (bytes) are ignored, as RFC 9110 allows: the full export is sent
+        return None
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if match is None or match.groups() == ('', ''):
+        raise RangeNotSatisfiable('Expected Range: votes=<first id>-[<last id>].')
+    first = int(match.group(1) or 0)
+    last = int(match.group(2)) if match.group(2) else through
+    if first > last or first > through:
+        raise RangeNotSatisfiable(f'No votes in that range; the last vote id is {through}.')
+    return first, min(last, through)
+
+
+def ballot_rows(event_id, first, last):
+    ballots = (
+        Vote.objects.filter(voting_event_id=event_id, id__gte=first, id__lte=last).order_by('id')
+        .values_list('id', 'candidate_id', 'candidate__name', 'voter_id', 'voter__username', 'is_anonymous')
+    )
+    for vote_id, candidate_id, candidate, voter_id, voter, is_anonymous in ballots.iterator(
+        chunk_size=get_setting('CHUNK_SIZE')
+    ):
+        if is_anonymous:
+            voter_id = voter = None
+        yield vote_id, candidate_id, candidate, voter_id, voter, is_anonymous
+
+
+def streaming_response(rows, fields, output, filename, status_code=200):
+    response = StreamingHttpResponse(encode(rows, fields, output), status=status_code, content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
+
+
+def ballots_response(event, output, after=None, range_header=None):
+    through = Vote.objects.filter(voting_event_id=event.id).aggregate(last=Max('id'))['last'] or 0
+    bounds = parse_range(range_header, through)
+    first, last = bounds or (0, through)
+    if after is not None:
+        if not after.isdigit():
+            raise ValidationError({'after': 'A vote id is required.'})
+        first = max(first, int(after) + 1)
+
+    response = streaming_response(
+        ballot_rows(event.id, first, last), BALLOT_FIELDS, output, f'event-{event.id}-ballots',
+        status_code=status.HTTP_206_PARTIAL_CONTENT if bounds else status.HTTP_200_OK,
+    )
+    response['Accept-Ranges'] = 'votes'
+    response['X-Export-Through'] = str(through)
+    if bounds:
+        response['Content-Range'] = f'votes {first}-{last}/*'
+    return response
+
+
+def results_response(event, output):
+    totals = counters.get_counts(event.id, use_cache=False)
+    names = Candidate.objects.filter(voting_event_id=event.id).order_by('id').values_list('id', 'name')
+    rows = ((candidate_id, name, totals.get(candidate_id, 0)) for candidate_id, name in names)
+    return streaming_response(rows, RESULT_FIELDS, output, f'event-{event.id}-results')
@@ -0,0 +1,151 @@
+"""
+Event notification fan-out.
+
+``schedule()`` looks for events whose start time, or one of the reminder
+times ``REMINDER_LEADS`` seconds before it, has passed (but by no more than
+``MAX_LATENESS``) and records a ``NotificationDispatch`` for each; the
+unique key makes this safe to repeat. ``run_dispatch()`` then walks the
+event's ``Favorite`` rows in id order and creates the notifications with one
+``bulk_create`` per chunk, committing the chunk together with the dispatch's
+cursor. A restart resumes after the last committed chunk, so nobody is
+notified twice. ``manage.py send_event_notifications`` runs both, once or
+in a loop.
+
+The command runs outside the web workers, so the recipients' cached unread
+counts are dropped through the generations in voting.shared_state, which
+every worker reads, once each chunk commits.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.timesince import timeuntil
+
+from . import unread
+from .models import Favorite, Notification, NotificationDispatch, VotingEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CHUNK_SIZE': 5000,
+    'REMINDER_LEADS': [3600],
+    'MAX_LATENESS': 3600,
+    'LEASE_TIMEOUT': 120,
+    'INTERVAL': 30,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_FANOUT', {}).get(name, DEFAULTS[name])
+
+
+def schedule(now=None):
+    """Record dispatches for every start or reminder time that has just passed; returns how many are new."""
+    now = now or timezone.now()
+    earliest = now - timedelta(seconds=get_setting('MAX_LATENESS'))
+    dispatches = [
+        NotificationDispatch(event_id=event_id, notification_type='event_start', scheduled_for=start_time)
+        for event_id, start_time in VotingEvent.objects.filter(
+            start_time__gt=earliest, start_time__lte=now,
+        ).values_list('id', 'start_time')
+    ]
+    for lead in get_setting('REMINDER_LEADS'):
+        lead = timedelta(seconds=lead)
+        dispatches += [
+            NotificationDispatch(event_id=event_id, notification_type='event_reminder', scheduled_for=start_time - lead)
+            for event_id, start_time in VotingEvent.objects.filter(
+                start_time__gt=max(earliest + lead, now), start_time__lte=now + lead,
+            ).values_list('id', 'start_time')
+        ]
+    if not dispatches:
+        return 0
+    before = NotificationDispatch.objects.count()
+    NotificationDispatch.objects.bulk_create(dispatches, ignore_conflicts=True)
+    return NotificationDispatch.objects.count() - before
+
+
+def lease(dispatch_id, now=None):
+    """Take the dispatch for ``LEASE_TIMEOUT`` seconds; returns the lease token or ``None`` if it is taken."""
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    leased = NotificationDispatch.objects.filter(
+        Q(leased_until__isnull=True) | Q(leased_until__lt=now), id=dispatch_id, completed_at__isnull=True,
+    ).update(lease_token=token, leased_until=now + timedelta(seconds=get_setting('LEASE_TIMEOUT')))
+    return token if leased else None
+
+
+def render_message(dispatch, event_name, start_time):
+    if dispatch.notification_type == 'event_start':
+        return f'"{event_name}" has started. Cast your vote!'
+    # The time actually left: an event created inside the lead gets its reminder late
+    return f'"{event_name}" starts in {timeuntil(start_time, max(timezone.now(), dispatch.scheduled_for))}.'
+
+
+def run_dispatch(dispatch, chunk_size=None, max_chunks=None):
+    """Notify the event's favoriters that this dispatch has not reached yet.
+
+    Returns the number of notifications created, or ``None`` if another
+    worker holds the dispatch.
+    """
+    chunk_size = chunk_size or get_setting('CHUNK_SIZE')
+    token = lease(dispatch.id)
+    if token is None:
+        return None
+
+    event = VotingEvent.objects.filter(id=dispatch.event_id).values_list('event_name', 'start_time').first()
+    if event is None:
+        # Deleted since it was scheduled; the dispatch went with it
+        return 0
+    message = render_message(dispatch, *event)
+    cursor = dispatch.last_favorite_id
+    sent = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        favorites = list(
+            Favorite.objects.filter(event_id=dispatch.event_id, id__gt=cursor)
+            .order_by('id').values_list('id', 'user_id')[:chunk_size]
+        )
+        now = timezone.now()
+        leased = NotificationDispatch.objects.filter(id=dispatch.id, lease_token=token)
+        if not favorites:
+            leased.update(completed_at=now, lease_token='', leased_until=None)
+            break
+        with transaction.atomic():
+            # Move the cursor first: if the lease was lost meanwhile, nothing is written
+            if not leased.update(
+                last_favorite_id=favorites[-1][0],
+                sent_count=F('sent_count') + len(favorites),
+                leased_until=now + timedelta(seconds=get_setting('LEASE_TIMEOUT')),
+            ):
+                logger.warning('Lost the lease on notification dispatch %s', dispatch.id)
+                return sent
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id, notification_type=dispatch.notification_type,
+                    message=message, related_event_id=dispatch.event_id,
+                )
+                for _, user_id in favorites
+            ])
+            unread.invalidate(user_id for _, user_id in favorites)
+        cursor = favorites[-1][0]
+        sent += len(favorites)
+        chunks += 1
+    else:
+        # Stopped early (max_chunks): let the next run pick it up straight away
+        NotificationDispatch.objects.filter(id=dispatch.id, lease_token=token).update(lease_token='', leased_until=None)
+    return sent
+
+
+def run_pending(chunk_size=None):
+    """Schedule, then run every unfinished dispatch; returns ``(dispatches run, notifications created)``."""
+    schedule()
+    runs = created = 0
+    for dispatch in NotificationDispatch.objects.filter(completed_at__isnull=True).order_by('scheduled_for', 'id'):
+        sent = run_dispatch(dispatch, chunk_size)
+        if sent is not None:
+            runs += 1
+            created += sent
+    return runs, created
@@ -0,0 +1,114 @@
+"""
+Idempotency keys for retried writes.
+
+A client that may retry a request (a mobile app on a flaky network) sends
+it with an ``Idempotency-Key`` header. The first request with a key runs,
+and its response is stored in ``IdempotencyKey`` in the same transaction
+as the write it describes. Later requests with that key get the stored
+response back, marked ``Idempotency-Replayed: true``, for ``TTL`` seconds.
+
+A concurrent retry waits for the first request's transaction, because on
+SQLite every transaction takes the write lock up front (see voting.db); on
+other databases it waits on the unique index. Either way it replays the
+committed response, so the write never happens twice.
+
+The action runs again if the transaction is retried because the database
+was locked. Writes outside the database (the vote queue file) must
+therefore be idempotent themselves; ``ingest.submit`` takes the key.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import db
+from .models import IdempotencyKey
+
+DEFAULTS = {
+    'TTL': 24 * 3600,
+}
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def get_setting(name):
+    return getattr(settings, 'IDEMPOTENCY', {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(request):
+    # The parsed body: the raw one is gone once DRF has read the stream
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.get_full_path()} {body}'.encode()).hexdigest()
+
+
+def lookup(user, key):
+    earliest = timezone.now() - timedelta(seconds=get_setting('TTL'))
+    return IdempotencyKey.objects.filter(user=user, key=key, created_at__gte=earliest).first()
+
+
+def replay(stored, request_fingerprint):
+    if stored.fingerprint != request_fingerprint:
+        return Response(
+            {'error': f'This {HEADER} was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored.response_body, status=stored.status_code)
+    response['Idempotency-Replayed'] = 'true'
+    return response
+
+
+def idempotent(action):
+    """Make a view method replay its stored response to requests repeating an ``Idempotency-Key``.
+
+    Only authenticated requests with the header are tracked; server errors
+    are not stored, so they can be retried.
+    """
+    @functools.wraps(action)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return action(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        request_fingerprint = fingerprint(request)
+
+        def run():
+            stored = lookup(request.user, key)
+            if stored is not None:
+                return replay(stored, request_fingerprint)
+            response = action(view, request, *args, **kwargs)
+            if response.status_code < 500:
+                # An expired record of the key would block the new one
+                IdempotencyKey.objects.filter(user=request.user, key=key).delete()
+                IdempotencyKey.objects.create(
+                    user=request.user, key=key, fingerprint=request_fingerprint,
+                    status_code=response.status_code, response_body=response.data,
+                )
+            return response
+
+        try:
+            return db.run_in_transaction(run)
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            stored = lookup(request.user, key)
+            if stored is None:
+                raise
+            return replay(stored, request_fingerprint)
+    return wrapper
+
+
+def purge_expired():
+    """Delete keys past their ``TTL``; returns how many."""
+    earliest = timezone.now() - timedelta(seconds=get_setting('TTL'))
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=earliest).delete()
+    return deleted
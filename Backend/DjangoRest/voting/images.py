@@ -0,0 +1,257 @@
+"""
+Candidate and profile pictures, stored by content hash, with resized variants.
+
+Uploads go through ``ImageStorage``, which names each file after the SHA-256
+of its bytes (``images/ab/abcd....jpg``). An upload identical to a stored
+picture writes nothing and points at the stored file.
+
+Once a new picture is written, a thread pool in the worker renders its
+``VARIANTS`` next to it (``images/ab/abcd.../thumb_webp``), so the upload
+request does not wait for the resizing. ``variant_view`` serves them at
+``/api/images/<sha256>/<variant>`` with a year-long immutable
+``Cache-Control``: a content-addressed URL never changes what it points to.
+A variant that is not rendered yet (the pool is still busy, or the worker
+restarted) is rendered by the first request for it.
+
+Serializers return the variant named by the ``?image=`` query parameter
+(``DEFAULT_VARIANT`` without one); ``original`` is the uploaded file.
+``manage.py process_images`` moves pictures uploaded before this into the
+store and renders missing variants.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.http import condition, require_safe
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'background',
+    'WORKERS': 2,
+    'QUALITY': 80,
+    'DEFAULT_VARIANT': 'original',
+    'CACHE_MAX_AGE': 365 * 24 * 3600,
+}
+
+# name: (how to resize, edge in pixels, format). A name is part of cached
+# URLs, so changing how a variant looks means giving it a new name.
+VARIANTS = {
+    'thumb': ('fit', 128, 'JPEG'),
+    'thumb_webp': ('fit', 128, 'WEBP'),
+    'medium': ('contain', 640, 'JPEG'),
+    'medium_webp': ('contain', 640, 'WEBP'),
+}
+ORIGINAL = 'original'
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+QUERY_PARAM = 'image'
+STORED_NAME = re.compile(r'images/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})\.\w+$')
+
+
+def get_setting(name):
+    return getattr(settings, 'IMAGES', {}).get(name, DEFAULTS[name])
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def digest_of(name):
+    """The content hash in a stored picture's name, or None for a file saved before the store."""
+    match = STORED_NAME.match(name or '')
+    return match.group('digest') if match else None
+
+
+class ImageStorage(FileSystemStorage):
+    """Media storage that keeps one copy of each distinct picture."""
+
+    def save(self, name, content, max_length=None):
+        name, created = self.store(name, content, max_length)
+        if created:
+            schedule(name)
+        return name
+
+    def store(self, name, content, max_length=None):
+        """Save ``content`` under its hash, without rendering variants; returns ``(name, created)``."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = f'images/{digest[:2]}/{digest}{extension}'
+        if self.exists(name):
+            return name, False
+        saved = super().save(name, content, max_length)
+        if saved != name:
+            # The same picture was written concurrently under ``name``; keep that copy
+            self.delete(saved)
+            return name, False
+        return name, True
+
+    def variant_name(self, digest, variant):
+        return f'images/{digest[:2]}/{digest}/{variant}'
+
+    def find_original(self, digest):
+        directory = f'images/{digest[:2]}'
+        if not self.exists(directory):
+            return None
+        for filename in self.listdir(directory)[1]:
+            if filename.startswith(f'{digest}.'):
+                return f'{directory}/{filename}'
+        return None
+
+    def write_atomic(self, name, data):
+        """Write ``data`` to ``name`` so that readers see the whole file or none of it."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as handle:
+                handle.write(data)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+storage = ImageStorage()
+
+
+def get_storage():
+    # Referenced by the image fields, so migrations don't serialize the storage
+    return storage
+
+
+def render(source, variant):
+    """The encoded bytes of ``variant`` of the picture in the file object ``source``."""
+    mode, edge, image_format = VARIANTS[variant]
+    with Image.open(source) as image:
+        # Lets the JPEG decoder scale down while decoding
+        image.draft('RGB', (edge, edge))
+        image = ImageOps.exif_transpose(image)
+        if mode == 'fit':
+            image = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # Flatten transparency onto white rather than black
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'P', 'PA') else 'RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=get_setting('QUALITY'))
+    return buffer.getvalue()
+
+
+def ensure_variant(digest, variant, original=None):
+    """Render ``variant`` of a stored picture unless it exists; returns its name, or None without the original."""
+    name = storage.variant_name(digest, variant)
+    if storage.exists(name):
+        return name
+    original = original or storage.find_original(digest)
+    if original is None:
+        return None
+    with storage.open(original, 'rb') as source:
+        storage.write_atomic(name, render(source, variant))
+    return name
+
+
+def render_variants(name):
+    """Render every missing variant of the stored picture ``name``; returns how many were rendered."""
+    digest = digest_of(name)
+    rendered = 0
+    for variant in VARIANTS:
+        if not storage.exists(storage.variant_name(digest, variant)):
+            ensure_variant(digest, variant, original=name)
+            rendered += 1
+    return rendered
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_setting('WORKERS'), thread_name_prefix='image-variants')
+        return _executor
+
+
+def _render_logged(name):
+    try:
+        render_variants(name)
+    except Exception:
+        # Left for the first request of each variant to render
+        logger.exception('Failed to render variants of %s', name)
+
+
+def schedule(name):
+    """Render the variants of a newly stored picture, in the pool unless ``MODE`` is 'sync'."""
+    if get_setting('MODE') == 'sync':
+        _render_logged(name)
+    else:
+        get_executor().submit(_render_logged, name)
+
+
+def requested_variant(context):
+    """The variant asked for by the request in a serializer ``context``, checked once per request."""
+    if 'image_variant' not in context:
+        request = context.get('request')
+        params = getattr(request, 'query_params', {}) if request is not None else {}
+        variant = params.get(QUERY_PARAM) or get_setting('DEFAULT_VARIANT')
+        if variant != ORIGINAL and variant not in VARIANTS:
+            raise ValidationError({QUERY_PARAM: f'Must be one of: {", ".join([ORIGINAL, *VARIANTS])}.'})
+        context['image_variant'] = variant
+    return context['image_variant']
+
+
+def variant_url(name, variant):
+    """URL path of ``variant`` of the picture stored as ``name``, or None to use the file's own URL."""
+    digest = digest_of(name)
+    if variant == ORIGINAL or digest is None:
+        return None
+    return reverse('image-variant', kwargs={'digest': digest, 'variant': variant})
+
+
+def _variant_etag(request, digest, variant):
+    return f'{digest}-{variant}'
+
+
+@require_safe
+@condition(etag_func=_variant_etag)
+def variant_view(request, digest, variant):
+    if variant not in VARIANTS:
+        raise Http404('No such image variant.')
+    name = ensure_variant(digest, variant)
+    if name is None:
+        raise Http404('No such image.')
+    response = FileResponse(storage.open(name, 'rb'), content_type=CONTENT_TYPES[VARIANTS[variant][2]])
+    response['Cache-Control'] = f'public, max-age={get_setting("CACHE_MAX_AGE")}, immutable'
+    return response
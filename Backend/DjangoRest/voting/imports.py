@@ -0,0 +1,115 @@
+"""
+Set-based writes of events and their candidates.
+
+``create_events()`` writes a batch of validated events with one
+``bulk_create`` each for the events, their category links and their
+candidates, however many rows there are. ``sync_candidates()`` brings an
+event's candidates in line with a submitted list: it creates, updates and
+deletes candidates with one statement each.
+
+Bulk writes send no model signals, so both functions refresh the search
+index and the response cache versions themselves. They run in the caller's
+transaction. ``POST /api/events/import/``, ``manage.py import_events`` and
+``VotingEventCreateSerializer`` all use them.
+"""
+from django.conf import settings
+from django.db import models
+
+from . import event_tokens, response_cache, search
+from .models import Candidate, VotingEvent
+
+DEFAULTS = {
+    'MAX_EVENTS': 500,
+    'BATCH_SIZE': 500,
+}
+
+# What an update may change on an existing candidate
+CANDIDATE_FIELDS = ('name', 'description', 'profile_pic')
+
+
+def get_setting(name):
+    return getattr(settings, 'IMPORTS', {}).get(name, DEFAULTS[name])
+
+
+def unique_tokens(count):
+    """``count`` new event tokens, none of them in use."""
+    tokens = set()
+    while len(tokens) < count:
+        candidates = {event_tokens.generate() for _ in range(count - len(tokens))}
+        taken = set(VotingEvent.objects.filter(event_token__in=candidates).values_list('event_token', flat=True))
+        tokens |= candidates - taken
+    return list(tokens)
+
+
+def create_events(rows, created_by):
+    """Create an event per validated row, with its ``categories`` (ids) and ``candidates``; returns the events."""
+    batch_size = get_setting('BATCH_SIZE')
+    events = []
+    for row in rows:
+        fields = {key: value for key, value in row.items() if key not in ('categories', 'candidates')}
+        events.append(VotingEvent(created_by=created_by, **fields))
+    private = [event for event in events if event.is_private]
+    for event, token in zip(private, unique_tokens(len(private))):
+        event.event_token = token
+    VotingEvent.objects.bulk_create(events, batch_size=batch_size)
+
+    Link = VotingEvent.categories.through
+    Link.objects.bulk_create(
+        [
+            Link(votingevent_id=event.id, category_id=getattr(category, 'pk', category))
+            for event, row in zip(events, rows)
+            for category in set(row.get('categories', []))
+        ],
+        batch_size=batch_size,
+    )
+    Candidate.objects.bulk_create(
+        [
+            Candidate(voting_event_id=event.id, **{key: value for key, value in candidate.items() if key != 'id'})
+            for event, row in zip(events, rows)
+            for candidate in row.get('candidates', [])
+        ],
+        batch_size=batch_size,
+    )
+
+    event_ids = [event.id for event in events]
+    search.index_events(event_ids)
+    response_cache.bump_on_commit(event_ids)
+    return events
+
+
+def sync_candidates(event, rows):
+    """Make ``event``'s candidates match ``rows``: rows with an ``id`` update that candidate,
+    rows without one are created, and candidates not listed are deleted.
+
+    Ids must belong to the event; callers validate that first.
+    """
+    existing = {candidate.id: candidate for candidate in event.candidates.all()}
+    changed, fields, new = [], set(), []
+    for row in rows:
+        candidate = existing.get(row.get('id'))
+        if candidate is None:
+            new.append(Candidate(voting_event_id=event.id, **{key: value for key, value in row.items() if key != 'id'}))
+            continue
+        updates = {key: value for key, value in row.items() if key in CANDIDATE_FIELDS
+                   and getattr(candidate, key) != value}
+        if updates:
+            for key, value in updates.items():
+                setattr(candidate, key, value)
+                field = Candidate._meta.get_field(key)
+                if isinstance(field, models.FileField):
+                    # bulk_update only writes the column; store a new upload as save() would
+                    field.pre_save(candidate, add=False)
+            changed.append(candidate)
+            fields.update(updates)
+    removed = existing.keys() - {row.get('id') for row in rows}
+
+    if removed:
+        Candidate.objects.filter(id__in=removed).delete()
+    if changed:
+        Candidate.objects.bulk_update(changed, sorted(fields), batch_size=get_setting('BATCH_SIZE'))
+    if new:
+        Candidate.objects.bulk_create(new, batch_size=get_setting('BATCH_SIZE'))
+    if changed or new:
+        # The delete above already sent signals
+        search.index_events([event.id])
+        response_cache.bump_on_commit([event.id])
@@ -0,0 +1,463 @@
+"""
+Queued vote ingestion.
+
+With ``VOTE_INGESTION['MODE'] = 'queued'`` the vote endpoint only appends the
+ballot to a durable SQLite queue file that lives next to the main database and
+answers straight away. A drainer (a background thread in every worker, or the
+``drain_votes`` management command) claims ballots in batches and writes each
+batch in a single transaction, dating the votes from when each ballot was
+accepted rather than when it is written: one ``bulk_create`` of ``Vote``
+rows, one vote counter update per candidate and one ``bulk_create`` of
+activity logs.
+
+The endpoint does not read the main database at all: the drainer checks
+the candidate and earlier votes, and a ballot that fails these checks is
+rejected. Processed ballots stay in the queue file for ``TICKET_RETENTION``
+seconds with their status (``applied``, ``rejected`` with a reason, or
+``failed``), which clients read back by ticket, and the queue's own
+``(event_id, voter_id)`` constraint refuses a second ballot meanwhile.
+
+A ballot the database refuses (say, its voter was deleted meanwhile) fails
+its whole batch. The batch is then applied one ballot at a time, and the
+ballots that still fail are copied to the queue file's ``dead_ballots``
+table with the error, marked ``failed`` and logged, instead of being
+retried forever.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import ActivityLog, Candidate, Vote
+from .signals import votes_committed
+
+logger = logging.getLogger(__name__)
+
+# accepted_at is None for ballots queued before accept times were stored
+Ballot = namedtuple('Ballot', 'ticket event_id candidate_id voter_id is_anonymous ip_address accepted_at',
+                    defaults=(None,))
+
+DEFAULTS = {
+    'MODE': 'sync',
+    'QUEUE_PATH': None,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.2,
+    'CLAIM_TIMEOUT': 60,
+    'AUTODRAIN': True,
+    'TICKET_RETENTION': 24 * 60 * 60,
+}
+
+QUEUED, APPLIED, REJECTED, FAILED = 'queued', 'applied', 'rejected', 'failed'
+
+# Roughly one acknowledgement in PRUNE_EVERY also drops expired tickets
+PRUNE_EVERY = 100
+
+
+def get_setting(name):
+    return getattr(settings, 'VOTE_INGESTION', {}).get(name, DEFAULTS[name])
+
+
+def is_queued():
+    return get_setting('MODE') == 'queued'
+
+
+class VoteQueue:
+    """Ballots accepted by the API, and for a while what became of them.
+
+    ``(event_id, voter_id)`` is unique in the queue as well, so a second ballot
+    from the same voter is refused before it is ever acknowledged, unless the
+    first one was rejected or failed.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ballots ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' event_id INTEGER NOT NULL,'
+                ' candidate_id INTEGER NOT NULL,'
+                ' voter_id INTEGER NOT NULL,'
+                ' is_anonymous INTEGER NOT NULL DEFAULT 0,'
+                ' ip_address TEXT,'
+                ' claimed_by TEXT,'
+                ' claimed_at REAL,'
+                ' accepted_at REAL,'
+                ' request_key TEXT,'
+                " status TEXT NOT NULL DEFAULT 'queued',"
+                ' reason TEXT,'
+                ' finished_at REAL,'
+                ' UNIQUE (event_id, voter_id))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS dead_ballots ('
+                ' id INTEGER PRIMARY KEY,'
+                ' event_id INTEGER NOT NULL,'
+                ' candidate_id INTEGER NOT NULL,'
+                ' voter_id INTEGER NOT NULL,'
+                ' is_anonymous INTEGER NOT NULL,'
+                ' ip_address TEXT,'
+                ' accepted_at REAL,'
+                ' error TEXT NOT NULL,'
+                ' failed_at REAL NOT NULL)'
+            )
+            for table in ('ballots', 'dead_ballots'):
+                self._add_column(conn, table, 'accepted_at REAL')
+            self._add_column(conn, 'ballots', 'request_key TEXT')
+            self._add_column(conn, 'ballots', "status TEXT NOT NULL DEFAULT 'queued'")
+            self._add_column(conn, 'ballots', 'reason TEXT')
+            self._add_column(conn, 'ballots', 'finished_at REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS ballots_status ON ballots (status, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ballots_finished ON ballots (finished_at)')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _add_column(conn, table, column):
+        """Add ``column`` to a table of a queue file written by an older version."""
+        name = column.split()[0]
+        if name in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            return
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+        except sqlite3.OperationalError as exc:
+            # Another process added it first
+            if 'duplicate column' not in str(exc):
+                raise
+
+    def put(self, event_id, candidate_id, voter_id, is_anonymous=False, ip_address=None, request_key=None):
+        """Queue a ballot and return its ticket, or ``None`` if the voter already has one.
+
+        Putting again with the same ``request_key`` (the client's
+        Idempotency-Key) returns the ticket already queued: a retried
+        request is the same ballot, not a second one. A rejected or failed
+        ballot is replaced by the new one.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, status, request_key FROM ballots WHERE event_id = ? AND voter_id = ?',
+                (event_id, voter_id),
+            ).fetchone()
+            if row is not None:
+                ticket, state, key = row
+                if request_key is not None and key == request_key:
+                    conn.execute('COMMIT')
+                    return ticket
+                if state not in (REJECTED, FAILED):
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute('DELETE FROM ballots WHERE id = ?', (ticket,))
+            cursor = conn.execute(
+                'INSERT INTO ballots'
+                ' (event_id, candidate_id, voter_id, is_anonymous, ip_address, accepted_at, request_key)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (event_id, candidate_id, voter_id, int(bool(is_anonymous)), ip_address, time.time(), request_key),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.lastrowid
+
+    def claim(self, limit, timeout=60):
+        """Lease up to ``limit`` ballots to this caller; stale leases are handed out again."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'UPDATE ballots SET claimed_by = ?, claimed_at = ? WHERE id IN ('
+            ' SELECT id FROM ballots WHERE status = ? AND (claimed_by IS NULL OR claimed_at < ?)'
+            ' ORDER BY id LIMIT ?)',
+            (token, now, QUEUED, now - timeout, limit),
+        )
+        rows = conn.execute(
+            'SELECT id, event_id, candidate_id, voter_id, is_anonymous, ip_address, accepted_at'
+            ' FROM ballots WHERE claimed_by = ? AND status = ? ORDER BY id',
+            (token, QUEUED),
+        ).fetchall()
+        return [
+            Ballot(row[0], row[1], row[2], row[3], bool(row[4]), row[5],
+                   datetime.fromtimestamp(row[6], dt_timezone.utc) if row[6] is not None else None)
+            for row in rows
+        ]
+
+    def ack(self, applied, rejected=()):
+        """Record that ``applied`` ballots were written and ``rejected`` ``(ballot, reason)`` pairs were not."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN')
+        conn.executemany(
+            'UPDATE ballots SET status = ?, finished_at = ? WHERE id = ?',
+            [(APPLIED, now, b.ticket) for b in applied],
+        )
+        conn.executemany(
+            'UPDATE ballots SET status = ?, reason = ?, finished_at = ? WHERE id = ?',
+            [(REJECTED, reason, now, b.ticket) for b, reason in rejected],
+        )
+        conn.execute('COMMIT')
+        if random.randrange(PRUNE_EVERY) == 0:
+            self.prune()
+
+    def release(self, ballots):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        conn.executemany(
+            'UPDATE ballots SET claimed_by = NULL, claimed_at = NULL WHERE id = ?',
+            [(b.ticket,) for b in ballots],
+        )
+        conn.execute('COMMIT')
+
+    def bury(self, ballot, error):
+        """Copy a ballot that cannot be applied to ``dead_ballots``, with the error, and mark it failed."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO dead_ballots'
+                ' (id, event_id, candidate_id, voter_id, is_anonymous, ip_address, accepted_at, error, failed_at)'
+                ' SELECT id, event_id, candidate_id, voter_id, is_anonymous, ip_address, accepted_at, ?, ?'
+                ' FROM ballots WHERE id = ?',
+                (error, time.time(), ballot.ticket),
+            )
+            conn.execute(
+                'UPDATE ballots SET status = ?, reason = ?, finished_at = ? WHERE id = ?',
+                (FAILED, 'could not be recorded', time.time(), ballot.ticket),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def status(self, ticket):
+        """``(event_id, voter_id, status, reason)`` of a ticket, or ``None`` once it has expired."""
+        return self._connection().execute(
+            'SELECT event_id, voter_id, status, reason FROM ballots WHERE id = ?', (ticket,),
+        ).fetchone()
+
+    def prune(self, retention=None):
+        """Forget ballots finished more than ``retention`` seconds ago."""
+        if retention is None:
+            retention = get_setting('TICKET_RETENTION')
+        self._connection().execute('DELETE FROM ballots WHERE finished_at < ?', (time.time() - retention,))
+
+    def dead_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM dead_ballots').fetchone()[0]
+
+    def __len__(self):
+        """Number of ballots still waiting to be written."""
+        return self._connection().execute('SELECT COUNT(*) FROM ballots WHERE status = ?', (QUEUED,)).fetchone()[0]
+
+
+def apply_ballots(ballots):
+    """Write a batch of ballots in one transaction.
+
+    Returns ``(applied, rejected)``, the latter as ``(ballot, reason)`` pairs.
+    A ballot is rejected when its voter already has a ``Vote`` for the event
+    (or appears earlier in the same batch), or when the candidate does not
+    belong to the event.
+    """
+    if not ballots:
+        return [], []
+
+    applied, rejected = [], []
+    with transaction.atomic():
+        seen = set(
+            Vote.objects.filter(
+                voting_event_id__in={b.event_id for b in ballots},
+                voter_id__in={b.voter_id for b in ballots},
+            ).values_list('voting_event_id', 'voter_id')
+        )
+        candidates = dict(
+            Candidate.objects.filter(id__in={b.candidate_id for b in ballots})
+            .values_list('id', 'voting_event_id')
+        )
+
+        for ballot in ballots:
+            key = (ballot.event_id, ballot.voter_id)
+            if candidates.get(ballot.candidate_id) != ballot.event_id:
+                rejected.append((ballot, 'Invalid candidate'))
+                continue
+            if key in seen:
+                rejected.append((ballot, 'You have already voted in this event'))
+                continue
+            seen.add(key)
+            applied.append(ballot)
+
+        # Votes are cast when the API accepted them, not when the drainer got to them
+        now = timezone.now()
+        cast_at = {b.ticket: b.accepted_at or now for b in applied}
+        votes = Vote.objects.bulk_create([
+            Vote(
+                voting_event_id=b.event_id,
+                candidate_id=b.candidate_id,
+                voter_id=b.voter_id,
+                is_anonymous=b.is_anonymous,
+                created_at=cast_at[b.ticket],
+            )
+            for b in applied
+        ])
+
+        for candidate_id, count in Counter(b.candidate_id for b in applied).items():
+            counters.add_votes(candidate_id, count)
+
+        logs = [
+            ActivityLog(
+                user_id=b.voter_id, action_type='vote', event_id=b.event_id,
+                candidate_id=b.candidate_id, ip_address=b.ip_address,
+            )
+            for b in applied
+        ]
+        ActivityLog.objects.bulk_create(logs)
+
+        # SQLite returns the new ids; its writes are serialized, so they grow in commit order
+        through = {}
+        for vote in votes:
+            if vote.id is not None:
+                through[vote.voting_event_id] = max(through.get(vote.voting_event_id, 0), vote.id)
+        per_event = {}
+        for b in applied:
+            per_event.setdefault(b.event_id, Counter())[b.candidate_id] += 1
+        for event_id, deltas in per_event.items():
+            transaction.on_commit(
+                lambda event_id=event_id, deltas=dict(deltas): votes_committed.send(
+                    sender=Vote, event_id=event_id, deltas=deltas, through=through.get(event_id),
+                )
+            )
+
+    return applied, rejected
+
+
+def apply_one_by_one(queue, ballots):
+    """Apply and acknowledge ``ballots`` one at a time, burying those the database refuses.
+
+    Returns ``(applied, rejected, buried)``. Any other error releases the
+    ballots not yet done and propagates, as it would for a batch.
+    """
+    applied, rejected, buried = [], [], []
+    for index, ballot in enumerate(ballots):
+        try:
+            done, refused = apply_ballots([ballot])
+        except (IntegrityError, DataError) as exc:
+            logger.error(
+                'Moved queued ballot %s (event %s, voter %s, candidate %s) to dead_ballots: %s',
+                ballot.ticket, ballot.event_id, ballot.voter_id, ballot.candidate_id, exc,
+            )
+            queue.bury(ballot, f'{type(exc).__name__}: {exc}')
+            buried.append(ballot)
+            continue
+        except Exception:
+            queue.release(ballots[index:])
+            raise
+        queue.ack(done, refused)
+        applied += done
+        rejected += refused
+    return applied, rejected, buried
+
+
+def drain(queue, batch_size=None, max_batches=None):
+    """Apply queued ballots until the queue is empty; returns ``(applied, rejected)`` counts.
+
+    Buried ballots (see ``apply_one_by_one``) count as rejected.
+    """
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    totals = [0, 0]
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ballots = queue.claim(batch_size, timeout=get_setting('CLAIM_TIMEOUT'))
+        if not ballots:
+            break
+        buried = []
+        try:
+            applied, rejected = apply_ballots(ballots)
+        except (IntegrityError, DataError):
+            # A ballot that passed the checks and the database still refused; find it
+            applied, rejected, buried = apply_one_by_one(queue, ballots)
+        except Exception:
+            queue.release(ballots)
+            raise
+        else:
+            queue.ack(applied, rejected)
+        if rejected:
+            logger.info('Rejected %d queued ballots (duplicate voter or invalid candidate)', len(rejected))
+        totals[0] += len(applied)
+        totals[1] += len(rejected) + len(buried)
+        batches += 1
+    return tuple(totals)
+
+
+class QueueDrainer(threading.Thread):
+    """Background thread that keeps draining the queue of this worker process."""
+
+    def __init__(self, queue):
+        super().__init__(name='vote-queue-drainer', daemon=True)
+        self.queue = queue
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = get_setting('FLUSH_INTERVAL')
+        while not self.stopped.is_set():
+            try:
+                drain(self.queue)
+            except Exception:
+                logger.exception('Failed to drain vote queue')
+            finally:
+                close_old_connections()
+            self.stopped.wait(interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+_queue = None
+_drainer = None
+_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    path = get_setting('QUEUE_PATH') or settings.BASE_DIR / 'vote_queue.sqlite3'
+    with _lock:
+        if _queue is None or _queue.path != str(path):
+            _queue = VoteQueue(path)
+        return _queue
+
+
+def ensure_drainer():
+    global _drainer
+    queue = get_queue()
+    with _lock:
+        if _drainer is None or not _drainer.is_alive() or _drainer.queue is not queue:
+            if _drainer is not None:
+                _drainer.stop()
+            _drainer = QueueDrainer(queue)
+            _drainer.start()
+    return _drainer
+
+
+def submit(event_id, candidate_id, voter_id, is_anonymous=False, ip_address=None, request_key=None):
+    """Queue a ballot for the current worker's drainer; returns the ticket or ``None`` on duplicates.
+
+    The candidate is not checked here; see ``apply_ballots``.
+    """
+    ticket = get_queue().put(event_id, candidate_id, voter_id, is_anonymous, ip_address, request_key)
+    if ticket is not None and get_setting('AUTODRAIN'):
+        ensure_drainer()
+    return ticket
@@ -0,0 +1,37 @@
+import re
+
+from django.core.management.base import BaseCommand
+
+from voting.models import ActivityLog
+
+# The free-text format the vote endpoint used to write
+VOTE_ACTION = re.compile(r'^Voted for .* \(ID: (?P<candidate>\d+)\) in .* \(ID: (?P<event>\d+)\)$')
+
+
+class Command(BaseCommand):
+    help = 'Fill action_type, event and candidate of activity logs written as free text.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        logs = ActivityLog.objects.filter(action_type='other', event_id__isnull=True).order_by('id')
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(logs.filter(id__gt=last_id).only('id', 'action')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            parsed = []
+            for log in batch:
+                match = VOTE_ACTION.match(log.action)
+                if match:
+                    log.action_type = 'vote'
+                    log.event_id = int(match['event'])
+                    log.candidate_id = int(match['candidate'])
+                    parsed.append(log)
+            ActivityLog.objects.bulk_update(parsed, ['action_type', 'event', 'candidate'])
+            updated += len(parsed)
+        self.stdout.write(f'Backfilled {updated} activity logs.')
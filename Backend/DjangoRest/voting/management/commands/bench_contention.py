@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from voting import activity, counters
+from voting.api.views import VotingEventViewSet
+from voting.benchmarks import percentile, isolated_database
+from voting.models import Candidate, Vote, VotingEvent
+
+# The plain sqlite3 backend: rollback journal, deferred transactions, a new
+# connection per request and no retries
+BASELINE = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'ATTEMPTS': 1}
+
+
+class Command(BaseCommand):
+    help = 'Measure vote latency and error rate with many threads voting on one event, on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--votes', type=int, default=50, help='Votes per thread.')
+        parser.add_argument('--candidates', type=int, default=4)
+        parser.add_argument('--baseline', action='store_true', help='Also run without the write-path hardening.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        database = connections['default'].settings_dict
+        configured = {
+            'OPTIONS': database.get('OPTIONS', {}),
+            'CONN_MAX_AGE': database.get('CONN_MAX_AGE', 0),
+            'ATTEMPTS': None,
+        }
+        modes = {'baseline': BASELINE} if options['baseline'] else {}
+        modes['configured'] = configured
+
+        results = {}
+        for mode, config in modes.items():
+            results[mode] = self.run(config, options['threads'], options['votes'], options['candidates'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:>10}: {result['per_second']:>8} votes/s, p50 {result['p50_ms']} ms / "
+                f"p99 {result['p99_ms']} ms, {result['errors']} errors ({result['error_rate']:.2%}) "
+                f"of {result['operations']} votes from {result['threads']} threads"
+            )
+
+    def run(self, config, threads, votes, candidates):
+        database = connections['default'].settings_dict
+        saved = {key: database.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE')}
+        connections.close_all()
+        database['OPTIONS'] = config['OPTIONS']
+        database['CONN_MAX_AGE'] = config['CONN_MAX_AGE']
+        writes = override_settings(DATABASE_WRITES={'ATTEMPTS': config['ATTEMPTS']}) if config['ATTEMPTS'] else None
+        try:
+            if writes:
+                writes.enable()
+            with isolated_database():
+                return self.storm(threads, votes, candidates)
+        finally:
+            if writes:
+                writes.disable()
+            connections.close_all()
+            database.update(saved)
+
+    def storm(self, threads, votes, candidates):
+        User.objects.bulk_create(
+            [User(username=f'bench-voter-{i}') for i in range(threads * votes)], batch_size=1000,
+        )
+        users = list(User.objects.filter(username__startswith='bench-voter-').order_by('id'))
+        now = timezone.now()
+        event = VotingEvent.objects.create(
+            event_name='Contention storm', created_by=users[0],
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+        )
+        Candidate.objects.bulk_create([Candidate(voting_event=event, name=f'Candidate {i}') for i in range(candidates)])
+        candidate_ids = list(event.candidates.values_list('id', flat=True))
+        # The connection that created the data is not needed by the workers
+        connections.close_all()
+
+        # Minus throttling, so the storm is not capped per user
+        view = VotingEventViewSet.as_view({'post': 'vote'}, **VotingEventViewSet.vote.kwargs, throttle_classes=[])
+        factory = APIRequestFactory()
+        samples, errors = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def worker(index):
+            latencies, failed = [], []
+            start.wait()
+            for user in users[index * votes:(index + 1) * votes]:
+                request = factory.post(
+                    f'/api/events/{event.id}/vote/',
+                    {'candidate': candidate_ids[user.id % len(candidate_ids)]}, format='json',
+                )
+                force_authenticate(request, user=user)
+                began = time.perf_counter()
+                try:
+                    response = view(request, pk=event.id)
+                    if response.status_code != 200:
+                        failed.append(f'{response.status_code}: {response.data}')
+                except Exception as exc:
+                    failed.append(f'{type(exc).__name__}: {exc}')
+                finally:
+                    latencies.append(time.perf_counter() - began)
+                    # End of request: closes the connection unless CONN_MAX_AGE keeps it
+                    close_old_connections()
+            connections.close_all()
+            with lock:
+                samples.extend(latencies)
+                errors.extend(failed)
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        began = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        activity.flush()
+
+        self.verify(event, len(samples) - len(errors))
+        if errors:
+            self.stderr.write(f'First error: {errors[0]}')
+        return {
+            'threads': threads,
+            'operations': len(samples),
+            'seconds': round(elapsed, 4),
+            'per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3),
+            'errors': len(errors),
+            'error_rate': len(errors) / len(samples) if samples else 0.0,
+        }
+
+    def verify(self, event, expected):
+        votes = Vote.objects.filter(voting_event=event).count()
+        counted = sum(counters.get_counts(event.id, use_cache=False).values())
+        if votes != expected or counted != expected:
+            raise AssertionError(f'expected {expected} votes, got {votes} rows / {counted} counted')
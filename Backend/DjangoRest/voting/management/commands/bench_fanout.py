@@ -0,0 +1,86 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from voting import fanout
+from voting.benchmarks import Stopwatch, isolated_database
+from voting.models import Favorite, Notification, NotificationDispatch, VotingEvent
+
+
+class Command(BaseCommand):
+    help = 'Fan an event_start notification out to many favoriters, interrupted once, on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--favoriters', type=int, default=100_000)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        favoriters = options['favoriters']
+        chunk_size = options['chunk_size'] or fanout.get_setting('CHUNK_SIZE')
+        with isolated_database():
+            event = self.populate(favoriters)
+            fanout.schedule()
+            dispatch = NotificationDispatch.objects.get(event=event, notification_type='event_start')
+
+            with Stopwatch() as watch:
+                # Stop halfway, as if the worker had been killed, then resume
+                with watch.lap():
+                    first = fanout.run_dispatch(dispatch, chunk_size, max_chunks=max(1, favoriters // chunk_size // 2))
+                dispatch.refresh_from_db()
+                with watch.lap():
+                    rest = fanout.run_dispatch(dispatch, chunk_size)
+            # A second pass of the scheduler must find nothing to send
+            again = fanout.run_pending(chunk_size)
+            dispatch.refresh_from_db()
+            created = Notification.objects.filter(related_event=event, notification_type='event_start').count()
+            duplicates = created - Notification.objects.filter(
+                related_event=event, notification_type='event_start',
+            ).values('user_id').distinct().count()
+
+        result = {
+            'favoriters': favoriters,
+            'chunk_size': chunk_size,
+            'created': created,
+            'before_interruption': first,
+            'after_resume': rest,
+            'rerun_created': again[1],
+            'duplicates': duplicates,
+            'seconds': round(watch.elapsed, 3),
+            'notifications_per_second': round(created / watch.elapsed, 1),
+            'completed': dispatch.completed_at is not None,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(
+                f"{created} notifications for {favoriters} favoriters in {result['seconds']} s "
+                f"({result['notifications_per_second']}/s, chunks of {chunk_size}); "
+                f"{first} before the interruption, {rest} after resuming, {again[1]} on rerun, "
+                f"{duplicates} duplicates"
+            )
+        if created != favoriters or duplicates or again[1] or not result['completed']:
+            raise CommandError('Fan-out was not exactly once.')
+
+    def populate(self, favoriters, batch_size=20_000):
+        owner = User.objects.create(username='bench-owner')
+        now = timezone.now()
+        event = VotingEvent.objects.create(
+            event_name='Bench event', created_by=owner,
+            start_time=now - timedelta(seconds=5), end_time=now + timedelta(hours=1),
+        )
+        for start in range(0, favoriters, batch_size):
+            stop = min(favoriters, start + batch_size)
+            User.objects.bulk_create(
+                [User(username=f'bench-fan-{i}') for i in range(start, stop)], batch_size=batch_size,
+            )
+            users = User.objects.filter(username__startswith='bench-fan-').order_by('-id').values_list('id', flat=True)
+            Favorite.objects.bulk_create(
+                [Favorite(user_id=user_id, event=event) for user_id in users[:stop - start]], batch_size=batch_size,
+            )
+            self.stderr.write(f'\rCreated {stop}/{favoriters} favoriters', ending='')
+        self.stderr.write('')
+        return event
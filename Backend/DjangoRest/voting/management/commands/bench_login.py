@@ -0,0 +1,87 @@
+import json
+import random
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from voting import email_index
+from voting.benchmarks import Stopwatch, isolated_database
+
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time email login against a large user table, separating the user lookup '
+        '(iexact scan vs. the normalized email index) from password hashing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--lookups', type=int, default=1000, help='Index lookups and logins to time.')
+        parser.add_argument('--scans', type=int, default=5, help='iexact lookups to time; each scans the table.')
+        parser.add_argument('--hashes', type=int, default=5, help='Password checks and full logins to time.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with isolated_database():
+            self.populate(options['users'])
+            emails = [self.email(i) for i in range(options['users'])]
+            user = authenticate(username=emails[0].upper(), password=PASSWORD)
+            if user is None:
+                raise CommandError(f'Could not log in as {emails[0].upper()}')
+            results = {
+                'users': options['users'],
+                'lookup_iexact': self.time(
+                    options['scans'],
+                    lambda: User.objects.filter(email__iexact=rng.choice(emails)).first(),
+                ),
+                'lookup_index': self.time(options['lookups'], lambda: email_index.find_user(rng.choice(emails))),
+                'lookup_index_miss': self.time(
+                    options['lookups'], lambda: email_index.find_user(f'nobody-{rng.random()}@example.com'),
+                ),
+                'check_password': self.time(options['hashes'], lambda: user.check_password(PASSWORD)),
+                'authenticate': self.time(
+                    options['hashes'], lambda: authenticate(username=rng.choice(emails).upper(), password=PASSWORD),
+                ),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{results['users']} users")
+        for name, row in results.items():
+            if name != 'users':
+                self.stdout.write(
+                    f"{name:<18} {row['operations']:>6} ops  p50 {row['p50_ms']:>10} ms  p99 {row['p99_ms']:>10} ms"
+                )
+
+    def email(self, i):
+        # Mixed case, as people type them
+        return f'Bench.User{i}@Example.com'
+
+    def populate(self, count, batch_size=20_000):
+        # One hash for everyone: hashing a million passwords is not what is measured
+        password = make_password(PASSWORD)
+        for start in range(0, count, batch_size):
+            User.objects.bulk_create(
+                User(username=f'bench-user-{i}', email=self.email(i), password=password)
+                for i in range(start, min(count, start + batch_size))
+            )
+            self.stderr.write(f'\rInserted {min(count, start + batch_size)}/{count} users', ending='')
+        self.stderr.write('')
+        indexed, _ = email_index.rebuild()
+        self.stderr.write(f'Indexed {indexed} addresses')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def time(self, count, operation):
+        with Stopwatch() as watch:
+            for _ in range(count):
+                with watch.lap():
+                    operation()
+        return watch.summary()
@@ -0,0 +1,97 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from voting.api.pagination import KeysetPagination
+from voting.api.views import NotificationViewSet
+from voting.benchmarks import isolated_database
+from voting.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Compare deep-page latency of page-number and keyset pagination on a large notification table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--depths', type=float, nargs='+', default=[0.01, 0.5, 0.99])
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            user = User.objects.create(username='bench-reader')
+            self.populate(user, options['rows'])
+            results = [
+                self.measure(user, depth, options['rows'], options['page_size'], options['repeat'])
+                for depth in options['depths']
+            ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for row in results:
+            self.stdout.write(
+                f"depth {row['depth']:>5.0%} (row {row['offset']:>9}): "
+                f"page-number {row['page_number_ms']:>9} ms / {row['page_number_queries']} queries, "
+                f"keyset {row['keyset_ms']:>7} ms / {row['keyset_queries']} queries"
+            )
+
+    def populate(self, user, rows, batch_size=20_000):
+        for start in range(0, rows, batch_size):
+            Notification.objects.bulk_create(
+                Notification(user=user, notification_type='vote_update', message=f'Update {i}')
+                for i in range(start, min(rows, start + batch_size))
+            )
+            self.stderr.write(f'\rInserted {min(rows, start + batch_size)}/{rows} notifications', ending='')
+        self.stderr.write('')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, user, depth, rows, page_size, repeat):
+        offset = min(rows - 1, int(depth * rows))
+        queryset = Notification.objects.filter(user=user).order_by('-created_at', '-id')
+
+        page_number = NotificationViewSet.as_view({'get': 'list'}, pagination_class=PageNumberPagination)
+        page_ms, page_queries = self.time_view(
+            page_number, f'/api/notifications/?page={offset // page_size + 1}', user, repeat
+        )
+
+        # The cursor a client would hold after paging down to the same row
+        paginator = KeysetPagination()
+        paginator.bind(queryset)
+        cursor = paginator.cursor_for(queryset[offset])
+        keyset = NotificationViewSet.as_view({'get': 'list'})
+        keyset_ms, keyset_queries = self.time_view(
+            keyset, f'/api/notifications/?page_size={page_size}&cursor={cursor}', user, repeat
+        )
+        return {
+            'depth': depth,
+            'offset': offset,
+            'page_number_ms': page_ms,
+            'page_number_queries': page_queries,
+            'keyset_ms': keyset_ms,
+            'keyset_queries': keyset_queries,
+        }
+
+    def time_view(self, view, path, user, repeat):
+        samples = []
+        for _ in range(repeat):
+            request = APIRequestFactory().get(path)
+            force_authenticate(request, user=user)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = view(request)
+                response.render()
+                samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+        return round(statistics.median(samples) * 1000, 2), len(queries)
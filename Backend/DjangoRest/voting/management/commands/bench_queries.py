@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from voting.benchmarks import isolated_database
+from voting.models import Candidate, Category, Favorite, VotingEvent
+
+# Queries allowed per request, independent of how many events are returned
+QUERY_BUDGETS = {
+    # events (+ status/favorited annotations), categories, candidates, vote totals
+    '/api/events/': 4,
+    # event, categories, candidates, vote totals
+    '/api/events/{id}/': 4,
+    '/api/users/favorites/': 4,
+    '/api/users/events/': 4,
+}
+
+# Queries for the same request answered from the response cache (voting.response_cache):
+# only the viewer's favorites, for the per-user overlay
+CACHED_BUDGETS = {
+    '/api/events/': 1,
+    '/api/events/{id}/': 1,
+}
+
+
+class Command(BaseCommand):
+    help = 'Assert that event listing endpoints run a fixed number of queries whatever the page size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[3, 20])
+
+    def handle(self, *args, **options):
+        failures = []
+        for path, budget in QUERY_BUDGETS.items():
+            counts = {}
+            cached_counts = {}
+            for size in options['sizes']:
+                with isolated_database(on_disk=False):
+                    viewer, event_id = self.populate(size)
+                    counts[size] = self.count_queries(path.format(id=event_id), viewer)
+                    if path in CACHED_BUDGETS:
+                        cached_counts[size] = self.count_queries(path.format(id=event_id), viewer, cold=False)
+            self.stdout.write(f'{path:<24} budget {budget}: ' + ', '.join(
+                f'{size} events -> {count} queries' for size, count in counts.items()
+            ))
+            if len(set(counts.values())) > 1 or max(counts.values()) > budget:
+                failures.append(path)
+            if cached_counts:
+                self.stdout.write(f'{"  (cached)":<24} budget {CACHED_BUDGETS[path]}: ' + ', '.join(
+                    f'{size} events -> {count} queries' for size, count in cached_counts.items()
+                ))
+                if max(cached_counts.values()) > CACHED_BUDGETS[path]:
+                    failures.append(f'{path} (cached)')
+
+        if failures:
+            raise CommandError(f'Query budget exceeded or not constant for: {", ".join(failures)}')
+
+    def populate(self, size):
+        viewer = User.objects.create(username='viewer')
+        now = timezone.now()
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(3)])
+        events = []
+        for i in range(size):
+            start = now + timedelta(hours=i - size // 2)
+            event = VotingEvent.objects.create(
+                event_name=f'Event {i}', created_by=viewer,
+                start_time=start, end_time=start + timedelta(hours=1),
+            )
+            event.categories.set(categories[:1 + i % 3])
+            Candidate.objects.bulk_create([Candidate(voting_event=event, name=f'Candidate {j}') for j in range(3)])
+            events.append(event)
+        Favorite.objects.bulk_create([Favorite(user=viewer, event=event) for event in events])
+        return viewer, events[0].id
+
+    def count_queries(self, path, user, cold=True):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        match = resolve(path)
+        if cold:
+            # No cached responses or vote totals
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = match.func(request, *match.args, **match.kwargs)
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}: {response.data}')
+        return len(queries)
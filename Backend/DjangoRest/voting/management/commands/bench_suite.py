@@ -0,0 +1,118 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from voting import activity
+from voting.benchmarks import data, isolated_database, scenarios
+
+# Columns compared by --compare, and whether bigger is better
+COMPARED = {'per_second': True, 'p50_ms': False, 'p99_ms': False, 'queries_mean': False}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset on a scratch database, run the API scenarios against it '
+        'and write the results as JSON for comparison between revisions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', action='append', default=[], metavar='NAME=COUNT',
+            help=f'Override a dataset size; names: {", ".join(data.DEFAULT_SCALE)}.',
+        )
+        parser.add_argument('--iterations', type=int, default=100, help='Requests per scenario.')
+        parser.add_argument(
+            '--scenario', action='append', choices=list(scenarios.SCENARIOS), dest='scenarios',
+            help='Run only this scenario (repeatable).',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench-results.json', help='Where to write the JSON results.')
+        parser.add_argument('--compare', metavar='FILE', help='Earlier results to print the differences against.')
+
+    def handle(self, *args, **options):
+        scale = self.parse_scale(options['scale'])
+        names = options['scenarios'] or list(scenarios.SCENARIOS)
+        # Keep the suite order whatever order they were given in
+        names = [name for name in scenarios.SCENARIOS if name in names]
+
+        results = {}
+        with isolated_database():
+            dataset = data.generate(scale, seed=options['seed'])
+            for name in names:
+                self.stdout.write(f'Running {name}...')
+                results[name] = scenarios.run(scenarios.SCENARIOS[name], dataset, options['iterations'], options['seed'])
+            activity.flush()
+
+        report = {
+            'revision': self.revision(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'seed': options['seed'],
+            'iterations': options['iterations'],
+            'scale': dataset.scale,
+            'scenarios': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22} {result['per_second']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                f"{result['queries_mean']:>6} queries/req  {result['errors']} errors"
+            )
+            if result['first_error']:
+                self.stderr.write(f'  first error: {result["first_error"]}')
+        self.stdout.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def parse_scale(self, overrides):
+        scale = {}
+        for override in overrides:
+            name, _, count = override.partition('=')
+            if name not in data.DEFAULT_SCALE or not count.isdigit():
+                raise CommandError(f'Invalid --scale {override!r}; expected NAME=COUNT with NAME one of '
+                                   f'{", ".join(data.DEFAULT_SCALE)}.')
+            scale[name] = int(count)
+        return scale
+
+    def revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, report):
+        try:
+            with open(path) as previous_file:
+                previous = json.load(previous_file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        if previous.get('scale') != report['scale'] or previous.get('iterations') != report['iterations']:
+            self.stderr.write('Warning: the runs used different scales or iteration counts.')
+        self.stdout.write(f"Against {previous.get('revision') or path}:")
+        for name, result in report['scenarios'].items():
+            before = previous.get('scenarios', {}).get(name)
+            if before is None:
+                continue
+            changes = []
+            for column, higher_is_better in COMPARED.items():
+                old, new = before.get(column), result[column]
+                if not old:
+                    continue
+                change = (new - old) / old
+                better = change > 0 if higher_is_better else change < 0
+                changes.append(f"{column} {old} -> {new} ({change:+.1%}{'' if not change else ' better' if better else ' worse'})")
+            self.stdout.write(f'{name:<22} ' + ', '.join(changes))
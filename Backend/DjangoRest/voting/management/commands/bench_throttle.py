@@ -0,0 +1,70 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting.benchmarks import percentile
+from voting.ratelimit import BucketStore
+
+
+def hammer(path, checks, capacity, refill_rate, start):
+    """Worker process: take tokens from one shared bucket as fast as possible."""
+    store = BucketStore(path)
+    while time.time() < start:
+        time.sleep(0.001)
+    allowed = 0
+    samples = []
+    for _ in range(checks):
+        began = time.perf_counter()
+        allowed += store.take('bench', 'client', capacity, refill_rate)[0]
+        samples.append(time.perf_counter() - began)
+    return allowed, samples
+
+
+class Command(BaseCommand):
+    help = 'Check that a throttle bucket holds across worker processes, and time the check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--checks', type=int, default=2000, help='Checks per worker.')
+        parser.add_argument('--capacity', type=int, default=100)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        workers, checks, capacity = options['workers'], options['checks'], options['capacity']
+        with tempfile.TemporaryDirectory(prefix='votex-bench-') as workdir:
+            path = os.path.join(workdir, 'throttle_buckets.sqlite3')
+            BucketStore(path).reset()
+            # Refills so slowly that the run can only ever spend the initial burst
+            refill_rate = 1e-9
+            start = time.time() + 0.5
+            began = time.perf_counter()
+            with multiprocessing.get_context('spawn').Pool(workers) as pool:
+                outcomes = pool.starmap(hammer, [(path, checks, capacity, refill_rate, start)] * workers)
+            elapsed = time.perf_counter() - began - 0.5
+            stats = BucketStore(path).stats(0)
+
+        allowed = sum(outcome[0] for outcome in outcomes)
+        samples = [sample for outcome in outcomes for sample in outcome[1]]
+        result = {
+            'workers': workers,
+            'checks': workers * checks,
+            'capacity': capacity,
+            'allowed': allowed,
+            'checks_per_second': round(workers * checks / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3),
+            'recorded': stats.get('bench'),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(
+                f"{workers} workers x {checks} checks on one bucket of {capacity}: {allowed} allowed, "
+                f"{result['checks_per_second']} checks/s, p50 {result['p50_ms']} ms / p99 {result['p99_ms']} ms"
+            )
+        if allowed != capacity or tuple(stats['bench']) != (capacity, workers * checks - capacity):
+            raise CommandError(f'Expected exactly {capacity} allowed checks across all workers, got {allowed}')
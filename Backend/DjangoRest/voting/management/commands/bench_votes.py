@@ -0,0 +1,105 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from voting import counters, ingest
+from voting.benchmarks import Stopwatch, isolated_database
+from voting.models import Candidate, Vote, VotingEvent
+from voting.api.views import VotingEventViewSet
+
+
+class Command(BaseCommand):
+    help = 'Measure sustained vote ingestion throughput, synchronous vs queued, on a scratch database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=2000)
+        parser.add_argument('--candidates', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        with isolated_database() as workdir:
+            users = self.create_voters(options['voters'])
+            results = {
+                'sync': self.run_sync(users, options['candidates']),
+                'queued': self.run_queued(users, options['candidates'], options['batch_size'], workdir),
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:>6}: {result['per_second']:>9} votes/s sustained, "
+                f"ack p50 {result['p50_ms']} ms / p99 {result['p99_ms']} ms "
+                f"({result['operations']} votes in {result['seconds']} s)"
+            )
+
+    def create_voters(self, count):
+        User.objects.bulk_create(
+            [User(username=f'bench-voter-{i}', email=f'bench-voter-{i}@example.com') for i in range(count)],
+            batch_size=1000,
+        )
+        return list(User.objects.filter(username__startswith='bench-voter-').order_by('id'))
+
+    def create_event(self, owner, name, candidates):
+        now = timezone.now()
+        event = VotingEvent.objects.create(
+            event_name=name, created_by=owner,
+            start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+        )
+        Candidate.objects.bulk_create([
+            Candidate(voting_event=event, name=f'Candidate {i}') for i in range(candidates)
+        ])
+        return event, list(event.candidates.values_list('id', flat=True))
+
+    def cast(self, users, event, candidate_ids, stopwatch):
+        factory = APIRequestFactory()
+        # Route the way the router does, minus throttling so the storm is not capped at 3/min
+        view = VotingEventViewSet.as_view(
+            {'post': 'vote'}, **VotingEventViewSet.vote.kwargs, throttle_classes=[]
+        )
+        for i, user in enumerate(users):
+            request = factory.post(
+                f'/api/events/{event.id}/vote/',
+                {'candidate': candidate_ids[i % len(candidate_ids)]},
+                format='json',
+            )
+            force_authenticate(request, user=user)
+            with stopwatch.lap():
+                response = view(request, pk=event.id)
+            assert response.status_code in (200, 202), response.data
+
+    def run_sync(self, users, candidates):
+        event, candidate_ids = self.create_event(users[0], 'Sync storm', candidates)
+        with override_settings(VOTE_INGESTION={'MODE': 'sync'}):
+            with Stopwatch() as stopwatch:
+                self.cast(users, event, candidate_ids, stopwatch)
+        self.verify(event, len(users))
+        return stopwatch.summary()
+
+    def run_queued(self, users, candidates, batch_size, workdir):
+        event, candidate_ids = self.create_event(users[0], 'Queued storm', candidates)
+        config = {
+            'MODE': 'queued',
+            'QUEUE_PATH': f'{workdir}/vote_queue.sqlite3',
+            'BATCH_SIZE': batch_size,
+            'AUTODRAIN': False,
+        }
+        with override_settings(VOTE_INGESTION=config):
+            with Stopwatch() as stopwatch:
+                self.cast(users, event, candidate_ids, stopwatch)
+                ingest.drain(ingest.get_queue())
+        self.verify(event, len(users))
+        return stopwatch.summary()
+
+    def verify(self, event, expected):
+        votes = Vote.objects.filter(voting_event=event).count()
+        counted = sum(counters.get_counts(event.id, use_cache=False).values())
+        if votes != expected or counted != expected:
+            raise AssertionError(f'{event.event_name}: expected {expected} votes, got {votes} rows / {counted} counted')
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from voting import ingest
+
+
+class Command(BaseCommand):
+    help = 'Write queued ballots to the database in batched transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds to sleep when the queue is empty.')
+
+    def handle(self, *args, **options):
+        queue = ingest.get_queue()
+        interval = options['interval'] or ingest.get_setting('FLUSH_INTERVAL')
+        try:
+            while True:
+                applied, rejected = ingest.drain(queue, batch_size=options['batch_size'])
+                if applied or rejected:
+                    self.stdout.write(f'Applied {applied} ballots, rejected {rejected}.')
+                if not options['loop']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        dead = queue.dead_count()
+        if dead:
+            self.stderr.write(f'{dead} ballots could not be applied; see the dead_ballots table in {queue.path}.')
@@ -0,0 +1,59 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import activity, db, imports
+from voting.api.serializers import VotingEventImportSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Import voting events with nested candidates and category ids from a JSON file (a list of events, '
+        'or {"events": [...]}), validated together and written in one transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON file, or '-' for standard input.")
+        parser.add_argument('--user', required=True, help='Username the events are created by.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['user']!r}")
+        try:
+            if options['path'] == '-':
+                data = json.load(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as handle:
+                    data = json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {options["path"]}: {exc}')
+        rows = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not rows:
+            raise CommandError('Expected a list of events, or {"events": [...]}')
+
+        serializer = VotingEventImportSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, dict):
+                raise CommandError(json.dumps(errors))
+            problems = [f'event {index}: {json.dumps(error)}' for index, error in enumerate(errors) if error]
+            raise CommandError(f'{len(problems)} invalid events:\n' + '\n'.join(problems))
+        if options['dry_run']:
+            self.stdout.write(f'{len(rows)} events are valid.')
+            return
+
+        def write():
+            events = imports.create_events(serializer.validated_data, user)
+            for event in events:
+                activity.record('event_create', user, event)
+            return events
+
+        events = db.run_in_transaction(write)
+        activity.flush()
+        candidates = sum(len(row.get('candidates', [])) for row in serializer.validated_data)
+        self.stdout.write(f'Imported {len(events)} events with {candidates} candidates.')
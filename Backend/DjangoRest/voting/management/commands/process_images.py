@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from voting import images
+from voting.models import Candidate, Profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Move candidate and profile pictures uploaded before the content-addressed store into it, '
+        'and render every missing variant.'
+    )
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        names = set()
+        for model, field in ((Candidate, 'profile_pic'), (Profile, 'profile_picture')):
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list('id', field)
+            for row_id, name in rows.iterator():
+                if images.digest_of(name) is None:
+                    if not images.storage.exists(name):
+                        self.stderr.write(f'{model.__name__} {row_id}: {name} is missing')
+                        missing += 1
+                        continue
+                    with images.storage.open(name, 'rb') as content:
+                        stored, _ = images.storage.store(name, content)
+                    # The old file stays where it was, in case anything else links to it
+                    model.objects.filter(id=row_id).update(**{field: stored})
+                    moved += 1
+                    name = stored
+                names.add(name)
+
+        rendered = 0
+        for name in sorted(names):
+            rendered += images.render_variants(name)
+        self.stdout.write(
+            f'Moved {moved} pictures into the store ({missing} missing); '
+            f'rendered {rendered} variants of {len(names)} stored pictures.'
+        )
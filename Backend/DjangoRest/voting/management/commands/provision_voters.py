@@ -0,0 +1,54 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import provisioning
+
+
+class Command(BaseCommand):
+    help = (
+        'Create voters from a CSV file of username,email[,password], all of them or none. Passwords are hashed '
+        'in a process pool; voters without one get a setup token, written as CSV to standard output.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, or '-' for standard input.")
+        parser.add_argument('--workers', type=int, help='Hashing processes (default: one per CPU).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['path'] == '-':
+                content = sys.stdin.read()
+            else:
+                with open(options['path'], encoding='utf-8-sig') as handle:
+                    content = handle.read()
+            rows = provisioning.parse(content)
+        except (OSError, UnicodeDecodeError, provisioning.ProvisioningError) as exc:
+            raise CommandError(f'Cannot read {options["path"]}: {exc}')
+        if not rows:
+            raise CommandError('The file has no rows.')
+        if errors := provisioning.check(rows):
+            problems = [f'line {error["line"]}: {json.dumps(error["errors"])}' for error in errors]
+            raise CommandError(f'{len(problems)} invalid rows:\n' + '\n'.join(problems))
+        if options['dry_run']:
+            self.stderr.write(f'{len(rows)} rows are valid.')
+            return
+
+        links = csv.writer(self.stdout, lineterminator='\n')
+        if not all(row['password'] for row in rows):
+            links.writerow(['username', 'email', 'token', 'url'])
+        for progress in provisioning.provision(rows, options['workers']):
+            if progress['stage'] == 'hashing' and progress['total']:
+                self.stderr.write(f'\rHashed {progress["done"]}/{progress["total"]} passwords', ending='')
+            elif progress['stage'] == 'setup':
+                links.writerow([progress['username'], progress['email'], progress['token'], progress['url'] or ''])
+            elif progress['stage'] == 'error':
+                raise CommandError(progress['error'])
+            elif progress['stage'] == 'done':
+                self.stderr.write('')
+                self.stderr.write(
+                    f'Created {progress["created"]} voters, {progress["setup_links"]} of them with a setup token.'
+                )
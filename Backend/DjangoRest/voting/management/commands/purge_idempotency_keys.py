@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from voting import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY["TTL"].'
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge_expired()
+        self.stdout.write(f'Deleted {deleted} expired idempotency keys.')
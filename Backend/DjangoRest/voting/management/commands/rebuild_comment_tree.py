@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from voting.models import Comment
+
+
+class Command(BaseCommand):
+    help = 'Recompute materialized paths, depths and reply counts of all comments, level by level.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        with transaction.atomic():
+            # Parents are always finished before their children: walk one level at a time
+            level = list(Comment.objects.filter(parent_comment__isnull=True).only('id'))
+            parent_paths = {}
+            depth = 0
+            while level:
+                for comment in level:
+                    comment.path = f"{parent_paths.get(comment.parent_comment_id, '')}{comment.pk:010d}/"
+                    comment.depth = depth
+                Comment.objects.bulk_update(level, ['path', 'depth'], batch_size=batch_size)
+                updated += len(level)
+                parent_paths = {comment.pk: comment.path for comment in level}
+                level = []
+                ids = list(parent_paths)
+                for start in range(0, len(ids), batch_size):
+                    level.extend(
+                        Comment.objects.filter(parent_comment_id__in=ids[start:start + batch_size])
+                        .only('id', 'parent_comment_id')
+                    )
+                depth += 1
+
+            counts = dict(
+                Comment.objects.filter(parent_comment__isnull=False)
+                .values('parent_comment_id').annotate(total=Count('id'))
+                .values_list('parent_comment_id', 'total')
+            )
+            comments = list(Comment.objects.only('id', 'reply_count'))
+            for comment in comments:
+                comment.reply_count = counts.get(comment.pk, 0)
+            Comment.objects.bulk_update(comments, ['reply_count'], batch_size=batch_size)
+
+        self.stdout.write(f'Rebuilt {updated} comments across {depth} levels.')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from voting import email_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized email index behind email logins from auth_user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed, duplicates = email_index.rebuild(options['chunk_size'])
+        self.stdout.write(f'Indexed {indexed} email addresses.')
+        if duplicates:
+            self.stderr.write(
+                f'{duplicates} users share an address (ignoring case) with a user of a lower id; '
+                'they cannot log in by email until their address is changed.'
+            )
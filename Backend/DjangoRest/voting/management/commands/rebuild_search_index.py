@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from voting import search
+from voting.models import VotingEvent
+
+
+class Command(BaseCommand):
+    help = 'Create the full-text search table if needed and re-index every voting event.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Events indexed per batch.')
+
+    def handle(self, *args, **options):
+        if not search.create_index():
+            raise CommandError('Full-text search needs SQLite with FTS5; searches will use icontains instead.')
+
+        indexed = 0
+        with transaction.atomic():
+            search.clear_index()
+            last_id = 0
+            while True:
+                chunk = list(
+                    VotingEvent.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', flat=True)[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1]
+                search.index_events(chunk)
+                indexed += len(chunk)
+        search.optimize_index()
+        self.stdout.write(f'Indexed {indexed} events.')
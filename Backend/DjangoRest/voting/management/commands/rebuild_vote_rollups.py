@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from voting import rollups
+from voting.models import VotingEvent
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-minute vote rollups behind events/<id>/timeline/ from the Vote rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='Only rebuild this event id.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Events per transaction.')
+
+    def handle(self, *args, **options):
+        events = VotingEvent.objects.order_by('id')
+        if options['event'] is not None:
+            if not events.filter(pk=options['event']).exists():
+                raise CommandError(f"Event {options['event']} does not exist")
+            events = events.filter(pk=options['event'])
+
+        rebuilt = buckets = 0
+        last_id = 0
+        while True:
+            chunk = list(events.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            with transaction.atomic():
+                buckets += rollups.rebuild(chunk)
+            rebuilt += len(chunk)
+        self.stdout.write(f'Rebuilt {buckets} rollup buckets for {rebuilt} events.')
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from voting import counters
+from voting.models import Candidate, Vote, VoteCounterShard, VotingEvent
+
+
+class Command(BaseCommand):
+    help = 'Compare candidate vote counters with the Vote rows, and optionally rebuild them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='Only reconcile this event id.')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Write the counted totals into votes_count and clear the shards.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=500, help='Candidates per transaction.')
+
+    def handle(self, *args, **options):
+        candidates = Candidate.objects.order_by('id')
+        if options['event'] is not None:
+            if not VotingEvent.objects.filter(pk=options['event']).exists():
+                raise CommandError(f"Event {options['event']} does not exist")
+            candidates = candidates.filter(voting_event_id=options['event'])
+
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            chunk = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            with transaction.atomic():
+                drift = self.reconcile_chunk(chunk, options['rebuild'])
+            checked += len(chunk)
+            drifted += len(drift)
+            for candidate_id, event_id, stored, actual in drift:
+                self.stdout.write(
+                    f'event {event_id} candidate {candidate_id}: counter {stored}, votes {actual} '
+                    f'(drift {stored - actual:+d})'
+                )
+
+        action = 'rebuilt' if options['rebuild'] else 'checked'
+        self.stdout.write(f'{checked} candidates {action}, {drifted} with drift.')
+        if drifted and not options['rebuild']:
+            raise CommandError('Vote counters have drifted; rerun with --rebuild to fix them.')
+
+    def reconcile_chunk(self, candidate_ids, rebuild):
+        # Lock the rows first; FOR UPDATE cannot be combined with the aggregate below
+        list(Candidate.objects.select_for_update().filter(id__in=candidate_ids).values_list('id'))
+        rows = list(
+            Candidate.objects.filter(id__in=candidate_ids)
+            .annotate(sharded=Coalesce(Sum('vote_shards__count'), 0))
+            .values_list('id', 'voting_event_id', 'votes_count', 'sharded')
+        )
+        actual = dict(
+            Vote.objects.filter(candidate_id__in=candidate_ids)
+            .values('candidate_id').annotate(total=Count('id'))
+            .values_list('candidate_id', 'total')
+        )
+
+        drift = [
+            (candidate_id, event_id, base + sharded, actual.get(candidate_id, 0))
+            for candidate_id, event_id, base, sharded in rows
+            if base + sharded != actual.get(candidate_id, 0)
+        ]
+
+        if rebuild:
+            Candidate.objects.bulk_update(
+                [Candidate(id=candidate_id, votes_count=actual.get(candidate_id, 0)) for candidate_id, *_ in rows],
+                ['votes_count'],
+            )
+            VoteCounterShard.objects.filter(candidate_id__in=candidate_ids).delete()
+            event_ids = {event_id for _, event_id, *_ in rows}
+            transaction.on_commit(lambda: counters.invalidate(event_ids))
+        return drift
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from voting import rollups
+
+
+class Command(BaseCommand):
+    help = 'Add the votes cast since the last run to the per-minute rollups behind events/<id>/timeline/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep catching up until interrupted.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds between runs.')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or rollups.get_setting('INTERVAL')
+        try:
+            while True:
+                votes = rollups.catch_up()
+                if votes:
+                    self.stdout.write(f'Rolled up {votes} votes.')
+                if not options['loop']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from voting import fanout
+
+
+class Command(BaseCommand):
+    help = 'Notify favoriters of events that are starting or about to start; safe to run repeatedly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep scheduling until interrupted.')
+        parser.add_argument('--interval', type=float, default=None, help='Seconds between scheduling passes.')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or fanout.get_setting('INTERVAL')
+        try:
+            while True:
+                runs, created = fanout.run_pending(chunk_size=options['chunk_size'])
+                if runs:
+                    self.stdout.write(f'Ran {runs} dispatches, created {created} notifications.')
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,125 @@
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from voting import activity, counters
+from voting.api.views import VotingEventViewSet
+from voting.benchmarks import isolated_database
+from voting.models import Candidate, IdempotencyKey, Vote, VotingEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Submit every ballot several times at once from concurrent threads, half of the users retrying with '
+        'an Idempotency-Key, and check that each user is counted exactly once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=400)
+        parser.add_argument('--copies', type=int, default=4, help='Concurrent submissions of each ballot.')
+        parser.add_argument('--parallel', type=int, default=4, help='Users voting in each round.')
+        parser.add_argument('--candidates', type=int, default=3)
+
+    def handle(self, *args, **options):
+        copies, parallel = options['copies'], options['parallel']
+        with isolated_database():
+            User.objects.bulk_create([User(username=f'stress-voter-{i}') for i in range(options['users'])])
+            users = list(User.objects.filter(username__startswith='stress-voter-').order_by('id'))
+            now = timezone.now()
+            event = VotingEvent.objects.create(
+                event_name='Stress', created_by=users[0],
+                start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+            )
+            Candidate.objects.bulk_create(
+                [Candidate(voting_event=event, name=f'Candidate {i}') for i in range(options['candidates'])]
+            )
+            candidate_ids = list(event.candidates.values_list('id', flat=True))
+            connections.close_all()
+
+            outcomes = self.storm(users, event, candidate_ids, copies, parallel)
+            activity.flush()
+            self.verify(users, event, outcomes, copies)
+
+    def storm(self, users, event, candidate_ids, copies, parallel):
+        """Run rounds of ``parallel`` users, each ballot sent by ``copies`` threads at the same moment."""
+        view = VotingEventViewSet.as_view({'post': 'vote'}, **VotingEventViewSet.vote.kwargs, throttle_classes=[])
+        factory = APIRequestFactory()
+        rounds = [users[i:i + parallel] for i in range(0, len(users), parallel)]
+        barrier = threading.Barrier(parallel * copies)
+        outcomes = {user.id: [] for user in users}
+        lock = threading.Lock()
+
+        def worker(slot):
+            user_index, copy = divmod(slot, copies)
+            for voters in rounds:
+                barrier.wait()
+                if user_index >= len(voters):
+                    continue
+                user = voters[user_index]
+                headers = {}
+                if user.id % 2:
+                    # A client retrying with one key for the ballot
+                    headers['HTTP_IDEMPOTENCY_KEY'] = f'ballot-{user.id}'
+                request = factory.post(
+                    f'/api/events/{event.id}/vote/',
+                    {'candidate': candidate_ids[user.id % len(candidate_ids)]}, format='json', **headers,
+                )
+                force_authenticate(request, user=user)
+                try:
+                    response = view(request, pk=event.id)
+                    outcome = (response.status_code, response.get('Idempotency-Replayed') == 'true')
+                except Exception as exc:
+                    outcome = (type(exc).__name__, False)
+                finally:
+                    close_old_connections()
+                with lock:
+                    outcomes[user.id].append(outcome)
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(parallel * copies)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def verify(self, users, event, outcomes, copies):
+        failures = []
+        votes = Counter(Vote.objects.filter(voting_event=event).values_list('voter_id', flat=True))
+        counted = sum(counters.get_counts(event.id, use_cache=False).values())
+        if counted != len(users) or sum(votes.values()) != len(users):
+            failures.append(f'{len(users)} voters, but {sum(votes.values())} vote rows and {counted} counted')
+        if IdempotencyKey.objects.count() != len(users) // 2:
+            failures.append(f'{IdempotencyKey.objects.count()} idempotency keys stored for {len(users) // 2} users')
+
+        tally = Counter()
+        for user in users:
+            results = Counter(outcomes[user.id])
+            tally.update(results)
+            if votes[user.id] != 1:
+                failures.append(f'user {user.id} has {votes[user.id]} votes')
+            elif user.id % 2:
+                # One vote and (copies - 1) replays of its response
+                expected = Counter({(200, False): 1, (200, True): copies - 1})
+            else:
+                # One vote, the rest refused by the unique constraint
+                expected = Counter({(200, False): 1, (400, False): copies - 1})
+            if votes[user.id] == 1 and results != expected:
+                failures.append(f'user {user.id} got {dict(results)}')
+
+        self.stdout.write(
+            f'{len(users)} voters x {copies} copies: {sum(votes.values())} votes, {counted} counted; '
+            + ', '.join(
+                f'{status}{" replayed" if replayed else ""}: {count}'
+                for (status, replayed), count in sorted(tally.items(), key=str)
+            )
+        )
+        if failures:
+            raise CommandError(f'{len(failures)} problems, e.g.: ' + '; '.join(failures[:5]))
+        self.stdout.write('Counts are exact.')
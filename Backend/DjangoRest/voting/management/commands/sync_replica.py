@@ -0,0 +1,58 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from voting import replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to every configured SQLite replica, stamping the copy time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying until interrupted.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between copies.')
+
+    def handle(self, *args, **options):
+        aliases = [
+            alias for alias in replicas.get_setting('REPLICAS')
+            if connections[alias].vendor == 'sqlite'
+        ]
+        if not aliases:
+            raise CommandError('No SQLite replicas configured; set DATABASE_REPLICAS.')
+        primary_path = str(settings.DATABASES[replicas.PRIMARY]['NAME'])
+        try:
+            while True:
+                started = time.perf_counter()
+                for alias in aliases:
+                    self.copy(primary_path, str(settings.DATABASES[alias]['NAME']))
+                self.stdout.write(
+                    f'Copied primary to {", ".join(aliases)} in {(time.perf_counter() - started) * 1000:.0f} ms.'
+                )
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def copy(self, primary_path, replica_path):
+        source = sqlite3.connect(primary_path, timeout=30)
+        target = sqlite3.connect(replica_path, timeout=30)
+        try:
+            # The heartbeat is copied with everything else: on the replica it
+            # says how old the copy is
+            with source:
+                source.execute(
+                    f'CREATE TABLE IF NOT EXISTS {replicas.HEARTBEAT_TABLE} (id INTEGER PRIMARY KEY, ts REAL NOT NULL)'
+                )
+                source.execute(
+                    f'INSERT INTO {replicas.HEARTBEAT_TABLE} (id, ts) VALUES (1, ?)'
+                    ' ON CONFLICT (id) DO UPDATE SET ts = excluded.ts',
+                    (time.time(),),
+                )
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from voting.ratelimit import get_store
+
+
+class Command(BaseCommand):
+    help = 'Show how many requests each throttle scope allowed and denied, across all workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=60, help='Report on the last N minutes.')
+        parser.add_argument('--prune', action='store_true', help='Also drop idle buckets and expired stats.')
+
+    def handle(self, *args, **options):
+        store = get_store()
+        if options['prune']:
+            store.prune()
+
+        stats = store.stats(time.time() - options['minutes'] * 60)
+        if not stats:
+            self.stdout.write(f"No throttled requests in the last {options['minutes']} minutes.")
+            return
+        self.stdout.write(f"{'scope':<14}{'allowed':>10}{'denied':>10}{'hit rate':>10}")
+        for scope, (allowed, denied) in stats.items():
+            self.stdout.write(f'{scope:<14}{allowed:>10}{denied:>10}{denied / (allowed + denied):>10.1%}')
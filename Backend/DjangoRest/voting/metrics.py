@@ -0,0 +1,272 @@
+"""
+Per-route request metrics.
+
+``MetricsMiddleware`` times every request and labels it with the name of
+the resolved route (``votingevent-vote``, ``event-comments-list``, ...) and
+its method. For each label it keeps:
+
+- a latency histogram,
+- a histogram of database queries per request and the total query time,
+- the time views spend outside database queries (mostly producing
+  serializer data) and the time spent rendering the response body,
+- a response size histogram, and
+- request counts by status code.
+
+Views and rendering are told apart with the ``process_view`` and
+``process_template_response`` middleware hooks: DRF responses are rendered
+after the view returns and after the template response hooks.
+
+``metrics_view`` serves them in the Prometheus text format at ``/metrics``.
+Requests slower than ``SLOW_REQUEST_SECONDS`` are logged with their
+slowest SQL, at most once per route every ``SLOW_SAMPLE_INTERVAL``
+seconds.
+
+Counting happens in memory, per worker process. Prometheus scrapes each
+worker and sums the series. The cost per request is one database execute
+wrapper and a few additions under a lock. Unusual HTTP methods are counted
+as ``other`` so that clients cannot add series at will.
+"""
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'LATENCY_BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+    'QUERY_BUCKETS': [0, 1, 2, 3, 5, 10, 20, 50, 100],
+    'SIZE_BUCKETS': [256, 1024, 4096, 16384, 65536, 262144, 1048576],
+    'SLOW_REQUEST_SECONDS': 0.5,
+    'SLOW_SAMPLE_INTERVAL': 60,
+    'MAX_SAMPLED_QUERIES': 200,
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+PREFIX = 'votex'
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+def get_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(get_setting('LATENCY_BUCKETS'))
+        self.queries = Histogram(get_setting('QUERY_BUCKETS'))
+        self.size = Histogram(get_setting('SIZE_BUCKETS'))
+        self.query_seconds = 0.0
+        self.view_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statuses = {}
+        self.last_sampled = None
+
+
+class RequestMetrics:
+    """What one request has used so far."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.view_seconds = 0.0
+        self.render_seconds = 0.0
+        self.sampled = []
+        # (perf_counter, query_seconds) when the current phase began
+        self.phase_start = None
+        self.rendering = False
+
+    def start_phase(self):
+        self.phase_start = (time.perf_counter(), self.query_seconds)
+
+    def end_phase(self):
+        """Seconds since ``start_phase()`` that were not spent in database queries."""
+        if self.phase_start is None:
+            return 0.0
+        started, queried = self.phase_start
+        self.phase_start = None
+        return max(0.0, time.perf_counter() - started - (self.query_seconds - queried))
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.query_seconds += duration
+            if len(self.sampled) < get_setting('MAX_SAMPLED_QUERIES'):
+                self.sampled.append((duration, sql))
+
+
+class Registry:
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def record(self, route, method, status, seconds, size, request_metrics):
+        """Add one request; returns True if it should be logged as a slow sample."""
+        now = time.monotonic()
+        with self.lock:
+            stats = self.routes.get((route, method))
+            if stats is None:
+                stats = self.routes[route, method] = RouteStats()
+            stats.latency.observe(seconds)
+            stats.queries.observe(request_metrics.queries)
+            stats.query_seconds += request_metrics.query_seconds
+            stats.view_seconds += request_metrics.view_seconds
+            stats.render_seconds += request_metrics.render_seconds
+            if size is not None:
+                stats.size.observe(size)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if seconds < get_setting('SLOW_REQUEST_SECONDS'):
+                return False
+            if stats.last_sampled is not None and now - stats.last_sampled < get_setting('SLOW_SAMPLE_INTERVAL'):
+                return False
+            stats.last_sampled = now
+            return True
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+    def render(self):
+        """The Prometheus text exposition of every route."""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+
+            def histogram(name, help_text, attribute):
+                lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{name} histogram')
+                for (route, method), stats in routes:
+                    labels = f'route="{route}",method="{method}"'
+                    values = getattr(stats, attribute)
+                    for bound, count in values.cumulative():
+                        lines.append(f'{PREFIX}_{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{PREFIX}_{name}_sum{{{labels}}} {values.sum}')
+                    lines.append(f'{PREFIX}_{name}_count{{{labels}}} {values.count}')
+
+            def counter(name, help_text, attribute):
+                lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {PREFIX}_{name} counter')
+                for (route, method), stats in routes:
+                    lines.append(f'{PREFIX}_{name}{{route="{route}",method="{method}"}} {getattr(stats, attribute)}')
+
+            lines.append(f'# HELP {PREFIX}_requests_total Requests by route, method and status code.')
+            lines.append(f'# TYPE {PREFIX}_requests_total counter')
+            for (route, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{PREFIX}_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            histogram('request_duration_seconds', 'Request latency.', 'latency')
+            histogram('db_queries_per_request', 'Database queries per request.', 'queries')
+            counter('db_query_seconds_total', 'Time spent in database queries.', 'query_seconds')
+            counter('view_seconds_total', 'Time spent in views outside database queries.', 'view_seconds')
+            counter('render_seconds_total', 'Time spent rendering response bodies.', 'render_seconds')
+            histogram('response_size_bytes', 'Response body size (streamed responses excluded).', 'size')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_current = contextvars.ContextVar('votex_request_metrics', default=None)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def method_name(request):
+    return request.method if request.method in METHODS else 'other'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_setting('ENABLED')
+
+    def __call__(self, request):
+        if not self.enabled or request.path == '/metrics':
+            return self.get_response(request)
+        request_metrics = RequestMetrics()
+        token = _current.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if request_metrics.rendering:
+            request_metrics.render_seconds = request_metrics.end_phase()
+        else:
+            request_metrics.view_seconds = request_metrics.end_phase()
+        seconds = time.perf_counter() - start
+        route = route_name(request)
+        size = None if response.streaming else len(response.content)
+        if registry.record(route, method_name(request), response.status_code, seconds, size, request_metrics):
+            log_slow_request(request, route, response.status_code, seconds, request_metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = _current.get()
+        if request_metrics is not None:
+            request_metrics.start_phase()
+
+    def process_template_response(self, request, response):
+        request_metrics = _current.get()
+        if request_metrics is not None:
+            # Runs after the view and before the response is rendered
+            request_metrics.view_seconds = request_metrics.end_phase()
+            request_metrics.rendering = True
+            request_metrics.start_phase()
+        return response
+
+
+def log_slow_request(request, route, status, seconds, request_metrics):
+    slowest = sorted(request_metrics.sampled, key=lambda sample: sample[0], reverse=True)[:5]
+    logger.warning(
+        'Slow request %s %s (%s, %s): %.0f ms, %d queries in %.0f ms, view %.0f ms, render %.0f ms%s',
+        request.method, request.get_full_path(), route, status, seconds * 1000,
+        request_metrics.queries, request_metrics.query_seconds * 1000,
+        request_metrics.view_seconds * 1000, request_metrics.render_seconds * 1000,
+        ''.join(f'\n  {duration * 1000:.1f} ms: {sql}' for duration, sql in slowest),
+    )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for ``ALLOWED_IPS`` and staff users."""
+    user = getattr(request, 'user', None)
+    if request.META.get('REMOTE_ADDR') not in get_setting('ALLOWED_IPS') and not (user and user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
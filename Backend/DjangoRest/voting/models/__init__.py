@@ -1,10 +1,13 @@
 from .events import Category, VotingEvent
 from .candidates import Candidate
+from .counters import VoteCounterShard, VoteRollup, VoteRollupProgress
 from .votes import Vote
 from .profiles import Profile
 from .favorites import Favorite
 from .comments import Comment
-from .notifications import Notification
+from .notifications import Notification, NotificationDispatch
 from .reports import Report
 from .activitylogs import ActivityLog
+from .idempotency import IdempotencyKey
+from .emails import EmailAddressIndex
 from django.contrib.auth.models import User
\ No newline at end of file
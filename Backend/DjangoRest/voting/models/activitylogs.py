@@ -1,11 +1,45 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .events import VotingEvent
+from .candidates import Candidate
 
 class ActivityLog(models.Model):
+    ACTION_TYPES = (
+        ('vote', 'Vote'),
+        ('event_create', 'Event Created'),
+        ('event_update', 'Event Updated'),
+        ('event_delete', 'Event Deleted'),
+        ('favorite', 'Favorite'),
+        ('unfavorite', 'Unfavorite'),
+        ('other', 'Other'),
+    )
+
     user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
-    action = models.CharField(max_length=100)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    ip_address = models.GenericIPAddressField()
+    action_type = models.CharField(max_length=20, choices=ACTION_TYPES, default='other')
+    # No database constraint: the audit trail keeps the ids of deleted events and candidates
+    event = models.ForeignKey(
+        VotingEvent, null=True, blank=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='activity_logs',
+    )
+    candidate = models.ForeignKey(
+        Candidate, null=True, blank=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+',
+    )
+    # Free-text detail; older rows only have this
+    action = models.CharField(max_length=100, blank=True)
+    # Set when the action happens, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        # Per-event and per-user audit trails, newest first, paged by (timestamp, id)
+        indexes = [
+            models.Index(fields=['event', 'timestamp', 'id']),
+            models.Index(fields=['user', 'timestamp', 'id']),
+            models.Index(fields=['action_type', 'timestamp']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username if self.user else 'System'} - {self.action}"
\ No newline at end of file
+        return f"{self.user.username if self.user else 'System'} - {self.action or self.get_action_type_display()}"
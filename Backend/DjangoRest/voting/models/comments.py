@@ -1,7 +1,13 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from .events import VotingEvent
 from django.contrib.auth.models import User
 
+PATH_SEGMENT_LENGTH = 11  # ten zero-padded digits of the id plus '/'
+MAX_DEPTH = 20
+
 class Comment(models.Model):
     event = models.ForeignKey(VotingEvent, related_name='comments', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -9,6 +15,37 @@ class Comment(models.Model):
     parent_comment = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_approved = models.BooleanField(default=True)
+    # Materialized path: the ids of all ancestors and the comment itself,
+    # e.g. '0000000004/0000000017/', so a subtree is a prefix range
+    path = models.CharField(max_length=PATH_SEGMENT_LENGTH * (MAX_DEPTH + 1), blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'path']),
+            models.Index(fields=['event', 'parent_comment', 'created_at', 'id']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.event.event_name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.event.event_name}"
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super().save(*args, **kwargs)
+        if created:
+            parent = self.parent_comment
+            self.path = f"{parent.path if parent else ''}{self.pk:010d}/"
+            self.depth = parent.depth + 1 if parent else 0
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            if parent:
+                Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_reply_count(sender, instance, **kwargs):
+    # During a cascade the parent may be gone already; then nothing is updated
+    if instance.parent_comment_id:
+        Comment.objects.filter(pk=instance.parent_comment_id, reply_count__gt=0).update(
+            reply_count=F('reply_count') - 1
+        )
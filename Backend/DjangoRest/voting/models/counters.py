@@ -0,0 +1,38 @@
+from django.db import models
+from .candidates import Candidate
+from .events import VotingEvent
+
+class VoteCounterShard(models.Model):
+    """One slot of a candidate's vote counter; the total is ``votes_count`` plus all slots."""
+    candidate = models.ForeignKey(Candidate, related_name='vote_shards', on_delete=models.CASCADE)
+    slot = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('candidate', 'slot')
+
+    def __str__(self):
+        return f"{self.candidate.name} [{self.slot}] = {self.count}"
+
+
+class VoteRollup(models.Model):
+    """Votes a candidate received during one minute (``bucket`` is the start of the minute, UTC)."""
+    event = models.ForeignKey(VotingEvent, related_name='vote_rollups', on_delete=models.CASCADE)
+    candidate = models.ForeignKey(Candidate, related_name='vote_rollups', on_delete=models.CASCADE)
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('candidate', 'bucket')
+        indexes = [models.Index(fields=['event', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.candidate.name} @ {self.bucket:%Y-%m-%d %H:%M} = {self.count}"
+
+
+class VoteRollupProgress(models.Model):
+    """How far the rollups have been brought up to date: every vote up to ``last_vote_id`` is in (one row)."""
+    last_vote_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Rolled up through vote {self.last_vote_id}"
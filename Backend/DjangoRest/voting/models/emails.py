@@ -0,0 +1,15 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class EmailAddressIndex(models.Model):
+    """A user's email address, normalized, for case-insensitive login lookups.
+
+    ``auth_user.email`` has no index and cannot get one from this app, so
+    this table carries it. The unique constraint allows each address once,
+    whatever its case. Kept in step with ``User.email`` by voting.email_index.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='email_index')
+    email = models.CharField(max_length=254, unique=True)
+
+    def __str__(self):
+        return f"{self.email} -> {self.user_id}"
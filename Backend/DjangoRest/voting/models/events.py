@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Case, Exists, OuterRef, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -8,18 +10,50 @@ class Category(models.Model):
         return self.name
 
 
+class VotingEventQuerySet(models.QuerySet):
+    def with_status(self, now=None):
+        """Annotate ``current_status`` ('upcoming', 'ongoing' or 'ended') in SQL."""
+        now = now or timezone.now()
+        return self.annotate(current_status=Case(
+            When(start_time__gt=now, then=Value('upcoming')),
+            When(end_time__lt=now, then=Value('ended')),
+            default=Value('ongoing'),
+            output_field=models.CharField(),
+        ))
+
+    def with_favorited(self, user):
+        """Annotate ``favorited`` for ``user`` with one EXISTS subquery."""
+        from .favorites import Favorite
+
+        if not user.is_authenticated:
+            return self.annotate(favorited=Value(False, output_field=models.BooleanField()))
+        return self.annotate(favorited=Exists(Favorite.objects.filter(event=OuterRef('pk'), user=user)))
+
+    def for_listing(self, user):
+        """Everything ``VotingEventSerializer`` reads, in a fixed number of queries."""
+        return self.with_status().with_favorited(user).prefetch_related('categories', 'candidates')
+
+
 class VotingEvent(models.Model):
     event_name = models.CharField(max_length=100)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
-    event_token = models.CharField(max_length=10, null=True, blank=True)
+    event_token = models.CharField(max_length=10, null=True, blank=True, unique=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
     is_private = models.BooleanField(default=False)
     categories = models.ManyToManyField(Category, related_name='events')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = VotingEventQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Keyset pagination seeks on (ordering field, id) for every allowed ordering
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['start_time', 'id']),
+            models.Index(fields=['event_name', 'id']),
+        ]
 
     def __str__(self):
         return self.event_name
\ No newline at end of file
@@ -0,0 +1,22 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class IdempotencyKey(models.Model):
+    """The response to a request sent with an ``Idempotency-Key`` header, replayed to its retries.
+
+    ``fingerprint`` hashes the method, path and body, so a key reused for a
+    different request is refused rather than answered with the wrong
+    response.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
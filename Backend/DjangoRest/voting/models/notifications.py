@@ -35,6 +35,36 @@ class Notification(models.Model):
         ordering = ['-created_at']
         verbose_name = 'User Notification'
         verbose_name_plural = 'User Notifications'
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.get_notification_type_display()} - {self.created_at:%Y-%m-%d}"
\ No newline at end of file
+        return f"{self.user.username} - {self.get_notification_type_display()} - {self.created_at:%Y-%m-%d}"
+
+
+class NotificationDispatch(models.Model):
+    """One fan-out of an event notification to everyone who favorited the event.
+
+    ``last_favorite_id`` is committed together with each chunk of
+    notifications, so an interrupted fan-out resumes where it stopped and a
+    repeated one finds nothing left to send. Workers lease a dispatch
+    (``lease_token`` until ``leased_until``) before working on it.
+    """
+    event = models.ForeignKey(VotingEvent, on_delete=models.CASCADE, related_name='notification_dispatches')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    # The start time (or reminder time) this dispatch is for; a rescheduled event gets a new one
+    scheduled_for = models.DateTimeField()
+    last_favorite_id = models.BigIntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    lease_token = models.CharField(max_length=32, blank=True)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('event', 'notification_type', 'scheduled_for')
+
+    def __str__(self):
+        return f"{self.get_notification_type_display()} for {self.event_id} at {self.scheduled_for:%Y-%m-%d %H:%M}"
+
@@ -5,9 +5,11 @@ from django.dispatch import receiver
 import pytz
 from django.utils import timezone
 
+from ..images import get_storage
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', storage=get_storage, blank=True, null=True)
     birthday = models.DateField(blank=True, null=True)
     timezone = models.CharField(
         max_length=63,
@@ -42,6 +42,8 @@ class Report(models.Model):
         verbose_name_plural = 'Content Reports'
         indexes = [
             models.Index(fields=['content_type', 'content_id']),
+            models.Index(fields=['reporter', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
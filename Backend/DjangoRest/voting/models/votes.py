@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from .events import VotingEvent
 from .candidates import Candidate
 from django.contrib.auth.models import User
@@ -8,9 +9,13 @@ class Vote(models.Model):
     candidate = models.ForeignKey(Candidate, related_name='candidate_votes', on_delete=models.CASCADE)
     voter = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='votes')
     is_anonymous = models.BooleanField(default=False)
+    # Rows from before this field existed got the time of the migration
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         unique_together = ('voting_event', 'voter')
+        # An event's ballots in id order (exports)
+        indexes = [models.Index(fields=['voting_event', 'id'])]
 
     def __str__(self):
         voter_name = self.voter.username if self.voter and not self.is_anonymous else 'Anonymous'
@@ -0,0 +1,113 @@
+"""
+Per-process cache of authenticated users.
+
+Token-authenticated requests (see voting.api.authentication) load their
+user through ``get_user()``. It reads the user and profile in one query with
+``select_related`` and keeps them for ``TTL`` seconds. Entries are dropped
+when this process saves or deletes the user or its profile. Another worker
+can serve a changed user for up to ``TTL`` seconds, which is why the TTL
+stays short.
+
+Each request gets its own copy of the cached user, so changes made while
+handling one request never leak into another. The copy carries ``tzinfo``,
+the ``ZoneInfo`` of the profile's time zone, built once per cache entry.
+"""
+import copy
+import threading
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Profile
+
+DEFAULTS = {
+    'TTL': 30,
+    'MAX_SIZE': 10_000,
+}
+
+UTC = ZoneInfo('UTC')
+
+
+def get_setting(name):
+    return getattr(settings, 'PRINCIPAL_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def timezone_of(user):
+    """The ``ZoneInfo`` of ``user``'s profile, UTC for anonymous users and unknown names."""
+    tzinfo = getattr(user, 'tzinfo', None)
+    if tzinfo is not None:
+        return tzinfo
+    try:
+        return ZoneInfo(user.profile.timezone)
+    except (AttributeError, Profile.DoesNotExist, ValueError, ZoneInfoNotFoundError):
+        return UTC
+
+
+class PrincipalCache:
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, user):
+        with self.lock:
+            if len(self.entries) >= get_setting('MAX_SIZE'):
+                # Expired entries first; if none, start over rather than track recency
+                now = time.monotonic()
+                self.entries = {key: entry for key, entry in self.entries.items() if entry[0] >= now}
+                if len(self.entries) >= get_setting('MAX_SIZE'):
+                    self.entries.clear()
+            self.entries[user_id] = (time.monotonic() + get_setting('TTL'), user)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+cache = PrincipalCache()
+
+
+def load_user(user_id):
+    user = User.objects.select_related('profile').filter(pk=user_id).first()
+    if user is not None:
+        user.tzinfo = timezone_of(user)
+    return user
+
+
+def get_user(user_id):
+    """A private copy of the user with id ``user_id`` and its profile, or None if there is none."""
+    # Tokens may carry the id as a string; signals know it as the pk
+    user_id = User._meta.pk.to_python(user_id)
+    user = cache.get(user_id)
+    if user is None:
+        user = load_user(user_id)
+        if user is None:
+            return None
+        cache.set(user_id, user)
+    return copy.deepcopy(user)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    cache.discard(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_profile_user(sender, instance, **kwargs):
+    cache.discard(instance.user_id)
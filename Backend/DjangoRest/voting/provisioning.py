@@ -0,0 +1,221 @@
+"""
+Bulk voter provisioning from CSV.
+
+``parse()`` reads rows of ``username,email[,password]`` and ``check()``
+validates them all before anything is written: names and addresses must be
+well formed, unused and unique within the file (addresses ignoring case).
+
+``provision()`` then hashes the given passwords in a process pool,
+``HASH_WORKERS`` processes (one per CPU by default), ``HASH_CHUNK_SIZE``
+passwords per task. A row without a password gets an unusable password and a
+one-time setup token instead, redeemed at ``/api/auth/password/reset/confirm/``
+like a reset token (so it expires with them). Users, profiles, email index
+rows and tokens are written with one ``bulk_create`` each, in one
+transaction: no ``post_save`` receivers run, which is why the profile and
+index rows are written here.
+
+``provision()`` is a generator of progress dicts: ``manage.py
+provision_voters`` prints them, and ``POST /api/users/provision/`` streams
+them as NDJSON.
+"""
+import csv
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django_rest_passwordreset.models import ResetPasswordToken
+
+from . import db, email_index
+from .models import EmailAddressIndex, Profile
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_ROWS': 10_000,
+    'BATCH_SIZE': 1000,
+    'HASH_WORKERS': None,
+    'HASH_CHUNK_SIZE': 20,
+    'SETUP_URL': None,
+}
+
+COLUMNS = ('username', 'email', 'password')
+REQUIRED_COLUMNS = ('username', 'email')
+# Existing names and addresses are looked up this many at a time
+LOOKUP_CHUNK = 500
+
+
+def get_setting(name):
+    return getattr(settings, 'PROVISIONING', {}).get(name, DEFAULTS[name])
+
+
+class ProvisioningError(Exception):
+    pass
+
+
+def parse(content):
+    """The rows of a CSV file (text or bytes) as dicts of ``COLUMNS``, header line first."""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ProvisioningError('The file is not UTF-8 text.')
+    reader = csv.DictReader(io.StringIO(content))
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ProvisioningError(f'The header line lacks {", ".join(missing)}; expected {",".join(COLUMNS)}.')
+    reader.fieldnames = header
+    return [
+        {name: (row.get(name) or '').strip() for name in COLUMNS}
+        for row in reader
+        if any((value or '').strip() for value in row.values() if isinstance(value, str))
+    ]
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def check(rows):
+    """Errors per row, as ``[{'line': n, 'errors': {...}}]``; empty when every row can be created."""
+    problems = {}
+
+    def fail(index, field, message):
+        problems.setdefault(index, {}).setdefault(field, []).append(message)
+
+    seen_names, seen_emails = {}, {}
+    for index, row in enumerate(rows):
+        for field in REQUIRED_COLUMNS:
+            if not row[field]:
+                fail(index, field, 'Required.')
+                continue
+            try:
+                # The model field's validators, length included
+                User._meta.get_field(field).run_validators(row[field])
+            except ValidationError as exc:
+                for message in exc.messages:
+                    fail(index, field, message)
+        if row['password']:
+            try:
+                validate_password(row['password'], user=User(username=row['username'], email=row['email']))
+            except ValidationError as exc:
+                for message in exc.messages:
+                    fail(index, 'password', message)
+        if row['username'] in seen_names:
+            fail(index, 'username', f'Also on line {seen_names[row["username"]] + 2}.')
+        seen_names.setdefault(row['username'], index)
+        normalized = email_index.normalize(row['email'])
+        if normalized in seen_emails:
+            fail(index, 'email', f'Also on line {seen_emails[normalized] + 2}.')
+        seen_emails.setdefault(normalized, index)
+
+    for chunk in _chunks(seen_names, LOOKUP_CHUNK):
+        for username in User.objects.filter(username__in=chunk).values_list('username', flat=True):
+            fail(seen_names[username], 'username', 'A user with this username already exists.')
+    for chunk in _chunks(seen_emails, LOOKUP_CHUNK):
+        for email in EmailAddressIndex.objects.filter(email__in=chunk).values_list('email', flat=True):
+            fail(seen_emails[email], 'email', 'A user with this email already exists.')
+
+    # Line 1 is the header
+    return [{'line': index + 2, 'errors': problems[index]} for index in sorted(problems)]
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None):
+    """Yield the hashes of ``passwords`` in order, a chunk at a time, from a process pool."""
+    chunks = list(_chunks(passwords, get_setting('HASH_CHUNK_SIZE')))
+    if not chunks:
+        return
+    workers = min(workers or get_setting('HASH_WORKERS') or os.cpu_count() or 1, len(chunks))
+    # Spawned rather than forked, so the web server's threads and connections
+    # are not copied; each worker sets Django up before it imports this module
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=django.setup)
+    try:
+        yield from executor.map(_hash_chunk, chunks)
+    finally:
+        # Also when the consumer stops early, e.g. a client that disconnected
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def setup_url(token):
+    template = get_setting('SETUP_URL')
+    return template.format(token=token) if template else None
+
+
+def create_users(rows, hashes):
+    """Create a user, profile and email index row per checked row; returns ``[(user, setup token or None)]``.
+
+    ``hashes`` holds the password hash of each row that has a password, in
+    order. Runs in the caller's transaction.
+    """
+    batch_size = get_setting('BATCH_SIZE')
+    hashes = iter(hashes)
+    unusable = make_password(None)
+    users = [
+        User(username=row['username'], email=row['email'],
+             password=next(hashes) if row['password'] else unusable)
+        for row in rows
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    Profile.objects.bulk_create([Profile(user_id=user.id) for user in users], batch_size=batch_size)
+    EmailAddressIndex.objects.bulk_create(
+        [EmailAddressIndex(user_id=user.id, email=email_index.normalize(user.email)) for user in users],
+        batch_size=batch_size,
+    )
+    tokens = {
+        user.id: ResetPasswordToken(user_id=user.id, key=ResetPasswordToken.generate_key())
+        for user, row in zip(users, rows) if not row['password']
+    }
+    ResetPasswordToken.objects.bulk_create(tokens.values(), batch_size=batch_size)
+    return [(user, tokens[user.id].key if user.id in tokens else None) for user in users]
+
+
+def provision(rows, workers=None):
+    """Create users for checked ``rows``, yielding progress as dicts with a ``stage``.
+
+    ``hashing`` is reported after each chunk of passwords, ``setup`` once per
+    user given a setup token, and ``done`` (or ``error``) last. The users are
+    written only after every password is hashed, all of them or none.
+    """
+    passwords = [row['password'] for row in rows if row['password']]
+    hashes = []
+    created = None
+    yield {'stage': 'hashing', 'done': 0, 'total': len(passwords)}
+    try:
+        for chunk in hash_passwords(passwords, workers):
+            hashes.extend(chunk)
+            yield {'stage': 'hashing', 'done': len(hashes), 'total': len(passwords)}
+        created = db.run_in_transaction(create_users, rows, hashes)
+        for user, token in created:
+            if token is not None:
+                yield {'stage': 'setup', 'username': user.username, 'email': user.email,
+                       'token': token, 'url': setup_url(token)}
+    except IntegrityError:
+        # A name or address was taken after check(); nothing was written
+        yield {'stage': 'error', 'error': 'A username or email was taken meanwhile; no users were created.'}
+        return
+    except Exception:
+        # The stream must still say how it ended
+        logger.exception('Failed to provision %d voters', len(rows))
+        if created is None:
+            error = 'Provisioning failed; no users were created.'
+        else:
+            error = f'All {len(created)} users were created, but their setup links could not all be reported.'
+        yield {'stage': 'error', 'error': error}
+        return
+    yield {'stage': 'done', 'created': len(created), 'with_password': len(passwords),
+           'setup_links': len(created) - len(passwords)}
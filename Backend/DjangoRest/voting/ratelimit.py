@@ -0,0 +1,140 @@
+"""
+Token buckets shared by every worker process.
+
+The DRF throttles keep a list of request timestamps per client in the
+default cache, which is per process (``LocMemCache``): with N workers a
+client gets N times its limit, and every check rewrites the whole list.
+Here each client and scope has one bucket row in a SQLite file next to the
+main database, holding its token count and when it was last refilled. A
+check is one ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING`` statement,
+so it is atomic across processes and O(1) whatever the rate. Allowed and
+denied checks are also counted per scope and minute for hit-rate reports
+(``manage.py throttle_stats``).
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'BUCKET_PATH': None,
+    'STATS_RETENTION': 7 * 24 * 3600,
+}
+
+# Roughly one check in PRUNE_EVERY also drops idle buckets and old stats
+PRUNE_EVERY = 10_000
+
+
+def get_setting(name):
+    return getattr(settings, 'THROTTLING', {}).get(name, DEFAULTS[name])
+
+
+class BucketStore:
+    """Token buckets keyed by ``scope:ident`` in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                ' key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' updated REAL NOT NULL,'
+                ' full_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS stats ('
+                ' scope TEXT NOT NULL,'
+                ' minute INTEGER NOT NULL,'
+                ' allowed INTEGER NOT NULL DEFAULT 0,'
+                ' denied INTEGER NOT NULL DEFAULT 0,'
+                ' PRIMARY KEY (scope, minute))'
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, scope, ident, capacity, refill_rate, now=None):
+        """Take one token from the bucket; returns ``(allowed, seconds until one is available)``.
+
+        The bucket holds up to ``capacity`` tokens and gains ``refill_rate``
+        tokens per second; a new bucket starts full.
+        """
+        key = f'{scope}:{ident}'
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Read the clock holding the lock: a request that waited for it must
+            # not refill from before the update it waited for
+            now = time.time() if now is None else now
+            row = conn.execute(
+                'INSERT INTO buckets (key, tokens, updated, full_at) VALUES (:key, :capacity - 1, :now, :now + 1 / :rate)'
+                ' ON CONFLICT (key) DO UPDATE SET'
+                '  tokens = MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) - 1,'
+                '  updated = :now,'
+                '  full_at = :now + (:capacity - MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) + 1) / :rate'
+                ' WHERE MIN(:capacity, tokens + MAX(0, :now - updated) * :rate) >= 1'
+                ' RETURNING tokens',
+                {'key': key, 'capacity': capacity, 'rate': refill_rate, 'now': now},
+            ).fetchone()
+            allowed = row is not None
+            wait = 0.0
+            if not allowed:
+                tokens, updated = conn.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+                ).fetchone()
+                wait = (1 - min(capacity, tokens + max(0, now - updated) * refill_rate)) / refill_rate
+            column = 'allowed' if allowed else 'denied'
+            conn.execute(
+                f'INSERT INTO stats (scope, minute, {column}) VALUES (?, ?, 1)'
+                f' ON CONFLICT (scope, minute) DO UPDATE SET {column} = {column} + 1',
+                (scope, int(now // 60)),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if random.randrange(PRUNE_EVERY) == 0:
+            self.prune(now)
+        return allowed, max(0.0, wait)
+
+    def prune(self, now=None):
+        """Drop buckets that have refilled completely (same as absent) and expired stats."""
+        now = time.time() if now is None else now
+        conn = self._connection()
+        conn.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+        conn.execute('DELETE FROM stats WHERE minute < ?', (int((now - get_setting('STATS_RETENTION')) // 60),))
+
+    def stats(self, since):
+        """``{scope: (allowed, denied)}`` counted since the ``since`` timestamp."""
+        rows = self._connection().execute(
+            'SELECT scope, SUM(allowed), SUM(denied) FROM stats WHERE minute >= ? GROUP BY scope ORDER BY scope',
+            (int(since // 60),),
+        ).fetchall()
+        return {scope: (allowed, denied) for scope, allowed, denied in rows}
+
+    def reset(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM buckets')
+        conn.execute('DELETE FROM stats')
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    path = get_setting('BUCKET_PATH') or settings.BASE_DIR / 'throttle_buckets.sqlite3'
+    with _lock:
+        if _store is None or _store.path != str(path):
+            _store = BucketStore(path)
+        return _store
@@ -0,0 +1,180 @@
+"""
+Read replica routing.
+
+``ReplicaRoutingMiddleware`` marks each request: unsafe methods use the
+primary (``default``) throughout, safe ones may read from a replica listed in
+``REPLICATION['REPLICAS']``. ``ReplicaRouter`` then picks one replica per
+request and keeps it, and switches the rest of the request to the primary
+as soon as it writes. Code outside a request (commands, background
+threads) always uses the primary.
+
+Read-your-writes: a successful write pins the client's user and session to
+the primary for ``STICKY_SECONDS``, so the reads right after a vote or a
+comment see it, whichever worker serves them: pins are kept in
+voting.shared_state. (Not the IP address: behind a proxy that is the
+proxy's, and would pin everyone.) A client with neither is not pinned. Replicas lagging more than ``MAX_LAG`` seconds are skipped; with
+none left, reads go to the primary.
+
+Lag comes from the ``replication_heartbeat`` row that ``manage.py
+sync_replica`` writes on the primary before copying it to the SQLite
+replicas (on PostgreSQL, from the replay timestamp).
+"""
+import contextvars
+import math
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+from . import shared_state
+
+DEFAULTS = {
+    'REPLICAS': [],
+    'STICKY_SECONDS': 5,
+    'MAX_LAG': 5,
+    'LAG_CHECK_INTERVAL': 1,
+}
+
+PRIMARY = 'default'
+HEARTBEAT_TABLE = 'replication_heartbeat'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_setting(name):
+    return getattr(settings, 'REPLICATION', {}).get(name, DEFAULTS[name])
+
+
+class RoutingState:
+    """How the current request reads: ``replica`` once chosen, ``primary`` once pinned."""
+
+    def __init__(self, request, primary):
+        self.request = request
+        self.primary = primary
+        self.replica = None
+        self.user_checked = False
+
+
+_state = contextvars.ContextVar('votex_db_routing', default=None)
+
+
+def use_primary():
+    """Send the remaining reads of the current request to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.primary = True
+
+
+def pin_keys(request):
+    keys = []
+    user = resolved_user(request)
+    if user is not None and user.is_authenticated:
+        keys.append(f'primary-pin:user:{user.pk}')
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        keys.append(f'primary-pin:session:{session.session_key}')
+    return keys
+
+
+def resolved_user(request):
+    """``request.user`` if it is already known; evaluating a lazy user here would query the database."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def pin(request):
+    shared_state.get_store().pin(pin_keys(request), get_setting('STICKY_SECONDS'))
+
+
+def is_pinned(request):
+    return shared_state.get_store().is_pinned(pin_keys(request))
+
+
+_lag = {}
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (``inf`` if unknown), checked at most once per interval."""
+    now = time.monotonic()
+    checked_at, lag = _lag.get(alias, (None, math.inf))
+    if checked_at is not None and now - checked_at < get_setting('LAG_CHECK_INTERVAL'):
+        return lag
+    conn = connections[alias]
+    try:
+        with conn.cursor() as cursor:
+            if conn.vendor == 'postgresql':
+                cursor.execute('SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')
+                row = cursor.fetchone()
+                lag = float(row[0]) if row and row[0] is not None else 0.0
+            else:
+                cursor.execute(f'SELECT ts FROM {HEARTBEAT_TABLE} WHERE id = 1')
+                row = cursor.fetchone()
+                lag = time.time() - row[0] if row else math.inf
+    except DatabaseError:
+        lag = math.inf
+    _lag[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    healthy = [alias for alias in get_setting('REPLICAS') if replica_lag(alias) <= get_setting('MAX_LAG')]
+    return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.primary:
+            return PRIMARY
+        if not state.user_checked and getattr(resolved_user(state.request), 'is_authenticated', False):
+            # The user is only known once authentication ran (and session
+            # authentication may have settled on anonymous before token
+            # authentication did): re-check the pins then
+            state.user_checked = True
+            if is_pinned(state.request):
+                state.primary = True
+                return PRIMARY
+        if state.replica is None:
+            state.replica = choose_replica()
+            if state.replica is None:
+                state.primary = True
+                return PRIMARY
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        use_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {PRIMARY, *get_setting('REPLICAS')}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_setting('REPLICAS'):
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        state = RoutingState(request, primary=not safe or not get_setting('REPLICAS'))
+        if safe and state.primary is False and is_pinned(request):
+            state.primary = True
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if not safe and response.status_code < 400:
+            pin(request)
+        return response
@@ -0,0 +1,273 @@
+"""
+Versioned response cache for the event list and detail endpoints.
+
+Every event has a version number, bumped (after commit) by changes to the
+event, its candidates, its categories and by committed votes; the list
+endpoint has one more version bumped by any of those. The versions are
+shared by all worker processes (voting.shared_state), so a write or a vote
+handled by one worker, or by a management command, reaches all of them. The
+bodies stay in each worker's local cache, stored under the version they
+were built from: a bump makes them unreachable instead of having to find
+and delete them. Misses are built from the primary: a replica that has
+not replayed the write yet would store the old body under the new version.
+For the same reason a body built from cached vote totals (voting.counters)
+expires with them.
+
+Cached bodies are shared by all users. The fields that differ per user or
+per moment (``is_favorited``, ``status``, ``event_token``) are taken out
+before storing and computed again for every response; that costs one
+``Favorite`` query for authenticated users. Private event tokens are kept
+beside the body and only put back for the event's owner. Responses carry a weak ``ETag`` over both parts and
+``If-None-Match`` is answered with 304.
+"""
+import copy
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from rest_framework import status as http_status
+from rest_framework.response import Response
+
+from . import counters, images, replicas, shared_state
+from .models import Candidate, Category, Favorite, VotingEvent
+from .signals import votes_committed
+
+DEFAULTS = {
+    'TIMEOUT': 300,
+}
+
+LIST_VERSION_KEY = 'events-list-version'
+# Fields computed per response instead of being cached
+OVERLAY_FIELDS = ('status', 'is_favorited', 'event_token')
+
+
+def get_setting(name):
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def event_version_key(event_id):
+    return f'event-version:{event_id}'
+
+
+def get_version(key):
+    return shared_state.get_store().versions([key])[key]
+
+
+def bump(event_ids):
+    """Make cached bodies of ``event_ids`` and of every list page unreachable, in every worker."""
+    shared_state.get_store().bump([LIST_VERSION_KEY, *(event_version_key(event_id) for event_id in set(event_ids))])
+
+
+def bump_on_commit(event_ids):
+    event_ids = list(event_ids)
+    transaction.on_commit(lambda: bump(event_ids))
+
+
+def list_key(request):
+    params = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    digest = hashlib.sha1(json.dumps([request.get_host(), params]).encode()).hexdigest()
+    return f'events-list:{get_version(LIST_VERSION_KEY)}:{digest}'
+
+
+def detail_key(request, event_id):
+    # The picture variant is the only query parameter the detail body depends on
+    variant = request.query_params.get(images.QUERY_PARAM, '')
+    return f'event:{event_id}:{get_version(event_version_key(event_id))}:{request.get_host()}:{variant}'
+
+
+def next_status_change(now):
+    """When the first event after ``now`` starts or ends, as a timestamp (or None)."""
+    upcoming = VotingEvent.objects.aggregate(
+        start=Min('start_time', filter=Q(start_time__gt=now)),
+        end=Min('end_time', filter=Q(end_time__gt=now)),
+    )
+    changes = [moment.timestamp() for moment in upcoming.values() if moment is not None]
+    return min(changes) if changes else None
+
+
+def _events(data, many):
+    return data['results'] if many else [data]
+
+
+def visible_token(entry, event_id, user):
+    owner_id, token = entry.get('tokens', {}).get(event_id, (None, None))
+    return token if owner_id is not None and owner_id == user.id else None
+
+
+def make_entry(data, many, user, valid_until=None):
+    """Split a freshly serialized body into the shared entry and ``user``'s overlay.
+
+    The body must carry every event's token (``reveal_event_tokens`` in the
+    serializer context); the overlay keeps only the ones ``user`` owns.
+    """
+    shared = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    times = {}
+    tokens = {}
+    overlay = {}
+    for event in _events(shared, many):
+        overlay[event['id']] = {field: event.pop(field) for field in OVERLAY_FIELDS}
+        if overlay[event['id']]['event_token']:
+            tokens[event['id']] = (event['created_by'], overlay[event['id']]['event_token'])
+        times[event['id']] = (
+            parse_datetime(event['start_time']).timestamp(),
+            parse_datetime(event['end_time']).timestamp(),
+        )
+    entry = {
+        'data': shared,
+        'many': many,
+        'times': times,
+        # Owner and token of each private event
+        'tokens': tokens,
+        'etag': hashlib.sha1(json.dumps(shared, sort_keys=True).encode()).hexdigest()[:16],
+        'valid_until': valid_until,
+    }
+    for event_id, values in overlay.items():
+        values['event_token'] = visible_token(entry, event_id, user)
+    return entry, overlay
+
+
+def compute_overlay(entry, user):
+    """``status``, ``is_favorited`` and ``event_token`` of every event in ``entry`` for ``user``, now."""
+    favorited = set()
+    if user.is_authenticated and entry['times']:
+        favorited = set(
+            Favorite.objects.filter(user=user, event_id__in=list(entry['times']))
+            .values_list('event_id', flat=True)
+        )
+    now = time.time()
+    overlay = {}
+    for event_id, (start, end) in entry['times'].items():
+        status = 'ongoing' if start <= now <= end else ('upcoming' if now < start else 'ended')
+        overlay[event_id] = {
+            'status': status,
+            'is_favorited': event_id in favorited,
+            'event_token': visible_token(entry, event_id, user),
+        }
+    return overlay
+
+
+def apply_overlay(entry, overlay):
+    data = copy.deepcopy(entry['data'])
+    for event in _events(data, entry['many']):
+        event.update(overlay[event['id']])
+    return data
+
+
+def overlay_etag(entry, overlay):
+    digest = hashlib.sha1(json.dumps(
+        [[event_id, *(values[field] for field in OVERLAY_FIELDS)] for event_id, values in sorted(overlay.items())]
+    ).encode()).hexdigest()[:8]
+    return f'W/"{entry["etag"]}-{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+
+def cached_response(request, key, build, many, time_dependent=False):
+    """Serve ``key`` from the cache, calling ``build()`` for a DRF response on a miss.
+
+    ``build()`` must serialize with ``reveal_event_tokens``; tokens are hidden here.
+It reads from the primary.
+
+    Only 200 responses are stored. ``time_dependent`` entries (lists
+    filtered by status) expire when the next event starts or ends.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['valid_until'] is not None and time.time() >= entry['valid_until']:
+        entry = None
+
+    if entry is None:
+        # The body is kept for every later reader: build it from the primary,
+        # not from a replica that may not have the write the version is for
+        replicas.use_primary()
+        with counters.tracking_expiry() as totals:
+            response = build()
+        if response.status_code != http_status.HTTP_200_OK:
+            return response
+        valid_until = next_status_change(timezone.now()) if time_dependent else None
+        entry, overlay = make_entry(response.data, many, request.user, valid_until)
+        for event in _events(response.data, many):
+            event['event_token'] = overlay[event['id']]['event_token']
+        timeout = get_setting('TIMEOUT')
+        if valid_until is not None:
+            timeout = max(1, min(timeout, int(valid_until - time.time()) + 1))
+        if totals.expires_at is not None:
+            # Cached vote totals may predate the vote that bumped the version:
+            # keep the body no longer than them
+            timeout = max(1, min(timeout, int(totals.expires_at - time.time()) + 1))
+        cache.set(key, entry, timeout)
+        hit = 'MISS'
+    else:
+        overlay = compute_overlay(entry, request.user)
+        response = None
+        hit = 'HIT'
+
+    etag = overlay_etag(entry, overlay)
+    if etag_matches(request, etag):
+        response = Response(status=http_status.HTTP_304_NOT_MODIFIED)
+    elif response is None:
+        response = Response(apply_overlay(entry, overlay))
+    response['ETag'] = etag
+    response['X-Cache'] = hit
+    # Clients must revalidate, and the overlay makes bodies differ between users
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
+
+@receiver(post_save, sender=VotingEvent)
+@receiver(post_delete, sender=VotingEvent)
+def bump_event(sender, instance, **kwargs):
+    bump_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def bump_candidate_event(sender, instance, **kwargs):
+    bump_on_commit([instance.voting_event_id])
+
+
+@receiver(post_save, sender=Category)
+def bump_category_events(sender, instance, created, **kwargs):
+    if not created:
+        bump_on_commit(instance.events.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def bump_deleted_category_events(sender, instance, **kwargs):
+    bump_on_commit(instance.events.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=VotingEvent.categories.through)
+def bump_event_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_on_commit([instance.pk])
+    elif action == 'pre_clear':
+        bump_on_commit(instance.events.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        bump_on_commit(pk_set)
+
+
+@receiver(votes_committed)
+def bump_voted_event(sender, event_id, **kwargs):
+    # The cached totals are left alone (see voting.counters); a body rebuilt
+    # from them only lives as long as they do
+    bump([event_id])
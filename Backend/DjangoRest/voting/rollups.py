@@ -0,0 +1,183 @@
+"""
+Per-minute vote rollups.
+
+Votes are not added to their ``VoteRollup`` row as they are cast: with
+many voters on one candidate that row would be the single hot row the
+sharded counters (voting.counters) avoid. ``catch_up()`` brings the rollups
+up to date afterwards instead, recounting from the ``Vote`` rows every
+minute that votes cast since its last run fell in, so a rollup is always an
+exact count whatever order votes arrive in. After votes commit, a background
+thread in the worker runs it every ``VOTE_ROLLUPS['INTERVAL']`` seconds
+(or run ``manage.py roll_up_votes``), so the timeline lags by about that long.
+
+``timeline()`` answers turnout-over-time questions from those rows alone.
+Its cost follows the number of minutes with votes, not the number of votes;
+hours and days are summed from the minutes. ``manage.py
+rebuild_vote_rollups`` recomputes them from the ``Vote`` rows.
+"""
+import logging
+import threading
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc, TruncMinute
+from django.dispatch import receiver
+
+from . import db
+from .models import Vote, VoteRollup, VoteRollupProgress
+from .signals import votes_committed
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+DEFAULTS = {
+    'INTERVAL': 5,
+    'BATCH_SIZE': 5000,
+    'AUTO': True,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'VOTE_ROLLUPS', {}).get(name, DEFAULTS[name])
+
+
+def bucket_for(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def rebuild(event_ids, start=None, end=None):
+    """Recompute the rollups of ``event_ids`` from their votes; returns the number of buckets written.
+
+    ``start`` and ``end`` (whole minutes) limit it to the minutes from
+    ``start`` (inclusive) to ``end`` (exclusive).
+    """
+    votes = Vote.objects.filter(voting_event_id__in=event_ids)
+    stale = VoteRollup.objects.filter(event_id__in=event_ids)
+    if start is not None:
+        votes = votes.filter(created_at__gte=start)
+        stale = stale.filter(bucket__gte=start)
+    if end is not None:
+        votes = votes.filter(created_at__lt=end)
+        stale = stale.filter(bucket__lt=end)
+    stale.delete()
+    rows = (
+        votes.annotate(bucket=TruncMinute('created_at'))
+        .values('voting_event_id', 'candidate_id', 'bucket')
+        .annotate(votes=Count('id'))
+        .order_by()
+    )
+    rollups = VoteRollup.objects.bulk_create(
+        [
+            VoteRollup(event_id=row['voting_event_id'], candidate_id=row['candidate_id'], bucket=row['bucket'],
+                       count=row['votes'])
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+    return len(rollups)
+
+
+def catch_up(batch_size=None):
+    """Recount the minutes of the votes cast since the last call; returns how many votes that was.
+
+    Vote ids grow in commit order (SQLite has one writer at a time), so
+    every vote up to the last id seen has been counted.
+    """
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    total = 0
+    while True:
+        seen = db.run_in_transaction(_catch_up_batch, batch_size)
+        total += seen
+        if seen < batch_size:
+            return total
+
+
+def _catch_up_batch(batch_size):
+    progress, _ = VoteRollupProgress.objects.get_or_create(pk=1)
+    votes = list(
+        Vote.objects.filter(id__gt=progress.last_vote_id).order_by('id')
+        .values_list('id', 'voting_event_id', 'created_at')[:batch_size]
+    )
+    if not votes:
+        return 0
+    spans = {}
+    for _, event_id, created_at in votes:
+        minute = bucket_for(created_at)
+        first, last = spans.get(event_id, (minute, minute))
+        spans[event_id] = (min(first, minute), max(last, minute))
+    for event_id, (first, last) in spans.items():
+        rebuild([event_id], start=first, end=last + timedelta(minutes=1))
+    progress.last_vote_id = votes[-1][0]
+    progress.save(update_fields=['last_vote_id'])
+    return len(votes)
+
+
+class RollupUpdater(threading.Thread):
+    """Background thread that keeps the rollups of this worker's votes up to date."""
+
+    def __init__(self, interval):
+        super().__init__(name='vote-rollup-updater', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                catch_up()
+            except Exception:
+                logger.exception('Failed to update vote rollups')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_updater = None
+_lock = threading.Lock()
+
+
+def ensure_updater():
+    global _updater
+    with _lock:
+        if _updater is None or not _updater.is_alive():
+            _updater = RollupUpdater(get_setting('INTERVAL'))
+            _updater.start()
+    return _updater
+
+
+@receiver(votes_committed)
+def schedule_catch_up(sender, **kwargs):
+    if get_setting('AUTO'):
+        ensure_updater()
+
+
+def timeline(event_id, resolution='minute', start=None, end=None, tzinfo=None):
+    """Votes per ``resolution`` period, oldest first: ``[(period start, {candidate_id: votes}), ...]``.
+
+    Only minutes from ``start`` (inclusive) to ``end`` (exclusive) count;
+    hours and days are those of ``tzinfo`` (default UTC).
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'resolution must be one of {", ".join(RESOLUTIONS)}')
+    rollups = VoteRollup.objects.filter(event_id=event_id)
+    if start is not None:
+        rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        rollups = rollups.filter(bucket__lt=end)
+    rows = (
+        rollups.annotate(period=Trunc('bucket', resolution, tzinfo=tzinfo or dt_timezone.utc))
+        .values('period', 'candidate_id')
+        .annotate(votes=Sum('count'))
+        .order_by('period', 'candidate_id')
+        .values_list('period', 'candidate_id', 'votes')
+    )
+    periods = []
+    for period, candidate_id, votes in rows:
+        if not periods or periods[-1][0] != period:
+            periods.append((period, {}))
+        periods[-1][1][candidate_id] = votes
+    return periods
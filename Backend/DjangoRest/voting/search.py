@@ -0,0 +1,195 @@
+"""
+Full-text search over voting events.
+
+Each event has one row in the ``voting_event_search`` FTS5 table (rowid =
+event id) holding its name, its candidates' names and descriptions and its
+category names. Model signals rewrite an event's row inside the same
+transaction as the change, and ``manage.py rebuild_search_index`` rebuilds
+the whole table. The table is created after ``migrate``; where FTS5 is not
+available (another database, or SQLite built without it) searching falls
+back to ``icontains`` over the same fields.
+"""
+import logging
+import re
+
+from django.db import DatabaseError, connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Candidate, Category, VotingEvent
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'voting_event_search'
+COLUMNS = ('event_name', 'candidate_names', 'candidate_descriptions', 'category_names')
+# bm25 weight of each column: a hit in the event name outranks one in a description
+WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+_available = {}
+
+
+def is_available(using='default'):
+    """Whether the FTS table exists on ``using`` (checked once per database)."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    key = (using, str(conn.settings_dict['NAME']))
+    if key not in _available:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE])
+            _available[key] = cursor.fetchone() is not None
+    return _available[key]
+
+
+def create_index(using='default'):
+    """Create the FTS table if it does not exist. Returns False where FTS5 is unsupported."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5({', '.join(COLUMNS)}, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+    except DatabaseError as exc:
+        logger.warning('Full-text search disabled, could not create %s: %s', TABLE, exc)
+        return False
+    _available.pop((using, str(conn.settings_dict['NAME'])), None)
+    return True
+
+
+def index_events(event_ids):
+    """Rewrite the search rows of ``event_ids``; events that no longer exist are dropped."""
+    event_ids = list(set(event_ids))
+    if not event_ids or not is_available():
+        return
+    documents = {
+        event_id: [name, [], [], []]
+        for event_id, name in VotingEvent.objects.filter(id__in=event_ids).values_list('id', 'event_name')
+    }
+    for event_id, name, description in (
+        Candidate.objects.filter(voting_event_id__in=documents).order_by('id')
+        .values_list('voting_event_id', 'name', 'description')
+    ):
+        documents[event_id][1].append(name)
+        documents[event_id][2].append(description)
+    for event_id, name in (
+        VotingEvent.categories.through.objects.filter(votingevent_id__in=documents)
+        .values_list('votingevent_id', 'category__name')
+    ):
+        documents[event_id][3].append(name)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(event_ids))})", event_ids
+        )
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+            [
+                (event_id, name, '\n'.join(names), '\n'.join(descriptions), '\n'.join(categories))
+                for event_id, (name, names, descriptions, categories) in documents.items()
+            ],
+        )
+
+
+def clear_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+
+def optimize_index():
+    """Merge the FTS b-trees into one; worth running after a rebuild."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+def match_expression(text):
+    """User input as an FTS5 query: every word must match as a prefix of some indexed word.
+
+    Words are quoted so that operators and punctuation in the input are never
+    interpreted as FTS5 syntax.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_events(queryset, text):
+    """Filter ``queryset`` to events matching ``text``, annotated with ``search_rank``.
+
+    Lower ranks are better matches (bm25), so order by ``search_rank``
+    ascending. Without the FTS table the rank is 0 for every match.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return queryset.none()
+    if not is_available(queryset.db):
+        terms = Q()
+        for word in re.findall(r'\w+', text):
+            terms &= (
+                Q(event_name__icontains=word) | Q(candidates__name__icontains=word)
+                | Q(candidates__description__icontains=word) | Q(categories__name__icontains=word)
+            )
+        matching = VotingEvent.objects.filter(terms).values('id')
+        return queryset.filter(id__in=matching).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    table = queryset.model._meta.db_table
+    weights = ', '.join(str(weight) for weight in WEIGHTS)
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', (expression,))
+    ).annotate(search_rank=RawSQL(
+        f'SELECT bm25({TABLE}, {weights}) FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid = "{table}"."id"',
+        (expression,),
+        output_field=FloatField(),
+    ))
+
+
+@receiver(post_migrate)
+def create_index_after_migrate(sender, using='default', **kwargs):
+    if sender.name == 'voting':
+        create_index(using)
+
+
+@receiver(post_save, sender=VotingEvent)
+@receiver(post_delete, sender=VotingEvent)
+def reindex_event(sender, instance, **kwargs):
+    index_events([instance.pk])
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def reindex_candidate_event(sender, instance, **kwargs):
+    index_events([instance.voting_event_id])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_events(sender, instance, created, **kwargs):
+    if not created:
+        index_events(instance.events.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_events(sender, instance, **kwargs):
+    instance._search_event_ids = list(instance.events.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_deleted_category_events(sender, instance, **kwargs):
+    index_events(getattr(instance, '_search_event_ids', []))
+
+
+@receiver(m2m_changed, sender=VotingEvent.categories.through)
+def reindex_event_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index_events([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_event_ids = list(instance.events.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        index_events(pk_set)
+    elif action == 'post_clear':
+        index_events(getattr(instance, '_search_event_ids', []))
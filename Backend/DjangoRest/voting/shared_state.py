@@ -0,0 +1,132 @@
+"""
+Version counters and primary pins shared by every worker process.
+
+The default cache is ``LocMemCache``, one per process: a version bumped
+there is seen by no other worker, and a management command (the vote
+drainer, the notification fan-out) reaches none of them. The response
+cache versions (voting.response_cache) and unread-count generations
+(voting.unread) are kept instead in a SQLite file next to the main
+database, like the throttle buckets (voting.ratelimit). What they protect
+can stay in the local cache, stored under the version it was built from.
+The read-your-writes pins of voting.replicas live here too: the next
+request of a client that just wrote may reach any worker.
+
+Reading versions is one indexed ``SELECT`` on a per-thread connection in WAL
+mode. A bump is an ``INSERT ... ON CONFLICT DO UPDATE`` and atomic across
+processes. A missing version reads as 0; a new one starts from the clock,
+so a recreated file never hands out a number that old entries were stored
+under.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULTS = {
+    'PATH': None,
+}
+
+# Expired pins are deleted on roughly one pin() in this many
+PRUNE_EVERY = 100
+
+
+def get_setting(name):
+    return getattr(settings, 'SHARED_STATE', {}).get(name, DEFAULTS[name])
+
+
+class SharedStore:
+    """Version counters and expiring pins keyed by string, in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS pins (key TEXT PRIMARY KEY, until REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+    def versions(self, keys):
+        """``{key: version}`` for ``keys``; 0 for keys never bumped."""
+        keys = list(keys)
+        rows = self._connection().execute(
+            f'SELECT key, value FROM versions WHERE key IN ({", ".join("?" * len(keys))})', keys,
+        ).fetchall()
+        found = dict(rows)
+        return {key: found.get(key, 0) for key in keys}
+
+    def bump(self, keys):
+        keys = sorted(set(keys))
+        if not keys:
+            return
+        seed = time.time_ns()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO versions (key, value) VALUES (?, ?)'
+                ' ON CONFLICT (key) DO UPDATE SET value = value + 1',
+                [(key, seed) for key in keys],
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def pin(self, keys, seconds, now=None):
+        """Pin ``keys`` for ``seconds``; a longer pin already in place is kept."""
+        keys = sorted(set(keys))
+        if not keys:
+            return
+        now = time.time() if now is None else now
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO pins (key, until) VALUES (?, ?)'
+                ' ON CONFLICT (key) DO UPDATE SET until = MAX(until, excluded.until)',
+                [(key, now + seconds) for key in keys],
+            )
+            if random.randrange(PRUNE_EVERY) == 0:
+                conn.execute('DELETE FROM pins WHERE until <= ?', (now,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def is_pinned(self, keys, now=None):
+        """Whether any of ``keys`` is pinned at ``now``."""
+        keys = list(keys)
+        if not keys:
+            return False
+        now = time.time() if now is None else now
+        row = self._connection().execute(
+            f'SELECT 1 FROM pins WHERE key IN ({", ".join("?" * len(keys))}) AND until > ? LIMIT 1', [*keys, now],
+        ).fetchone()
+        return row is not None
+
+    def reset(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM versions')
+        conn.execute('DELETE FROM pins')
+
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    path = get_setting('PATH') or settings.BASE_DIR / 'shared_state.sqlite3'
+    with _lock:
+        if _store is None or _store.path != str(path):
+            _store = SharedStore(path)
+        return _store
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent after a transaction that recorded votes has committed.
+# Arguments: event_id, deltas ({candidate_id: votes added}), through (the
+# highest Vote id the transaction wrote for the event).
+votes_committed = Signal()
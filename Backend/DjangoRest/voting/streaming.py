@@ -0,0 +1,331 @@
+"""
+Live result updates.
+
+Committed votes are published as per-candidate deltas to a ``ResultsHub``.
+The hub coalesces them for ``COALESCE_INTERVAL`` seconds and then hands one
+merged frame per event to each subscriber; a subscriber that is slower than
+that keeps merging into its own pending frame, so a client never receives
+more than one frame per interval regardless of the vote rate.
+
+A client first gets a snapshot of the totals, then deltas. Each delta
+carries the highest vote id its transaction wrote (``through``), and the
+snapshot the id of the last vote it includes, read by the same statement.
+Deltas are buffered until the snapshot is read, and those at or below its
+id are dropped: a vote that commits while the client subscribes is counted
+once. This relies on vote ids growing in commit order, which SQLite's
+single writer guarantees.
+
+With ``RESULTS_STREAM['BROKER'] = 'sqlite'`` deltas are appended to a shared
+SQLite file instead, and every worker process polls it into its own hub. It
+stands in for a real broker (Redis pub/sub and the like) on a single host.
+"""
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.dispatch import receiver
+
+from . import counters
+from .models import VotingEvent
+from .signals import votes_committed
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BROKER': 'local',
+    'BROKER_PATH': None,
+    'BROKER_POLL_INTERVAL': 0.25,
+    'BROKER_RETENTION': 300,
+    'COALESCE_INTERVAL': 1.0,
+    'HEARTBEAT_INTERVAL': 15,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'RESULTS_STREAM', {}).get(name, DEFAULTS[name])
+
+
+class Subscription:
+    """One connected client. Lives on the event loop that serves it."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = Counter()
+        self.ready = asyncio.Event()
+        self.sequence = 0
+        # The last vote id the snapshot includes; until it is read, deltas wait in early
+        self.floor = None
+        self.early = []
+
+    def deliver(self, items):
+        """Hand over ``[(through, deltas), ...]``. Safe to call from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._merge, items)
+        except RuntimeError:
+            # The loop is closed; the client is gone and will unsubscribe itself
+            pass
+
+    def start(self, floor):
+        """Pass on only the deltas of votes after ``floor``, from now on and from those that waited."""
+        self.floor = floor
+        early, self.early = self.early, []
+        self._merge(early)
+
+    def _merge(self, items):
+        if self.floor is None:
+            self.early.extend(items)
+            return
+        for through, deltas in items:
+            # Deltas without an id (from an older broker row) cannot be placed; pass them on
+            if through is None or through > self.floor:
+                self.pending.update(deltas)
+                self.ready.set()
+
+    async def next_frame(self, timeout):
+        """Wait for the next merged delta; ``None`` when ``timeout`` passes first."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        deltas, self.pending = self.pending, Counter()
+        self.sequence += 1
+        return {str(candidate_id): n for candidate_id, n in deltas.items() if n}
+
+
+class ResultsHub:
+    """In-process pub/sub of vote deltas keyed by event id."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._pending = {}
+        self._timer = None
+
+    def subscribe(self, event_id):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[event_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, event_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(event_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[event_id]
+
+    def subscriber_count(self, event_id=None):
+        with self._lock:
+            if event_id is not None:
+                return len(self._subscribers.get(event_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, event_id, deltas, through=None):
+        """Queue deltas for the next flush. Safe to call from any thread."""
+        with self._lock:
+            if event_id not in self._subscribers:
+                return
+            # Kept apart until delivery: each subscriber drops those its snapshot includes
+            self._pending.setdefault(event_id, []).append((through, deltas))
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+            targets = [
+                (subscription, items)
+                for event_id, items in pending.items()
+                for subscription in self._subscribers.get(event_id, ())
+            ]
+        for subscription, items in targets:
+            subscription.deliver(items)
+
+
+class SQLiteBroker:
+    """Cross-process fan-out through an append-only SQLite table.
+
+    ``publish`` appends a row; each process runs one poller thread that reads
+    rows it has not seen yet and republishes them into its local hub.
+    """
+
+    def __init__(self, path, hub, poll_interval=0.25, retention=300):
+        self.path = str(path)
+        self.hub = hub
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._poller = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS deltas ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' event_id INTEGER NOT NULL,'
+                ' payload TEXT NOT NULL,'
+                ' published_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def publish(self, event_id, deltas, through=None):
+        self._connection().execute(
+            'INSERT INTO deltas (event_id, payload, published_at) VALUES (?, ?, ?)',
+            (event_id, json.dumps({'through': through, 'candidates': deltas}), time.time()),
+        )
+
+    def listen(self):
+        with self._lock:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll, name='results-broker-poller', daemon=True)
+                self._poller.start()
+
+    def _poll(self):
+        conn = self._connection()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM deltas').fetchone()[0]
+        last_prune = time.monotonic()
+        while True:
+            rows = []
+            try:
+                rows = conn.execute(
+                    'SELECT id, event_id, payload FROM deltas WHERE id > ? ORDER BY id LIMIT 1000',
+                    (last_id,),
+                ).fetchall()
+                for row_id, event_id, payload in rows:
+                    payload = json.loads(payload)
+                    if 'candidates' not in payload:
+                        # Written before rows carried the vote id
+                        payload = {'through': None, 'candidates': payload}
+                    deltas = {int(k): v for k, v in payload['candidates'].items()}
+                    self.hub.publish(event_id, deltas, payload['through'])
+                    last_id = row_id
+                if time.monotonic() - last_prune > self.retention:
+                    conn.execute('DELETE FROM deltas WHERE published_at < ?', (time.time() - self.retention,))
+                    last_prune = time.monotonic()
+            except sqlite3.Error:
+                logger.exception('Results broker poll failed')
+            if not rows:
+                time.sleep(self.poll_interval)
+
+
+_hub = None
+_broker = None
+_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    with _lock:
+        if _hub is None:
+            _hub = ResultsHub(get_setting('COALESCE_INTERVAL'))
+        return _hub
+
+
+def get_broker():
+    """The shared broker, or ``None`` when fan-out stays within this process."""
+    global _broker
+    if get_setting('BROKER') != 'sqlite':
+        return None
+    hub = get_hub()
+    path = get_setting('BROKER_PATH') or settings.BASE_DIR / 'results_broker.sqlite3'
+    with _lock:
+        if _broker is None or _broker.path != str(path):
+            _broker = SQLiteBroker(
+                path, hub,
+                poll_interval=get_setting('BROKER_POLL_INTERVAL'),
+                retention=get_setting('BROKER_RETENTION'),
+            )
+        return _broker
+
+
+@receiver(votes_committed)
+def publish_vote_deltas(sender, event_id, deltas, through=None, **kwargs):
+    broker = get_broker()
+    try:
+        if broker is not None:
+            broker.publish(event_id, deltas, through)
+        else:
+            get_hub().publish(event_id, deltas, through)
+    except Exception:
+        # Live updates are best effort; the vote itself is already committed
+        logger.exception('Failed to publish vote deltas for event %s', event_id)
+
+
+def current_counts(event_id):
+    """``({candidate_id: votes}, last vote id)``, keyed by string for JSON."""
+    totals, through = counters.count_votes_through(event_id)
+    return {str(candidate_id): votes for candidate_id, votes in totals.items()}, through
+
+
+async def result_frames(event_id):
+    """Yield ``(kind, payload)`` pairs: a snapshot, then deltas, with ``None`` as a heartbeat."""
+    hub = get_hub()
+    broker = get_broker()
+    if broker is not None:
+        broker.listen()
+    # Subscribe before reading the snapshot so no committed vote falls between
+    # the two; start() then drops the deltas the snapshot already includes
+    subscription = hub.subscribe(event_id)
+    try:
+        snapshot, through = await sync_to_async(current_counts)(event_id)
+        subscription.start(through)
+        yield 'snapshot', {'event': event_id, 'candidates': snapshot}
+        heartbeat = get_setting('HEARTBEAT_INTERVAL')
+        while True:
+            deltas = await subscription.next_frame(heartbeat)
+            if deltas is None:
+                yield None
+            elif deltas:
+                yield 'delta', {'event': event_id, 'seq': subscription.sequence, 'candidates': deltas}
+    finally:
+        hub.unsubscribe(event_id, subscription)
+
+
+WEBSOCKET_PATH = re.compile(r'^/ws/events/(?P<pk>\d+)/results/$')
+
+
+async def results_websocket(scope, receive, send):
+    """Raw ASGI WebSocket endpoint at ``/ws/events/<pk>/results/``."""
+    match = WEBSOCKET_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None or not await VotingEvent.objects.filter(pk=match['pk']).aexists():
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def pump():
+        async for frame in result_frames(int(match['pk'])):
+            if frame is None:
+                continue
+            kind, payload = frame
+            await send({'type': 'websocket.send', 'text': json.dumps({'type': kind, **payload})})
+
+    sender = asyncio.ensure_future(pump())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        sender.cancel()
@@ -0,0 +1,83 @@
+import subprocess
+import sys
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from voting import event_tokens, principals
+from voting.models import Candidate, VotingEvent
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix, tmp_path_factory):
+    # On disk rather than SQLite's shared in-memory database, which answers
+    # concurrent writers with "table is locked" instead of waiting for the lock
+    connections['default'].settings_dict['TEST']['NAME'] = str(tmp_path_factory.mktemp('db') / 'test.sqlite3')
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(settings, tmp_path):
+    """Side files in the test's own directory, empty per-process caches, activity written at once, no rollup thread."""
+    settings.THROTTLING = {**settings.THROTTLING, 'BUCKET_PATH': tmp_path / 'throttle_buckets.sqlite3'}
+    settings.SHARED_STATE = {**settings.SHARED_STATE, 'PATH': tmp_path / 'shared_state.sqlite3'}
+    settings.VOTE_INGESTION = {
+        **settings.VOTE_INGESTION, 'MODE': 'sync', 'QUEUE_PATH': tmp_path / 'vote_queue.sqlite3', 'AUTODRAIN': False,
+    }
+    settings.ACTIVITY_LOG = {**settings.ACTIVITY_LOG, 'MODE': 'sync'}
+    settings.VOTE_ROLLUPS = {**settings.VOTE_ROLLUPS, 'AUTO': False}
+    cache.clear()
+    principals.cache.clear()
+    event_tokens.cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(username, password=None, **fields):
+        return User.objects.create_user(username, fields.pop('email', f'{username}@example.com'), password, **fields)
+    return make
+
+
+@pytest.fixture
+def owner(make_user):
+    return make_user('owner')
+
+
+@pytest.fixture
+def event(owner):
+    """An ongoing public event with three candidates."""
+    now = timezone.now()
+    event = VotingEvent.objects.create(
+        event_name='Board election', created_by=owner,
+        start_time=now - timedelta(hours=1), end_time=now + timedelta(hours=1),
+    )
+    Candidate.objects.bulk_create([Candidate(voting_event=event, name=f'Candidate {i}') for i in range(3)])
+    return event
+
+
+@pytest.fixture
+def client_for():
+    def make(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+    return make
+
+
+@pytest.fixture
+def bump_elsewhere(settings):
+    """Bump shared versions from a separate interpreter, as another worker process would."""
+    script = 'import sys; from voting.shared_state import SharedStore; SharedStore(sys.argv[1]).bump(sys.argv[2:])'
+
+    def bump(*keys):
+        subprocess.run(
+            [sys.executable, '-c', script, str(settings.SHARED_STATE['PATH']), *keys],
+            cwd=settings.BASE_DIR, check=True,
+        )
+    return bump
@@ -0,0 +1,54 @@
+import pytest
+
+from voting import email_index
+from voting.admin import CustomUserChangeForm
+from voting.models import EmailAddressIndex
+
+
+def log_in(client, email, password):
+    return client.post('/api/token/', {'username': email, 'password': password}, format='json')
+
+
+@pytest.mark.django_db
+def test_login_matches_the_email_in_any_case(client, make_user):
+    make_user('voter', password='s3cret-pass', email='Voter@Example.com')
+
+    assert log_in(client, 'voter@example.COM', 's3cret-pass').status_code == 200
+    assert log_in(client, 'voter@example.com', 'wrong').status_code == 401
+
+
+@pytest.mark.django_db
+def test_a_user_missing_from_the_index_logs_in_and_is_indexed(client, make_user):
+    user = make_user('legacy', password='s3cret-pass', email='Legacy@Example.com')
+    # As written before the index existed
+    EmailAddressIndex.objects.all().delete()
+
+    assert log_in(client, 'legacy@example.com', 's3cret-pass').status_code == 200
+    assert EmailAddressIndex.objects.get(user=user).email == 'legacy@example.com'
+
+
+@pytest.mark.django_db
+def test_an_address_differing_only_in_case_is_refused(make_user, client_for):
+    make_user('first', email='Shared@Example.com')
+    second = make_user('second')
+
+    response = client_for(second).patch('/api/users/me/', {'email': 'shared@example.com'}, format='json')
+
+    assert response.status_code == 400
+    assert 'email' in response.data
+    # Also against a user the index does not know yet
+    EmailAddressIndex.objects.all().delete()
+    assert email_index.is_taken('SHARED@example.com')
+
+
+@pytest.mark.django_db
+def test_the_admin_form_refuses_an_address_differing_only_in_case(make_user):
+    make_user('first', email='Shared@Example.com')
+    second = make_user('second')
+    form = CustomUserChangeForm(
+        {'username': second.username, 'email': 'shared@example.com', 'date_joined': second.date_joined},
+        instance=second,
+    )
+
+    assert not form.is_valid()
+    assert 'email' in form.errors
@@ -0,0 +1,155 @@
+import time
+
+import pytest
+from django.db import transaction
+
+from voting import activity
+from voting.models import ActivityLog
+
+
+@pytest.fixture
+def buffered(settings, monkeypatch):
+    """Buffered activity logging with a process writer that never flushes on its own."""
+    settings.ACTIVITY_LOG = {**settings.ACTIVITY_LOG, 'MODE': 'buffered', 'FLUSH_INTERVAL': 60}
+    monkeypatch.setattr(activity, '_writer', None)
+    yield
+    if activity._writer is not None:
+        activity._writer.close()
+
+
+def logs(action_type='other', count=1, **fields):
+    return [ActivityLog(action_type=action_type, action=f'{action_type} {i}', **fields) for i in range(count)]
+
+
+@pytest.mark.django_db
+def test_buffered_rows_wait_for_the_flush(buffered, event, make_user, client_for, django_capture_on_commit_callbacks):
+    voter = make_user('voter')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client_for(voter).post(f'/api/events/{event.id}/vote/', {'candidate': event.candidates.first().id})
+
+    assert response.status_code == 200
+    assert not ActivityLog.objects.exists()
+    assert activity.flush() == 1
+    log = ActivityLog.objects.get()
+    assert (log.action_type, log.user_id, log.event_id) == ('vote', voter.id, event.id)
+
+
+@pytest.mark.django_db
+def test_rows_are_not_handed_over_when_the_transaction_rolls_back(buffered, owner, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with pytest.raises(RuntimeError), transaction.atomic():
+            activity.record('favorite', owner)
+            raise RuntimeError
+
+    assert callbacks == []
+
+    assert activity.flush() == 0
+
+
+@pytest.mark.django_db
+def test_flush_writes_in_batches(django_assert_num_queries):
+    writer = activity.ActivityLogWriter(batch_size=2, flush_interval=60, max_pending=100)
+    for log in logs(count=5):
+        writer.put(log)
+
+    with django_assert_num_queries(3):
+        assert writer.flush() == 5
+
+    assert ActivityLog.objects.count() == 5
+    assert writer.flush() == 0
+
+
+@pytest.mark.django_db
+def test_a_full_buffer_is_written_by_the_caller():
+    writer = activity.ActivityLogWriter(batch_size=10, flush_interval=60, max_pending=2)
+    first, second, third = logs(count=3)
+
+    writer.put(first)
+    writer.put(second)
+    assert not ActivityLog.objects.exists()
+
+    writer.put(third)
+    assert list(ActivityLog.objects.order_by('id').values_list('action', flat=True)) == ['other 0', 'other 1']
+    assert writer.pending.qsize() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_background_thread_flushes_on_its_interval():
+    writer = activity.ActivityLogWriter(batch_size=10, flush_interval=0.05, max_pending=100)
+    writer.start()
+    try:
+        for log in logs(count=3):
+            writer.put(log)
+        deadline = time.monotonic() + 5
+        while ActivityLog.objects.count() < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert ActivityLog.objects.count() == 3
+    finally:
+        writer.close()
+    assert not writer.is_alive()
+
+
+@pytest.mark.django_db
+def test_close_stops_the_thread_and_writes_what_is_left():
+    writer = activity.ActivityLogWriter(batch_size=10, flush_interval=60, max_pending=100)
+    writer.start()
+    for log in logs(count=2):
+        writer.put(log)
+
+    started = time.monotonic()
+    writer.close()
+
+    assert time.monotonic() - started < 5
+    assert not writer.is_alive()
+    assert ActivityLog.objects.count() == 2
+
+
+@pytest.fixture
+def voted(event, make_user, client_for, django_capture_on_commit_callbacks):
+    """``event`` with one vote and one favorite from ``voter``."""
+    voter = make_user('voter')
+    client = client_for(voter)
+    candidate = event.candidates.first()
+    with django_capture_on_commit_callbacks(execute=True):
+        assert client.post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}).status_code == 200
+        assert client.post(f'/api/events/{event.id}/favorite/').status_code == 200
+    return voter
+
+
+def audit_rows(client, event):
+    response = client.get(f'/api/events/{event.id}/audit/')
+    assert response.status_code == 200
+    return {row['action_type']: row for row in response.data['results']}
+
+
+@pytest.mark.django_db
+def test_owner_sees_votes_but_not_who_cast_them(voted, event, owner, client_for):
+    rows = audit_rows(client_for(owner), event)
+
+    vote = rows['vote']
+    assert vote['candidate'] == event.candidates.first().id
+    assert (vote['user'], vote['username'], vote['ip_address']) == (None, None, None)
+    assert (rows['favorite']['user'], rows['favorite']['username']) == (voted.id, 'voter')
+
+
+@pytest.mark.django_db
+def test_staff_see_the_voters(voted, event, make_user, client_for):
+    rows = audit_rows(client_for(make_user('admin', is_staff=True)), event)
+
+    assert (rows['vote']['user'], rows['vote']['username']) == (voted.id, 'voter')
+    assert rows['vote']['ip_address'] == '127.0.0.1'
+
+
+@pytest.mark.django_db
+def test_only_the_owner_and_staff_read_an_event_audit(voted, event, client_for):
+    assert client_for(voted).get(f'/api/events/{event.id}/audit/').status_code == 403
+
+
+@pytest.mark.django_db
+def test_voters_see_their_own_votes(voted, event, client_for):
+    response = client_for(voted).get('/api/users/audit/')
+
+    assert response.status_code == 200
+    vote = next(row for row in response.data['results'] if row['action_type'] == 'vote')
+    assert (vote['user'], vote['event']) == (voted.id, event.id)
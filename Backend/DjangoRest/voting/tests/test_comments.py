@@ -0,0 +1,38 @@
+import pytest
+
+from voting.models import Comment
+
+
+@pytest.fixture
+def thread(event, owner):
+    root = Comment.objects.create(event=event, user=owner, content='Root')
+    reply = Comment.objects.create(event=event, user=owner, content='Reply', parent_comment=root)
+    other = Comment.objects.create(event=event, user=owner, content='Other root')
+    return root, reply, other
+
+
+@pytest.mark.django_db
+def test_a_reply_gets_its_path_depth_and_count(thread):
+    root, reply, _ = thread
+    root.refresh_from_db()
+    reply.refresh_from_db()
+
+    assert reply.path == f'{root.pk:010d}/{reply.pk:010d}/'
+    assert (reply.depth, root.reply_count) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_a_comment_cannot_be_moved_to_another_parent(event, owner, client_for, thread):
+    root, reply, other = thread
+    client = client_for(owner)
+    url = f'/api/events/{event.id}/comments/{reply.id}/'
+
+    moved = client.patch(url, {'parent_comment': other.id}, format='json')
+    edited = client.patch(url, {'content': 'Edited', 'parent_comment': root.id}, format='json')
+
+    assert moved.status_code == 400
+    assert 'parent_comment' in moved.data
+    assert edited.status_code == 200
+    reply.refresh_from_db()
+    assert (reply.parent_comment_id, reply.path, reply.content) == (root.id, f'{root.pk:010d}/{reply.pk:010d}/', 'Edited')
+    assert list(Comment.objects.filter(id__in=[root.id, other.id]).order_by('id').values_list('reply_count', flat=True)) == [1, 0]
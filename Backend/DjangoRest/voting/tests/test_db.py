@@ -0,0 +1,82 @@
+import pytest
+from django.db import OperationalError, transaction
+
+from voting import db
+from voting.models import Category
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The backoff delays slept, instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(db.time, 'sleep', delays.append)
+    return delays
+
+
+def locked(times):
+    """A function that finds the database locked ``times`` times, then creates a category."""
+    calls = []
+
+    def write(name):
+        calls.append(transaction.get_connection().in_atomic_block)
+        if len(calls) <= times:
+            Category.objects.create(name=f'{name} {len(calls)}')
+            raise OperationalError('database is locked')
+        return Category.objects.create(name=name)
+    write.calls = calls
+    return write
+
+
+@pytest.mark.django_db(transaction=True)
+def test_a_locked_write_is_retried_with_growing_backoff(settings, sleeps):
+    settings.DATABASE_WRITES = {'ATTEMPTS': 4, 'BASE_DELAY': 0.02, 'MAX_DELAY': 0.05}
+    write = locked(3)
+
+    category = db.run_in_transaction(write, 'Sports')
+
+    assert write.calls == [True] * 4
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps, start=1):
+        assert 0 <= delay <= min(0.05, 0.02 * 2 ** attempt)
+    # Each failed attempt was rolled back
+    assert list(Category.objects.values_list('name', flat=True)) == [category.name] == ['Sports']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_the_lock_error_is_raised_once_attempts_run_out(settings, sleeps):
+    settings.DATABASE_WRITES = {**settings.DATABASE_WRITES, 'ATTEMPTS': 3}
+    write = locked(10)
+
+    with pytest.raises(OperationalError, match='locked'):
+        db.run_in_transaction(write, 'Sports')
+
+    assert len(write.calls) == 3
+    assert len(sleeps) == 2
+    assert not Category.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_other_errors_are_not_retried(sleeps):
+    @db.write_transaction
+    def broken():
+        broken.calls += 1
+        raise OperationalError('no such table: voting_category')
+    broken.calls = 0
+
+    with pytest.raises(OperationalError, match='no such table'):
+        broken()
+
+    assert broken.calls == 1
+    assert sleeps == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_inside_an_outer_transaction_there_is_no_retry(sleeps):
+    write = locked(1)
+
+    with pytest.raises(OperationalError):
+        with transaction.atomic():
+            db.run_in_transaction(write, 'Sports')
+
+    assert len(write.calls) == 1
+    assert sleeps == []
@@ -0,0 +1,48 @@
+import pytest
+
+from voting import event_tokens
+
+
+@pytest.fixture
+def private_event(event):
+    event.is_private = True
+    event.save()
+    event_tokens.assign(event)
+    return event
+
+
+def join(client, token):
+    return client.post('/api/events/join/', {'token': token}, format='json')
+
+
+@pytest.mark.django_db
+def test_a_token_opens_the_event_without_showing_it(private_event, make_user, client_for):
+    response = join(client_for(make_user('guest')), f' {private_event.event_token.lower()} ')
+
+    assert response.status_code == 200
+    assert response.data['id'] == private_event.id
+    assert response.data['event_token'] is None
+
+
+@pytest.mark.django_db
+def test_the_owner_sees_the_token(private_event, owner, client_for):
+    response = join(client_for(owner), private_event.event_token)
+
+    assert response.data['event_token'] == private_event.event_token
+
+
+@pytest.mark.django_db
+def test_unknown_and_malformed_tokens_are_404(private_event, make_user, client_for):
+    client = client_for(make_user('guest'))
+
+    assert join(client, 'not a token').status_code == 404
+    assert join(client, '0000000000').status_code == 404
+
+
+@pytest.mark.django_db
+def test_a_token_of_an_event_deleted_elsewhere_is_forgotten(make_user, client_for):
+    # Cached here before another worker deleted the event: no signal reached this one
+    event_tokens.cache.set('ABCDEF0123', 999_999)
+
+    assert join(client_for(make_user('guest')), 'ABCDEF0123').status_code == 404
+    assert event_tokens.cache.get('ABCDEF0123') is None
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from voting.models import Vote
+
+
+@pytest.fixture
+def ballots(event, make_user):
+    candidates = list(event.candidates.order_by('id'))
+    votes = [
+        Vote.objects.create(voting_event=event, candidate=candidates[i % 3], voter=make_user(f'voter-{i}'),
+                            is_anonymous=i == 1)
+        for i in range(4)
+    ]
+    return [vote.id for vote in votes]
+
+
+def export(client, event, **headers):
+    query = headers.pop('query', '')
+    return client.get(f'/api/events/{event.id}/export/ballots/?format=ndjson{query}', **headers)
+
+
+def rows(response):
+    return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+
+@pytest.mark.django_db
+def test_full_export_names_its_snapshot(event, owner, client_for, ballots):
+    response = export(client_for(owner), event)
+
+    assert response.status_code == 200
+    assert response['Accept-Ranges'] == 'votes'
+    assert response['X-Export-Through'] == str(ballots[-1])
+    exported = rows(response)
+    assert [row['vote_id'] for row in exported] == ballots
+    # Anonymous ballots go out without the voter
+    assert exported[1]['voter_id'] is None and exported[1]['voter'] is None
+
+
+@pytest.mark.django_db
+def test_range_of_vote_ids_is_answered_with_206(event, owner, client_for, ballots):
+    response = export(client_for(owner), event, HTTP_RANGE=f'votes={ballots[1]}-{ballots[2]}')
+
+    assert response.status_code == 206
+    assert response['Content-Range'] == f'votes {ballots[1]}-{ballots[2]}/*'
+    assert [row['vote_id'] for row in rows(response)] == ballots[1:3]
+
+
+@pytest.mark.django_db
+def test_open_range_and_after_resume_from_an_id(event, owner, client_for, ballots):
+    client = client_for(owner)
+
+    open_range = export(client, event, HTTP_RANGE=f'votes={ballots[2]}-')
+    after = export(client, event, query=f'&after={ballots[1]}')
+
+    assert [row['vote_id'] for row in rows(open_range)] == ballots[2:]
+    assert open_range['Content-Range'] == f'votes {ballots[2]}-{ballots[-1]}/*'
+    assert after.status_code == 200
+    assert [row['vote_id'] for row in rows(after)] == ballots[2:]
+
+
+@pytest.mark.django_db
+def test_unsatisfiable_and_foreign_ranges(event, owner, client_for, ballots):
+    client = client_for(owner)
+
+    assert export(client, event, HTTP_RANGE=f'votes={ballots[-1] + 1}-').status_code == 416
+    assert export(client, event, HTTP_RANGE='votes=-').status_code == 416
+    # Byte ranges are ignored: the whole export is sent
+    assert export(client, event, HTTP_RANGE='bytes=0-10').status_code == 200
+    assert export(client, event, query='&after=last').status_code == 400
+
+
+@pytest.mark.django_db
+def test_only_the_owner_exports_ballots(event, make_user, client_for, ballots):
+    assert export(client_for(make_user('outsider')), event).status_code == 403
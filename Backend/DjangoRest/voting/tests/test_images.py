@@ -0,0 +1,130 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image
+from rest_framework.test import APIClient
+
+from voting import images
+
+
+def picture(color='red', size=(300, 200), image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.IMAGES = {**settings.IMAGES, 'MODE': 'sync'}
+    return settings.MEDIA_ROOT
+
+
+def stored_files(media):
+    return sorted(
+        str(path.relative_to(media)) for path in (media / 'images').rglob('*') if path.is_file()
+    )
+
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_stored_file(media, event):
+    first, second, third = event.candidates.order_by('id')
+
+    first.profile_pic.save('first.png', ContentFile(picture()))
+    second.profile_pic.save('second.png', ContentFile(picture()))
+    third.profile_pic.save('third.png', ContentFile(picture('blue')))
+
+    digest = images.content_hash(ContentFile(picture()))
+    assert first.profile_pic.name == second.profile_pic.name == f'images/{digest[:2]}/{digest}.png'
+    assert images.digest_of(third.profile_pic.name) != digest
+    originals = [name for name in stored_files(media) if name.endswith('.png')]
+    assert originals == sorted([first.profile_pic.name, third.profile_pic.name])
+
+
+@pytest.mark.django_db
+def test_store_reports_whether_it_wrote_the_file(media):
+    name, created = images.storage.store('a.png', ContentFile(picture()))
+    again, created_again = images.storage.store('b.png', ContentFile(picture()))
+
+    assert (again, created, created_again) == (name, True, False)
+    assert images.storage.find_original(images.digest_of(name)) == name
+
+
+@pytest.mark.django_db
+def test_new_pictures_get_their_variants_rendered(media):
+    name = images.storage.save('a.png', ContentFile(picture()))
+    digest = images.digest_of(name)
+
+    for variant, (mode, edge, image_format) in images.VARIANTS.items():
+        with images.storage.open(images.storage.variant_name(digest, variant), 'rb') as handle:
+            with Image.open(handle) as image:
+                assert image.format == image_format
+                assert image.size == ((edge, edge) if mode == 'fit' else (300, 200))
+
+
+@pytest.mark.django_db
+def test_background_mode_renders_in_the_pool(media, settings, monkeypatch):
+    settings.IMAGES = {**settings.IMAGES, 'MODE': 'background'}
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(images, '_executor', executor)
+
+    name = images.storage.save('a.png', ContentFile(picture()))
+    executor.shutdown(wait=True)
+
+    digest = images.digest_of(name)
+    assert all(images.storage.exists(images.storage.variant_name(digest, variant)) for variant in images.VARIANTS)
+
+
+@pytest.mark.django_db
+def test_missing_variant_is_rendered_by_the_first_request(media):
+    name, _ = images.storage.store('a.png', ContentFile(picture()))
+    digest = images.digest_of(name)
+    variant_name = images.storage.variant_name(digest, 'thumb_webp')
+    assert not images.storage.exists(variant_name)
+
+    response = APIClient().get(f'/api/images/{digest}/thumb_webp')
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'image/webp'
+    assert response['Cache-Control'] == f'public, max-age={images.get_setting("CACHE_MAX_AGE")}, immutable'
+    with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+        assert (image.format, image.size) == ('WEBP', (128, 128))
+    assert images.storage.exists(variant_name)
+    assert stored_files(media) == sorted([name, variant_name])
+
+
+@pytest.mark.django_db
+def test_variant_revalidates_by_etag(media):
+    name, _ = images.storage.store('a.png', ContentFile(picture()))
+    digest = images.digest_of(name)
+    client = APIClient()
+
+    etag = client.get(f'/api/images/{digest}/thumb')['ETag']
+    response = client.get(f'/api/images/{digest}/thumb', HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_unknown_variants_and_pictures_are_not_found(media):
+    name, _ = images.storage.store('a.png', ContentFile(picture()))
+    client = APIClient()
+
+    assert client.get(f'/api/images/{images.digest_of(name)}/huge').status_code == 404
+    assert client.get(f'/api/images/{"0" * 64}/thumb').status_code == 404
+    assert not (media / 'images' / '00').exists()
+
+
+@pytest.mark.django_db
+def test_serializers_link_the_requested_variant(media, event, owner, client_for):
+    candidate = event.candidates.order_by('id').first()
+    candidate.profile_pic.save('pic.png', ContentFile(picture()))
+    digest = images.digest_of(candidate.profile_pic.name)
+    client = client_for(owner)
+    url = f'/api/events/{event.id}/candidates/{candidate.id}/'
+
+    assert client.get(url).data['profile_pic'] == f'http://testserver/media/{candidate.profile_pic.name}'
+    assert client.get(url, {'image': 'thumb'}).data['profile_pic'] == f'http://testserver/api/images/{digest}/thumb'
+    assert client.get(url, {'image': 'huge'}).status_code == 400
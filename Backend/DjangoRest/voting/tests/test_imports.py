@@ -0,0 +1,101 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from voting import imports, images
+from voting.models import Candidate, Vote
+
+
+def png(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.IMAGES = {**settings.IMAGES, 'MODE': 'sync'}
+
+
+def put(client, event, candidates):
+    return client.put(f'/api/events/{event.id}/', {
+        'event_name': event.event_name, 'start_time': event.start_time.isoformat(),
+        'end_time': event.end_time.isoformat(), 'is_private': False, 'categories': [],
+        'candidates': candidates,
+    }, format='json')
+
+
+@pytest.mark.django_db
+def test_put_updates_listed_candidates_creates_new_ones_and_deletes_the_rest(event, client_for):
+    kept, renamed, dropped = event.candidates.order_by('id')
+
+    response = put(client_for(event.created_by), event, [
+        {'id': kept.id, 'name': kept.name},
+        {'id': renamed.id, 'name': 'Renamed', 'description': 'New text'},
+        {'name': 'Newcomer'},
+    ])
+
+    assert response.status_code == 200
+    assert list(event.candidates.order_by('id').values_list('id', 'name', 'description')) == [
+        (kept.id, kept.name, ''),
+        (renamed.id, 'Renamed', 'New text'),
+        (Candidate.objects.get(name='Newcomer').id, 'Newcomer', ''),
+    ]
+    assert not Candidate.objects.filter(id=dropped.id).exists()
+
+
+@pytest.mark.django_db
+def test_patch_without_candidates_leaves_them_alone(event, client_for):
+    before = list(event.candidates.values_list('id', 'name'))
+
+    response = client_for(event.created_by).patch(f'/api/events/{event.id}/', {'event_name': 'Renamed'}, format='json')
+
+    assert response.status_code == 200
+    assert list(event.candidates.values_list('id', 'name')) == before
+
+
+@pytest.mark.django_db
+def test_put_refuses_to_delete_voted_candidates_or_adopt_foreign_ones(event, owner, make_user, client_for):
+    first, second, third = event.candidates.order_by('id')
+    Vote.objects.create(voting_event=event, candidate=third, voter=make_user('voter'))
+    client = client_for(owner)
+
+    removing = put(client, event, [{'id': first.id, 'name': first.name}, {'id': second.id, 'name': second.name}])
+    foreign = put(client, event, [{'id': 10 ** 6, 'name': 'Elsewhere'}, {'id': third.id, 'name': third.name}])
+
+    assert removing.status_code == foreign.status_code == 400
+    assert event.candidates.count() == 3
+
+
+@pytest.mark.django_db
+def test_put_can_clear_a_candidate_picture(media, event, client_for):
+    candidates = list(event.candidates.order_by('id'))
+    candidates[0].profile_pic.save('pic.png', ContentFile(png()))
+
+    response = put(client_for(event.created_by), event, [
+        {'id': candidates[0].id, 'name': candidates[0].name, 'profile_pic': None},
+        *({'id': candidate.id, 'name': candidate.name} for candidate in candidates[1:]),
+    ])
+
+    assert response.status_code == 200
+    candidates[0].refresh_from_db()
+    assert not candidates[0].profile_pic
+
+
+@pytest.mark.django_db
+def test_sync_stores_a_new_picture_of_an_existing_candidate(media, event):
+    candidates = list(event.candidates.order_by('id'))
+    upload = SimpleUploadedFile('pic.png', png('blue'), content_type='image/png')
+
+    imports.sync_candidates(event, [
+        {'id': candidates[0].id, 'name': candidates[0].name, 'profile_pic': upload},
+        *({'id': candidate.id, 'name': candidate.name} for candidate in candidates[1:]),
+    ])
+
+    candidates[0].refresh_from_db()
+    assert images.digest_of(candidates[0].profile_pic.name)
+    assert images.storage.exists(candidates[0].profile_pic.name)
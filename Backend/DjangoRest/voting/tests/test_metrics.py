@@ -0,0 +1,75 @@
+import re
+
+import pytest
+from django.test import Client
+
+from voting import metrics
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+
+def series(text, name, **labels):
+    """The value of the sample of ``name`` with exactly ``labels``, or None."""
+    rendered = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{metrics.PREFIX}_{name}\{{{re.escape(rendered)}\}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+@pytest.mark.django_db
+def test_requests_are_counted_by_route_method_and_status(event):
+    client = Client()
+    client.get('/api/events/')
+    client.get('/api/events/')
+    client.get(f'/api/events/{event.id}/')
+    client.get('/api/events/0/')
+
+    text = client.get('/metrics').content.decode()
+
+    assert series(text, 'requests_total', route='votingevent-list', method='GET', status='200') == 2
+    assert series(text, 'requests_total', route='votingevent-detail', method='GET', status='200') == 1
+    assert series(text, 'requests_total', route='votingevent-detail', method='GET', status='404') == 1
+    assert series(text, 'db_queries_per_request_count', route='votingevent-list', method='GET') == 2
+    assert series(text, 'request_duration_seconds_bucket', route='votingevent-list', method='GET', le='+Inf') == 2
+    # /metrics does not count itself
+    assert 'route="metrics"' not in text
+
+
+@pytest.mark.django_db
+def test_view_and_render_time_are_measured_apart(event):
+    client = Client()
+    client.get(f'/api/events/{event.id}/')
+
+    text = client.get('/metrics').content.decode()
+
+    assert series(text, 'view_seconds_total', route='votingevent-detail', method='GET') > 0
+    assert series(text, 'render_seconds_total', route='votingevent-detail', method='GET') > 0
+    assert series(text, 'response_size_bytes_count', route='votingevent-detail', method='GET') == 1
+
+
+@pytest.mark.django_db
+def test_unusual_methods_share_one_label():
+    client = Client()
+    client.generic('PROPFIND', '/api/events/')
+    client.generic('BREW', '/api/events/')
+
+    text = client.get('/metrics').content.decode()
+
+    assert series(text, 'requests_total', route='votingevent-list', method='other', status='403') == 2
+    assert 'BREW' not in text and 'PROPFIND' not in text
+
+
+@pytest.mark.django_db
+def test_metrics_are_only_served_to_allowed_addresses_and_staff(make_user):
+    remote = Client(REMOTE_ADDR='203.0.113.7')
+    assert Client().get('/metrics').status_code == 200
+    assert remote.get('/metrics').status_code == 403
+
+    remote.force_login(make_user('voter'))
+    assert remote.get('/metrics').status_code == 403
+    remote.force_login(make_user('operator', is_staff=True))
+    assert remote.get('/metrics').status_code == 200
@@ -0,0 +1,62 @@
+import pytest
+
+from voting import fanout, shared_state, unread
+from voting.models import Favorite, Notification, NotificationDispatch
+
+
+def notify(user, count=1):
+    return Notification.objects.bulk_create(
+        [Notification(user=user, notification_type='vote_update', message=f'Update {i}') for i in range(count)]
+    )
+
+
+@pytest.mark.django_db
+def test_unread_count_follows_reads_and_new_notifications(make_user, client_for, django_capture_on_commit_callbacks):
+    user = make_user('reader')
+    client = client_for(user)
+    first, _ = notify(user, 2)
+    assert client.get('/api/notifications/unread_count/').data == {'unread_count': 2}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/api/notifications/mark_read/', {'ids': [first.id]}, format='json')
+    assert response.data['updated'] == 1
+    assert client.get('/api/notifications/unread_count/').data == {'unread_count': 1}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Notification.objects.create(user=user, notification_type='vote_update', message='New')
+    assert client.get('/api/notifications/unread_count/').data == {'unread_count': 2}
+
+
+@pytest.mark.django_db
+def test_invalidation_in_another_process_reaches_this_one(make_user, bump_elsewhere):
+    user = make_user('reader')
+    notify(user)
+    assert unread.get_unread_count(user.id) == 1
+    # Created by another process (bulk_create sends no signal here)
+    notify(user, 2)
+    assert unread.get_unread_count(user.id) == 1
+
+    bump_elsewhere(unread.generation_key(user.id))
+
+    assert unread.get_unread_count(user.id) == 3
+
+
+@pytest.mark.django_db
+def test_fanout_drops_the_counts_every_worker_reads(settings, event, make_user, django_capture_on_commit_callbacks):
+    fans = [make_user(f'fan-{i}') for i in range(3)]
+    Favorite.objects.bulk_create([Favorite(user=fan, event=event) for fan in fans])
+    keys = [unread.generation_key(fan.id) for fan in fans]
+    # What another worker sees: its own connection to the shared file
+    elsewhere = shared_state.SharedStore(settings.SHARED_STATE['PATH'])
+    before = elsewhere.versions(keys)
+    assert [unread.get_unread_count(fan.id) for fan in fans] == [0, 0, 0]
+    dispatch = NotificationDispatch.objects.create(
+        event=event, notification_type='event_start', scheduled_for=event.start_time,
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert fanout.run_dispatch(dispatch, chunk_size=2) == 3
+
+    after = elsewhere.versions(keys)
+    assert all(after[key] != before[key] for key in keys)
+    assert [unread.get_unread_count(fan.id) for fan in fans] == [1, 1, 1]
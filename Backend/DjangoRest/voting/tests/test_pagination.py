@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from voting.models import Notification, VotingEvent
+
+
+@pytest.fixture
+def events(owner):
+    """Seven events; the middle five share one created_at, so only the id breaks their ties."""
+    now = timezone.now()
+    created = []
+    for i in range(7):
+        event = VotingEvent.objects.create(
+            event_name=f'Event {i % 3}', created_by=owner, start_time=now, end_time=now + timedelta(hours=1),
+        )
+        created.append(event)
+    moment = now - timedelta(days=1)
+    VotingEvent.objects.filter(id__in=[event.id for event in created[1:6]]).update(created_at=moment)
+    VotingEvent.objects.filter(id=created[0].id).update(created_at=moment - timedelta(minutes=1))
+    return created
+
+
+def walk(client, url, direction='next'):
+    """Ids of every page from ``url`` onwards, one list per page."""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([row['id'] for row in response.data['results']])
+        url = response.data[direction]
+    return pages
+
+
+@pytest.mark.django_db
+def test_pages_follow_created_at_then_id_without_gaps_or_repeats(events, owner, client_for):
+    client = client_for(owner)
+    expected = [event.id for event in [events[6], *reversed(events[1:6]), events[0]]]
+
+    pages = walk(client, '/api/events/?page_size=2')
+
+    assert pages == [expected[0:2], expected[2:4], expected[4:6], expected[6:]]
+    last = client.get('/api/events/?page_size=2')
+    for _ in range(3):
+        last = client.get(last.data['next'])
+    assert last.data['next'] is None
+    # And back again from the last page
+    assert walk(client, last.data['previous'], 'previous') == pages[-2::-1]
+
+
+@pytest.mark.django_db
+def test_pages_follow_the_requested_ordering(events, owner, client_for):
+    expected = [event.id for event in sorted(events, key=lambda event: (event.event_name, event.id))]
+
+    pages = walk(client_for(owner), '/api/events/?ordering=event_name&page_size=3')
+
+    assert sum(pages, []) == expected
+
+
+@pytest.mark.django_db
+def test_rows_added_while_paging_do_not_shift_the_pages(events, owner, client_for):
+    client = client_for(owner)
+    first = client.get('/api/events/?page_size=3')
+    VotingEvent.objects.create(
+        event_name='Late', created_by=owner, start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1),
+    )
+
+    rest = walk(client, first.data['next'])
+
+    seen = [row['id'] for row in first.data['results']] + sum(rest, [])
+    assert sorted(seen) == sorted(event.id for event in events)
+
+
+@pytest.mark.django_db
+def test_a_cursor_only_fits_the_ordering_it_was_made_for(events, owner, client_for):
+    client = client_for(owner)
+    cursor = client.get('/api/events/?page_size=2').data['next'].split('cursor=')[1]
+
+    assert client.get(f'/api/events/?ordering=event_name&cursor={cursor}').status_code == 404
+    assert client.get('/api/events/?cursor=not-a-cursor').status_code == 404
+
+
+@pytest.mark.django_db
+def test_notifications_are_paged_newest_first(owner, client_for):
+    Notification.objects.bulk_create([
+        Notification(user=owner, notification_type='event_start', message=f'Message {i}') for i in range(5)
+    ])
+    expected = list(Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    assert sum(walk(client_for(owner), '/api/notifications/?page_size=2'), []) == expected
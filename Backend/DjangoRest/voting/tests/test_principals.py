@@ -0,0 +1,127 @@
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from voting import principals
+from voting.api.authentication import ProfileTokenAuthentication
+from voting.models import Profile
+
+# Session authentication comes first and sends no challenge, so failures are 403s
+REFUSED = 403
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    class Clock:
+        now = 1000.0
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(principals.time, 'monotonic', lambda: clock.now)
+    return clock
+
+
+def bearer(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return client
+
+
+@pytest.mark.django_db
+def test_a_cached_user_is_read_once_per_ttl(django_assert_num_queries, clock, make_user):
+    user = make_user('voter')
+    with django_assert_num_queries(1):
+        principals.get_user(user.id)
+    with django_assert_num_queries(0):
+        assert principals.get_user(str(user.id)).username == 'voter'
+
+    clock.advance(principals.get_setting('TTL') + 1)
+    with django_assert_num_queries(1):
+        principals.get_user(user.id)
+
+
+@pytest.mark.django_db
+def test_saving_or_deleting_the_user_or_profile_drops_the_entry(make_user):
+    user = make_user('voter')
+    principals.get_user(user.id)
+
+    user.first_name = 'Ada'
+    user.save()
+    assert principals.get_user(user.id).first_name == 'Ada'
+
+    Profile.objects.filter(user=user).update(timezone='Europe/Paris')
+    # A bulk update sends no signal, so the entry stays until the next save
+    assert str(principals.get_user(user.id).tzinfo) == 'UTC'
+    profile = Profile.objects.get(user=user)
+    profile.save()
+    assert str(principals.get_user(user.id).tzinfo) == 'Europe/Paris'
+
+    profile.delete()
+    with pytest.raises(Profile.DoesNotExist):
+        principals.get_user(user.id).profile
+    user.delete()
+    assert principals.get_user(user.id) is None
+
+
+@pytest.mark.django_db
+def test_each_request_gets_its_own_copy(make_user):
+    user = make_user('voter')
+    first = principals.get_user(user.id)
+    first.first_name = 'Changed in one request'
+    first.profile.timezone = 'Asia/Tokyo'
+
+    second = principals.get_user(user.id)
+
+    assert second is not first and second.profile is not first.profile
+    assert second.first_name == '' and second.profile.timezone == 'UTC'
+
+
+@pytest.mark.django_db
+def test_a_user_deactivated_elsewhere_is_refused_after_the_ttl(clock, make_user):
+    user = make_user('voter')
+    client = bearer(user)
+    assert client.get('/api/users/me/').status_code == 200
+
+    # As another worker would: this process gets no signal
+    User.objects.filter(id=user.id).update(is_active=False)
+    assert client.get('/api/users/me/').status_code == 200
+
+    clock.advance(principals.get_setting('TTL') + 1)
+    response = client.get('/api/users/me/')
+    assert response.status_code == REFUSED
+    assert response.data['detail'].code == 'user_inactive'
+
+
+@pytest.mark.django_db
+def test_a_user_deactivated_here_is_refused_at_once(make_user):
+    user = make_user('voter')
+    client = bearer(user)
+    assert client.get('/api/users/me/').status_code == 200
+
+    user.is_active = False
+    user.save()
+
+    assert client.get('/api/users/me/').status_code == REFUSED
+
+
+@pytest.mark.django_db
+def test_profile_token_reads_token_user_and_profile_at_once(django_assert_num_queries, make_user):
+    user = make_user('voter')
+    Profile.objects.filter(user=user).update(timezone='Europe/Paris')
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    assert client.get('/api/users/me/').status_code == 200
+
+    with django_assert_num_queries(1):
+        authenticated, _ = ProfileTokenAuthentication().authenticate_credentials(token.key)
+    assert str(authenticated.tzinfo) == 'Europe/Paris'
+
+    # Token users are not cached: deactivation applies to the next request
+    User.objects.filter(id=user.id).update(is_active=False)
+    assert client.get('/api/users/me/').status_code == REFUSED
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django_rest_passwordreset.models import ResetPasswordToken
+
+from voting import provisioning
+from voting.models import EmailAddressIndex
+
+
+def rows(*lines):
+    return provisioning.parse('username,email,password\n' + ''.join(f'{line}\n' for line in lines))
+
+
+@pytest.mark.django_db
+def test_check_reports_every_problem_by_line(make_user):
+    make_user('taken', email='taken@example.com')
+
+    errors = provisioning.check(rows(
+        'alice,alice@example.com,',
+        'alice,ALICE@example.com,',
+        'taken,new@example.com,',
+        'bob,TAKEN@example.com,',
+        ',not-an-address,',
+        'carol,carol@example.com,carol',
+    ))
+
+    assert {error['line']: sorted(error['errors']) for error in errors} == {
+        3: ['email', 'username'],
+        4: ['username'],
+        5: ['email'],
+        6: ['email', 'username'],
+        7: ['password'],
+    }
+    assert errors[0]['errors']['username'] == ['Also on line 2.']
+    assert provisioning.check(rows('dave,dave@example.com,')) == []
+
+
+@pytest.mark.django_db
+def test_voters_without_a_password_get_a_setup_token(settings):
+    settings.PROVISIONING = {**settings.PROVISIONING, 'SETUP_URL': 'https://votes.example/setup/{token}'}
+
+    progress = list(provisioning.provision(rows('alice,alice@example.com,', 'bob,bob@example.com,')))
+
+    assert progress[0] == {'stage': 'hashing', 'done': 0, 'total': 0}
+    assert progress[-1] == {'stage': 'done', 'created': 2, 'with_password': 0, 'setup_links': 2}
+    setup = progress[1:-1]
+    assert [frame['username'] for frame in setup] == ['alice', 'bob']
+    for frame in setup:
+        user = User.objects.get(username=frame['username'])
+        assert not user.has_usable_password()
+        assert ResetPasswordToken.objects.get(key=frame['token']).user == user
+        assert frame['url'] == f'https://votes.example/setup/{frame["token"]}'
+    assert EmailAddressIndex.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_a_name_taken_after_the_check_creates_nobody(make_user):
+    checked = rows('alice,alice@example.com,', 'bob,bob@example.com,')
+    assert provisioning.check(checked) == []
+    make_user('bob', email='elsewhere@example.com')
+
+    progress = list(provisioning.provision(checked))
+
+    assert progress[-1]['stage'] == 'error'
+    assert list(User.objects.values_list('username', flat=True)) == ['bob']
+
+
+@pytest.mark.django_db
+def test_any_failure_ends_the_stream_with_an_error_and_creates_nobody(monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(provisioning.EmailAddressIndex.objects, 'bulk_create', broken)
+
+    progress = list(provisioning.provision(rows('alice,alice@example.com,')))
+
+    assert progress[-1] == {'stage': 'error', 'error': 'Provisioning failed; no users were created.'}
+    assert not User.objects.exists()
+
+
+@pytest.mark.django_db
+def test_provision_endpoint_streams_progress(make_user, client_for):
+    admin = make_user('admin', is_staff=True)
+    upload = SimpleUploadedFile('voters.csv', b'username,email,password\nalice,alice@example.com,S3cure-passphrase\n'
+                                              b'bob,bob@example.com,\n')
+
+    response = client_for(admin).post('/api/users/provision/', {'file': upload}, format='multipart')
+
+    assert response.status_code == 200
+    frames = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    assert [frame['stage'] for frame in frames] == ['hashing', 'hashing', 'setup', 'done']
+    assert User.objects.get(username='alice').check_password('S3cure-passphrase')
+    assert frames[2]['username'] == 'bob'
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from voting import counters
+from voting.management.commands.bench_queries import CACHED_BUDGETS, QUERY_BUDGETS
+from voting.models import Candidate, Category, Favorite, Vote, VotingEvent
+
+
+@pytest.fixture
+def populate(owner, make_user):
+    """``size`` events of ``owner``, who favorited them all, in every status and with votes."""
+    def populate(size):
+        now = timezone.now()
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(3)])
+        events = []
+        for i in range(size):
+            start = now + timedelta(hours=i - size // 2)
+            event = VotingEvent.objects.create(
+                event_name=f'Event {i}', created_by=owner, start_time=start, end_time=start + timedelta(hours=1),
+            )
+            event.categories.set(categories[:1 + i % 3])
+            Candidate.objects.bulk_create([Candidate(voting_event=event, name=f'Candidate {j}') for j in range(size)])
+            events.append(event)
+        Favorite.objects.bulk_create([Favorite(user=owner, event=event) for event in events])
+        voter = make_user('voter')
+        candidate = events[0].candidates.first()
+        Vote.objects.create(voting_event=events[0], candidate=candidate, voter=voter)
+        counters.add_votes(candidate.id)
+        return events
+    return populate
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('size', [3, 15])
+@pytest.mark.parametrize('path', list(QUERY_BUDGETS))
+def test_event_endpoints_run_a_fixed_number_of_queries(
+    django_assert_num_queries, populate, owner, client_for, path, size,
+):
+    events = populate(size)
+    client = client_for(owner)
+    url = path.format(id=events[0].id)
+
+    with django_assert_num_queries(QUERY_BUDGETS[path]):
+        response = client.get(url)
+    assert response.status_code == 200
+
+    if path in CACHED_BUDGETS:
+        with django_assert_num_queries(CACHED_BUDGETS[path]):
+            assert client.get(url).data == response.data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('size', [3, 15])
+def test_candidate_results_run_a_fixed_number_of_queries(django_assert_num_queries, populate, owner, client_for, size):
+    event = populate(size)[0]
+
+    # The page count, the candidates and the event's vote totals
+    with django_assert_num_queries(3):
+        response = client_for(owner).get(f'/api/events/{event.id}/candidates/')
+
+    assert response.status_code == 200
+    assert sum(candidate['votes_count'] for candidate in response.data['results']) == 1
@@ -0,0 +1,151 @@
+import math
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from voting import replicas, shared_state
+from voting.models import VotingEvent
+
+
+def request_from(user, session_key=None, ip='10.0.0.1'):
+    request = RequestFactory().post('/api/events/1/vote/', REMOTE_ADDR=ip)
+    request.user = user
+    request.session = SessionStore(session_key)
+    return request
+
+
+@pytest.mark.django_db
+def test_a_write_pins_the_user_for_every_worker(settings, make_user):
+    voter, neighbour = make_user('voter'), make_user('neighbour')
+
+    replicas.pin(request_from(voter))
+
+    # Another worker: its own connection to the shared file
+    elsewhere = shared_state.SharedStore(settings.SHARED_STATE['PATH'])
+    assert elsewhere.is_pinned(replicas.pin_keys(request_from(voter, ip='10.0.0.2')))
+    # Same proxy address, another user
+    assert not elsewhere.is_pinned(replicas.pin_keys(request_from(neighbour)))
+
+
+@pytest.mark.django_db
+def test_an_anonymous_write_pins_its_session_only(make_user):
+    session = SessionStore()
+    session.create()
+
+    replicas.pin(request_from(AnonymousUser(), session.session_key))
+
+    assert replicas.is_pinned(request_from(AnonymousUser(), session.session_key))
+    assert not replicas.is_pinned(request_from(AnonymousUser()))
+    assert not replicas.is_pinned(request_from(make_user('someone')))
+
+
+def test_pins_expire_and_keep_the_longest(tmp_path):
+    store = shared_state.SharedStore(tmp_path / 'state.sqlite3')
+    store.pin(['a'], 10, now=100)
+    store.pin(['a'], 2, now=101)
+
+    assert store.is_pinned(['a', 'b'], now=109)
+    assert not store.is_pinned(['a'], now=110)
+    assert not store.is_pinned([], now=100)
+
+
+@pytest.fixture
+def lags(settings, monkeypatch):
+    """Two replicas whose lag the test sets, in seconds."""
+    settings.REPLICATION = {**settings.REPLICATION, 'REPLICAS': ['replica0', 'replica1'], 'MAX_LAG': 5}
+    lags = {'replica0': 0.0, 'replica1': 0.0}
+    monkeypatch.setattr(replicas, 'replica_lag', lags.__getitem__)
+    return lags
+
+
+def route(request, write=False, status=200):
+    """The databases the router picks for reads during ``request``, with a write in between if ``write``."""
+    router = replicas.ReplicaRouter()
+    reads = []
+
+    def view(request):
+        reads.append(router.db_for_read(VotingEvent))
+        if write:
+            assert router.db_for_write(VotingEvent) == replicas.PRIMARY
+        reads.append(router.db_for_read(VotingEvent))
+        return HttpResponse(status=status)
+
+    replicas.ReplicaRoutingMiddleware(view)(request)
+    return reads
+
+
+def get_from(user):
+    request = RequestFactory().get('/api/events/')
+    request.user = user
+    request.session = SessionStore()
+    return request
+
+
+@pytest.mark.django_db
+def test_safe_requests_read_from_one_replica(lags, make_user):
+    user = make_user('reader')
+
+    for _ in range(10):
+        first, second = route(get_from(user))
+        assert first in lags
+        assert second == first
+
+
+@pytest.mark.django_db
+def test_lagging_replicas_are_skipped(lags, make_user):
+    user = make_user('reader')
+    lags['replica0'] = 30.0
+
+    assert {database for _ in range(10) for database in route(get_from(user))} == {'replica1'}
+
+
+@pytest.mark.django_db
+def test_reads_fall_back_to_the_primary_when_every_replica_lags(lags, make_user):
+    lags.update(replica0=30.0, replica1=math.inf)
+
+    assert route(get_from(make_user('reader'))) == [replicas.PRIMARY, replicas.PRIMARY]
+
+
+@pytest.mark.django_db
+def test_writes_and_unsafe_requests_use_the_primary(lags, make_user):
+    user = make_user('writer')
+
+    assert route(get_from(user), write=True)[1] == replicas.PRIMARY
+    assert route(request_from(user)) == [replicas.PRIMARY, replicas.PRIMARY]
+    assert replicas.ReplicaRouter().db_for_read(VotingEvent) == replicas.PRIMARY
+
+
+@pytest.mark.django_db
+def test_a_successful_write_sends_the_next_reads_to_the_primary(lags, make_user):
+    writer, other = make_user('writer'), make_user('other')
+
+    route(request_from(writer), status=400)
+    assert route(get_from(writer))[0] in lags
+
+    route(request_from(writer))
+    assert route(get_from(writer)) == [replicas.PRIMARY, replicas.PRIMARY]
+    assert route(get_from(other))[0] in lags
+
+
+@pytest.mark.django_db
+def test_lag_is_read_from_the_heartbeat(settings, monkeypatch):
+    settings.REPLICATION = {**settings.REPLICATION, 'LAG_CHECK_INTERVAL': 60}
+    monkeypatch.setattr(replicas, '_lag', {})
+    monkeypatch.setattr(replicas, 'time', SimpleNamespace(time=lambda: 1000.0, monotonic=time.monotonic))
+
+    assert replicas.replica_lag('default') == math.inf
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {replicas.HEARTBEAT_TABLE} (id INTEGER PRIMARY KEY, ts REAL NOT NULL)')
+        cursor.execute(f'INSERT INTO {replicas.HEARTBEAT_TABLE} (id, ts) VALUES (1, 988.0)')
+    # Checked at most once per LAG_CHECK_INTERVAL
+    assert replicas.replica_lag('default') == math.inf
+
+    replicas._lag.clear()
+    assert replicas.replica_lag('default') == 12.0
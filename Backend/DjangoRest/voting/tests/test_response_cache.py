@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from django.test import RequestFactory
+from rest_framework.response import Response
+
+from voting import counters, replicas, response_cache, shared_state
+from voting.models import VotingEvent
+
+
+@pytest.mark.django_db
+def test_detail_is_served_from_the_cache_until_its_version_changes(
+    event, make_user, client_for, django_capture_on_commit_callbacks,
+):
+    client = client_for(make_user('reader'))
+    assert client.get(f'/api/events/{event.id}/')['X-Cache'] == 'MISS'
+    assert client.get(f'/api/events/{event.id}/')['X-Cache'] == 'HIT'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        event.event_name = 'Renamed'
+        event.save()
+    response = client.get(f'/api/events/{event.id}/')
+
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['event_name'] == 'Renamed'
+
+
+@pytest.mark.django_db
+def test_a_bump_in_another_process_reaches_this_one(event, make_user, client_for, bump_elsewhere):
+    client = client_for(make_user('reader'))
+    client.get(f'/api/events/{event.id}/')
+    client.get('/api/events/')
+    # Written by another worker: no signal runs in this process
+    VotingEvent.objects.filter(id=event.id).update(event_name='Renamed elsewhere')
+
+    bump_elsewhere(response_cache.LIST_VERSION_KEY, response_cache.event_version_key(event.id))
+    detail = client.get(f'/api/events/{event.id}/')
+    listing = client.get('/api/events/')
+
+    assert detail['X-Cache'] == listing['X-Cache'] == 'MISS'
+    assert detail.data['event_name'] == 'Renamed elsewhere'
+    assert [row['event_name'] for row in listing.data['results']] == ['Renamed elsewhere']
+
+
+@pytest.mark.django_db
+def test_unchanged_body_revalidates_with_304(event, make_user, client_for):
+    client = client_for(make_user('reader'))
+    etag = client.get(f'/api/events/{event.id}/')['ETag']
+
+    response = client.get(f'/api/events/{event.id}/', HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+
+
+def test_misses_are_built_from_the_primary(settings, event, make_user):
+    settings.REPLICATION = {**settings.REPLICATION, 'REPLICAS': ['replica']}
+    request = RequestFactory().get(f'/api/events/{event.id}/')
+    request.user = make_user('reader')
+    state = replicas.RoutingState(request, primary=False)
+    built_on_primary = []
+
+    def build():
+        built_on_primary.append(state.primary)
+        return Response({
+            'id': event.id, 'created_by': event.created_by_id, 'is_favorited': False, 'status': 'ongoing',
+            'event_token': None, 'start_time': event.start_time.isoformat(), 'end_time': event.end_time.isoformat(),
+        })
+
+    token = replicas._state.set(state)
+    try:
+        response_cache.cached_response(request, 'test-key', build, many=False)
+        response_cache.cached_response(request, 'test-key', build, many=False)
+    finally:
+        replicas._state.reset(token)
+
+    assert built_on_primary == [True]
+
+
+def test_bumps_are_counted_once_each(tmp_path):
+    store = shared_state.SharedStore(tmp_path / 'state.sqlite3')
+    assert store.versions(['a']) == {'a': 0}
+    store.bump(['a'])
+    first = store.versions(['a'])['a']
+
+    store.bump(['a', 'a', 'b'])
+
+    assert store.versions(['a', 'b'])['a'] == first + 1
+    assert store.versions(['b'])['b'] > 0
+
+
+@pytest.mark.django_db
+def test_votes_keep_the_cached_totals_and_bodies_expire_with_them(
+    monkeypatch, event, make_user, client_for, django_capture_on_commit_callbacks,
+):
+    candidate = event.candidates.first()
+    reader = client_for(make_user('reader'))
+    assert counters.get_counts(event.id)[candidate.id] == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client_for(make_user('voter')).post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}, format='json')
+    # Not summed again for every vote
+    assert counters.get_counts(event.id)[candidate.id] == 0
+    response = reader.get(f'/api/events/{event.id}/')
+    assert response['X-Cache'] == 'MISS'
+
+    later = time.time() + counters.get_setting('CACHE_TIMEOUT') + 1
+    monkeypatch.setattr(time, 'time', lambda: later)
+    response = reader.get(f'/api/events/{event.id}/')
+
+    assert response['X-Cache'] == 'MISS'
+    assert {row['id']: row['votes_count'] for row in response.data['candidates']}[candidate.id] == 1
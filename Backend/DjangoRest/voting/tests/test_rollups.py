@@ -0,0 +1,124 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from voting import rollups
+from voting.models import Vote, VoteRollup
+
+START = datetime(2026, 3, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture
+def cast(make_user):
+    """Votes for ``candidate`` cast at ``moments``, written straight to the table."""
+    voters = iter(range(10 ** 6))
+
+    def cast(candidate, *moments):
+        Vote.objects.bulk_create([
+            Vote(voting_event_id=candidate.voting_event_id, candidate=candidate,
+                 voter=make_user(f'voter-{next(voters)}'), created_at=moment)
+            for moment in moments
+        ])
+    return cast
+
+
+@pytest.mark.django_db
+def test_minutes_add_up_to_hours(event, cast):
+    first, second = event.candidates.order_by('id')[:2]
+    cast(first, START + timedelta(minutes=5, seconds=10), START + timedelta(minutes=5, seconds=20),
+         START + timedelta(minutes=5, seconds=50))
+    cast(second, START + timedelta(minutes=5, seconds=50), *[START + timedelta(hours=1, minutes=59)] * 4)
+
+    assert rollups.catch_up() == 8
+
+    assert rollups.timeline(event.id, 'minute') == [
+        (START + timedelta(minutes=5), {first.id: 3, second.id: 1}),
+        (START + timedelta(hours=1, minutes=59), {second.id: 4}),
+    ]
+    assert rollups.timeline(event.id, 'hour') == [
+        (START, {first.id: 3, second.id: 1}),
+        (START + timedelta(hours=1), {second.id: 4}),
+    ]
+    assert rollups.timeline(event.id, 'hour', start=START + timedelta(hours=1)) == [
+        (START + timedelta(hours=1), {second.id: 4}),
+    ]
+
+
+@pytest.mark.django_db
+def test_days_begin_in_the_given_time_zone(event, cast):
+    # 03:00 UTC is still the evening before in New York
+    cast(event.candidates.first(), datetime(2026, 3, 2, 3, 0, tzinfo=dt_timezone.utc))
+    rollups.catch_up()
+
+    [(day, _)] = rollups.timeline(event.id, 'day', tzinfo=ZoneInfo('America/New_York'))
+
+    assert day == datetime(2026, 3, 1, tzinfo=ZoneInfo('America/New_York'))
+
+
+@pytest.mark.django_db
+def test_catch_up_counts_each_vote_once_in_any_order(event, cast):
+    candidate = event.candidates.first()
+    cast(candidate, START + timedelta(minutes=1, seconds=5))
+    assert rollups.catch_up(batch_size=1) == 1
+    # A queued ballot accepted earlier, written later, into minutes already rolled up
+    cast(candidate, START + timedelta(seconds=30), START + timedelta(minutes=1, seconds=40))
+
+    assert rollups.catch_up(batch_size=1) == 2
+    assert rollups.catch_up() == 0
+
+    assert rollups.timeline(event.id, 'minute') == [
+        (START, {candidate.id: 1}),
+        (START + timedelta(minutes=1), {candidate.id: 2}),
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_matches_the_votes(event, cast):
+    candidates = list(event.candidates.order_by('id'))
+    for i in range(4):
+        cast(candidates[i % 2], START + timedelta(seconds=30 * i))
+    VoteRollup.objects.create(event=event, candidate=candidates[2], bucket=START, count=7)
+
+    rollups.rebuild([event.id])
+
+    assert rollups.timeline(event.id, 'minute') == [
+        (START, {candidates[0].id: 1, candidates[1].id: 1}),
+        (START + timedelta(minutes=1), {candidates[0].id: 1, candidates[1].id: 1}),
+    ]
+
+
+@pytest.mark.django_db
+def test_a_vote_lands_in_the_timeline_once_rolled_up(event, make_user, client_for):
+    candidate = event.candidates.first()
+    client = client_for(make_user('voter'))
+    client.post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}, format='json')
+    # Voting itself leaves the rollup rows alone
+    assert not VoteRollup.objects.exists()
+
+    rollups.catch_up()
+    response = client.get(f'/api/events/{event.id}/timeline/', {'resolution': 'minute'})
+
+    assert response.status_code == 200
+    [bucket] = response.data['buckets']
+    assert bucket['votes'] == 1 and bucket['candidates'] == {candidate.id: 1}
+    assert VoteRollup.objects.get(event=event).count == 1
+    assert client.get(f'/api/events/{event.id}/timeline/', {'resolution': 'week'}).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_votes_are_rolled_up_in_the_background(settings, event, make_user, client_for):
+    settings.VOTE_ROLLUPS = {**settings.VOTE_ROLLUPS, 'AUTO': True, 'INTERVAL': 0.05}
+    candidate = event.candidates.first()
+    client_for(make_user('voter')).post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}, format='json')
+    updater = rollups.ensure_updater()
+    try:
+        deadline = time.monotonic() + 5
+        while not VoteRollup.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        updater.stop()
+        updater.join()
+
+    assert VoteRollup.objects.get(candidate=candidate).count == 1
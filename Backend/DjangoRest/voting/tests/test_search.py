@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from voting import search
+from voting.models import Candidate, Category, VotingEvent
+
+
+@pytest.fixture
+def events(owner):
+    """Events that mention "river" in different fields, plus one that does not."""
+    now = timezone.now()
+
+    def create(name, candidates=(), categories=()):
+        event = VotingEvent.objects.create(
+            event_name=name, created_by=owner, start_time=now, end_time=now + timedelta(hours=1),
+        )
+        for candidate_name, description in candidates:
+            Candidate.objects.create(voting_event=event, name=candidate_name, description=description)
+        for category in categories:
+            event.categories.add(Category.objects.get_or_create(name=category)[0])
+        return event
+
+    return {
+        'description': create('Town poll', [('Ada', 'Lives by the river')]),
+        'name': create('River cleanup vote', [('Bo', 'Volunteer')]),
+        'category': create('Park poll', categories=['Riverside']),
+        'unrelated': create('Library hours', [('Cy', 'Librarian')]),
+    }
+
+
+def search_ids(client, text, **params):
+    response = client.get('/api/events/', {'search': text, **params})
+    assert response.status_code == 200
+    return [row['id'] for row in response.data['results']]
+
+
+@pytest.mark.django_db
+def test_results_are_ranked_by_the_field_that_matched(events, owner, client_for):
+    assert search.is_available()
+
+    ids = search_ids(client_for(owner), 'river')
+
+    # A hit in the event name outranks a category hit, which outranks a description hit
+    assert ids == [events['name'].id, events['category'].id, events['description'].id]
+
+
+@pytest.mark.django_db
+def test_words_match_as_prefixes_and_must_all_match(events, owner, client_for):
+    client = client_for(owner)
+
+    assert search_ids(client, 'clean riv') == [events['name'].id]
+    assert search_ids(client, 'river library') == []
+
+
+@pytest.mark.django_db
+def test_fts_syntax_in_the_input_is_matched_literally(events, owner, client_for):
+    client = client_for(owner)
+
+    assert search_ids(client, 'Library" OR "river') == []
+    assert search_ids(client, '(river)*') == [events['name'].id, events['category'].id, events['description'].id]
+    assert search_ids(client, '***') == []
+
+
+@pytest.mark.django_db
+def test_explicit_ordering_overrides_the_rank(events, owner, client_for):
+    ids = search_ids(client_for(owner), 'river', ordering='event_name')
+
+    assert ids == [events['category'].id, events['name'].id, events['description'].id]
+
+
+@pytest.mark.django_db
+def test_index_follows_changes_to_candidates_and_categories(events, owner, client_for):
+    client = client_for(owner)
+    unrelated = events['unrelated']
+
+    Candidate.objects.create(voting_event=unrelated, name='Dee', description='Rowing on the river')
+    assert unrelated.id in search_ids(client, 'rowing')
+
+    Category.objects.filter(name='Riverside').update(name='Meadow')
+    category = Category.objects.get(name='Meadow')
+    category.save()
+    assert search_ids(client, 'riverside') == []
+    assert search_ids(client, 'meadow') == [events['category'].id]
+
+    events['name'].delete()
+    assert events['name'].id not in search_ids(client, 'river')
+
+
+@pytest.mark.django_db
+def test_without_fts_search_falls_back_to_icontains(events, owner, client_for, monkeypatch):
+    monkeypatch.setattr(search, 'is_available', lambda using='default': False)
+
+    queryset = search.search_events(VotingEvent.objects.all(), 'river')
+    assert 'voting_event_search' not in str(queryset.query)
+    assert {event.search_rank for event in queryset} == {0.0}
+
+    client = client_for(owner)
+    assert sorted(search_ids(client, 'river')) == sorted(
+        events[field].id for field in ('name', 'category', 'description')
+    )
+    assert search_ids(client, 'lives river') == [events['description'].id]
+    assert search_ids(client, 'river library') == []
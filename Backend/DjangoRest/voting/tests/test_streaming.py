@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from asgiref.sync import sync_to_async
+
+from voting import streaming
+
+
+@pytest.fixture
+def hub(settings, monkeypatch):
+    settings.RESULTS_STREAM = {**settings.RESULTS_STREAM, 'BROKER': 'local', 'COALESCE_INTERVAL': 0.01,
+                               'HEARTBEAT_INTERVAL': 5}
+    monkeypatch.setattr(streaming, '_hub', None)
+    return streaming.get_hub()
+
+
+def test_deltas_the_snapshot_includes_are_dropped(hub):
+    async def run():
+        subscription = hub.subscribe(7)
+        hub.publish(7, {1: 1}, through=10)
+        hub.publish(7, {2: 1}, through=11)
+        await asyncio.sleep(0.05)
+        subscription.start(10)
+        hub.publish(7, {1: 1}, through=12)
+        await asyncio.sleep(0.05)
+        return await subscription.next_frame(1)
+
+    assert asyncio.run(run()) == {'1': 1, '2': 1}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_a_vote_committed_while_subscribing_is_counted_once(hub, monkeypatch, event, make_user, client_for):
+    first, second = make_user('first'), make_user('second')
+    early, late = event.candidates.order_by('id')[:2]
+    read_snapshot = streaming.current_counts
+
+    def vote(user, candidate):
+        return client_for(user).post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}, format='json')
+
+    def vote_then_read_snapshot(event_id):
+        # Commits (and publishes) after subscribe(), before the snapshot is read
+        assert vote(first, early).status_code == 200
+        return read_snapshot(event_id)
+
+    monkeypatch.setattr(streaming, 'current_counts', vote_then_read_snapshot)
+
+    async def run():
+        frames = streaming.result_frames(event.id)
+        try:
+            snapshot = await anext(frames)
+            await asyncio.sleep(0.05)
+            assert (await sync_to_async(vote)(second, late)).status_code == 200
+            delta = await anext(frames)
+        finally:
+            await frames.aclose()
+        return snapshot, delta
+
+    (_, snapshot), (_, delta) = asyncio.run(run())
+
+    assert snapshot['candidates'] == {str(early.id): 1, str(late.id): 0, **{
+        str(candidate.id): 0 for candidate in event.candidates.exclude(id__in=[early.id, late.id])
+    }}
+    assert delta['candidates'] == {str(late.id): 1}
+    assert hub.subscriber_count(event.id) == 0
+
+
+def test_broker_rows_carry_the_vote_id(tmp_path, hub):
+    broker = streaming.SQLiteBroker(tmp_path / 'broker.sqlite3', hub)
+    broker.publish(7, {3: 2}, through=42)
+
+    row = broker._connection().execute('SELECT event_id, payload FROM deltas').fetchone()
+    assert row == (7, '{"through": 42, "candidates": {"3": 2}}')
@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import time
+import types
+
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from voting import ratelimit
+from voting.api.throttles import ActionRateThrottle, AnonDailyThrottle, JoinTokenThrottle
+from voting.ratelimit import BucketStore
+
+
+def test_a_take_that_waited_for_the_lock_gets_its_token(tmp_path):
+    store = BucketStore(tmp_path / 'buckets.sqlite3')
+    for _ in range(2):
+        assert store.take('vote', '1', 3, 3 / 60, now=100.0)[0]
+
+    # Stamped just before a take that got the lock first
+    allowed, _ = store.take('vote', '1', 3, 3 / 60, now=99.9)
+
+    assert allowed
+    assert not store.take('vote', '1', 3, 3 / 60, now=100.0)[0]
+
+
+def test_take_reads_the_clock_once_it_holds_the_lock(tmp_path, monkeypatch):
+    path = tmp_path / 'buckets.sqlite3'
+    store = BucketStore(path)
+    store.take('vote', '1', 3, 3 / 60)
+    released = threading.Event()
+    readings = []
+
+    def clock():
+        readings.append(released.is_set())
+        return time.time()
+
+    monkeypatch.setattr(ratelimit, 'time', types.SimpleNamespace(time=clock))
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')
+    taker = threading.Thread(target=store.take, args=('vote', '1', 3, 3 / 60))
+    taker.start()
+    time.sleep(0.2)
+    released.set()
+    other.execute('COMMIT')
+    taker.join()
+
+    assert readings == [True]
+
+
+def anonymous_request(**meta):
+    request = Request(APIRequestFactory().get('/', **meta))
+    request.user = AnonymousUser()
+    return request
+
+
+def test_anonymous_clients_cannot_choose_their_key(settings):
+    request = anonymous_request(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9')
+
+    assert AnonDailyThrottle().get_cache_key(request, None) == '10.0.0.1'
+    assert JoinTokenThrottle().get_cache_key(request, None) == '10.0.0.1'
+
+    # Behind one proxy, the address it appended is the client's
+    settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+    assert AnonDailyThrottle().get_cache_key(request, None) == '203.0.113.9'
+
+
+def test_action_throttle_takes_its_rate_from_the_request(settings):
+    throttle = ActionRateThrottle()
+    assert throttle.rate is None
+
+    view = types.SimpleNamespace(action='vote', throttle_scopes={'vote': 'vote'})
+    assert throttle.allow_request(anonymous_request(REMOTE_ADDR='10.0.0.1'), view)
+    assert (throttle.scope, throttle.rate) == ('anon_vote', '1/min')
+    assert not throttle.allow_request(anonymous_request(REMOTE_ADDR='10.0.0.1'), view)
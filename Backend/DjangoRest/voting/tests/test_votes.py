@@ -0,0 +1,267 @@
+import threading
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections, connections
+from django.utils import timezone
+
+from voting import counters, ingest, rollups
+from voting.models import Candidate, IdempotencyKey, Vote, VoteRollup
+
+
+def vote(client, event, candidate, key=None):
+    headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+    return client.post(f'/api/events/{event.id}/vote/', {'candidate': candidate.id}, format='json', **headers)
+
+
+@pytest.mark.django_db
+def test_vote_is_counted(event, make_user, client_for):
+    candidate = event.candidates.first()
+    response = vote(client_for(make_user('voter')), event, candidate)
+
+    assert response.status_code == 200
+    assert Vote.objects.filter(voting_event=event, candidate=candidate).count() == 1
+    assert counters.get_counts(event.id, use_cache=False)[candidate.id] == 1
+
+
+@pytest.mark.django_db
+def test_second_vote_is_refused(event, make_user, client_for):
+    client = client_for(make_user('voter'))
+    first, second = event.candidates.all()[:2]
+    vote(client, event, first)
+
+    response = vote(client, event, second)
+
+    assert response.status_code == 400
+    assert Vote.objects.filter(voting_event=event).count() == 1
+    assert sum(counters.get_counts(event.id, use_cache=False).values()) == 1
+
+
+@pytest.mark.django_db
+def test_retry_with_idempotency_key_replays_the_response(event, make_user, client_for):
+    client = client_for(make_user('voter'))
+    candidate = event.candidates.first()
+    first = vote(client, event, candidate, key='ballot-1')
+
+    retry = vote(client, event, candidate, key='ballot-1')
+
+    assert retry.status_code == first.status_code == 200
+    assert retry.data == first.data
+    assert retry['Idempotency-Replayed'] == 'true'
+    assert Vote.objects.filter(voting_event=event).count() == 1
+    assert sum(counters.get_counts(event.id, use_cache=False).values()) == 1
+
+
+@pytest.mark.django_db
+def test_idempotency_key_reused_for_another_request_is_422(event, make_user, client_for):
+    client = client_for(make_user('voter'))
+    first, second = event.candidates.all()[:2]
+    vote(client, event, first, key='ballot-1')
+
+    response = vote(client, event, second, key='ballot-1')
+
+    assert response.status_code == 422
+    assert list(Vote.objects.filter(voting_event=event).values_list('candidate_id', flat=True)) == [first.id]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_votes_are_counted_exactly(event, client_for):
+    """Every voter sends their ballot from several threads at once; each is counted once."""
+    User.objects.bulk_create([User(username=f'voter-{i}') for i in range(12)])
+    voters = list(User.objects.filter(username__startswith='voter-').order_by('id'))
+    candidates = list(event.candidates.order_by('id'))
+    copies = 3
+    barrier = threading.Barrier(len(voters) * copies)
+    statuses = Counter()
+    lock = threading.Lock()
+    connections.close_all()
+
+    def send(user, with_key):
+        client = client_for(user)
+        barrier.wait()
+        try:
+            response = vote(client, event, candidates[user.id % len(candidates)],
+                            key=f'ballot-{user.id}' if with_key else None)
+            with lock:
+                statuses[response.status_code, response.get('Idempotency-Replayed') == 'true'] += 1
+        finally:
+            close_old_connections()
+            connections.close_all()
+
+    # Half of the voters retry with an Idempotency-Key, the others without
+    threads = [
+        threading.Thread(target=send, args=(user, index % 2 == 0))
+        for index, user in enumerate(voters) for _ in range(copies)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = Counter(candidates[user.id % len(candidates)].id for user in voters)
+    assert Counter(Vote.objects.filter(voting_event=event).values_list('candidate_id', flat=True)) == expected
+    assert counters.get_counts(event.id, use_cache=False) == {candidate.id: expected[candidate.id]
+                                                              for candidate in candidates}
+    keyed = len(voters) // 2
+    assert IdempotencyKey.objects.count() == keyed
+    assert statuses == {
+        (200, False): len(voters),
+        (200, True): keyed * (copies - 1),
+        (400, False): (len(voters) - keyed) * (copies - 1),
+    }
+
+
+@pytest.mark.django_db
+def test_queue_refuses_a_second_ballot_from_the_same_voter(event, make_user):
+    voter = make_user('voter')
+    first, second = event.candidates.all()[:2]
+    queue = ingest.get_queue()
+
+    assert queue.put(event.id, first.id, voter.id) is not None
+    assert queue.put(event.id, second.id, voter.id) is None
+    assert len(queue) == 1
+
+
+@pytest.mark.django_db
+def test_drain_rejects_ballots_of_voters_who_already_voted(event, make_user, client_for):
+    early, late = make_user('early'), make_user('late')
+    candidate = event.candidates.first()
+    vote(client_for(early), event, candidate)
+    queue = ingest.get_queue()
+    queue.put(event.id, candidate.id, early.id)
+    queue.put(event.id, candidate.id, late.id)
+
+    applied, rejected = ingest.drain(queue)
+
+    assert (applied, rejected) == (1, 1)
+    assert len(queue) == 0
+    assert sorted(Vote.objects.filter(voting_event=event).values_list('voter_id', flat=True)) == [early.id, late.id]
+    assert counters.get_counts(event.id, use_cache=False)[candidate.id] == 2
+
+
+@pytest.mark.django_db
+def test_queued_vote_endpoint_answers_202_then_refuses_duplicates(settings, event, make_user, client_for):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    client = client_for(make_user('voter'))
+    first, second = event.candidates.all()[:2]
+
+    assert vote(client, event, first).status_code == 202
+    assert vote(client, event, second).status_code == 400
+    ingest.drain(ingest.get_queue())
+    assert vote(client, event, second).status_code == 400
+    assert Vote.objects.filter(voting_event=event).count() == 1
+
+
+@pytest.mark.django_db
+def test_queued_vote_does_not_read_the_database(settings, django_assert_num_queries, event, make_user, client_for):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    client = client_for(make_user('voter'))
+    candidate = event.candidates.first()
+
+    with django_assert_num_queries(0):
+        response = vote(client, event, candidate)
+
+    assert response.status_code == 202
+
+
+@pytest.mark.django_db
+def test_ticket_reports_an_applied_ballot(settings, event, make_user, client_for):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    client = client_for(make_user('voter'))
+    response = vote(client, event, event.candidates.first())
+
+    assert client.get(response.data['ticket_url']).data == {'ticket': response.data['ticket'], 'status': 'queued'}
+    ingest.drain(ingest.get_queue())
+    assert client.get(response.data['ticket_url']).data == {'ticket': response.data['ticket'], 'status': 'applied'}
+
+
+@pytest.mark.django_db
+def test_ticket_reports_a_rejected_ballot_and_the_voter_can_vote_again(settings, event, make_user, client_for):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    client = client_for(make_user('voter'))
+    rejected = vote(client, event, Candidate(id=10 ** 6))
+    assert rejected.status_code == 202
+
+    ingest.drain(ingest.get_queue())
+
+    assert client.get(rejected.data['ticket_url']).data == {
+        'ticket': rejected.data['ticket'], 'status': 'rejected', 'reason': 'Invalid candidate',
+    }
+    assert vote(client, event, event.candidates.first()).status_code == 202
+    assert ingest.drain(ingest.get_queue()) == (1, 0)
+    assert Vote.objects.filter(voting_event=event).count() == 1
+
+
+@pytest.mark.django_db
+def test_only_the_voter_sees_a_ticket(settings, event, make_user, client_for):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    response = vote(client_for(make_user('voter')), event, event.candidates.first())
+
+    assert client_for(make_user('other')).get(response.data['ticket_url']).status_code == 404
+    assert client_for(event.created_by).get(response.data['ticket_url']).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_a_ballot_the_database_refuses_is_buried_and_the_rest_applied(event, make_user):
+    gone, kept = make_user('gone'), make_user('kept')
+    candidate = event.candidates.first()
+    queue = ingest.get_queue()
+    queue.put(event.id, candidate.id, gone.id)
+    queue.put(event.id, candidate.id, kept.id)
+    # Deleted after voting: the foreign key fails when the batch commits
+    User.objects.filter(id=gone.id).delete()
+
+    applied, rejected = ingest.drain(queue)
+
+    assert (applied, rejected) == (1, 1)
+    assert len(queue) == 0
+    assert queue.dead_count() == 1
+    assert list(Vote.objects.filter(voting_event=event).values_list('voter_id', flat=True)) == [kept.id]
+    assert counters.get_counts(event.id, use_cache=False)[candidate.id] == 1
+
+
+@pytest.mark.django_db
+def test_drained_votes_are_dated_when_they_were_accepted(event, make_user):
+    voter = make_user('voter')
+    candidate = event.candidates.first()
+    queue = ingest.get_queue()
+    queue.put(event.id, candidate.id, voter.id)
+    accepted = timezone.now() - timedelta(minutes=5)
+    # As if the drainer only got to it five minutes later
+    queue._connection().execute('UPDATE ballots SET accepted_at = ?', (accepted.timestamp(),))
+
+    ingest.drain(queue)
+    rollups.catch_up()
+
+    vote = Vote.objects.get(voting_event=event)
+    assert abs(vote.created_at - accepted) < timedelta(milliseconds=1)
+    assert list(VoteRollup.objects.filter(event=event).values_list('bucket', 'count')) == [
+        (rollups.bucket_for(vote.created_at), 1),
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_queued_vote_retried_on_a_locked_database_keeps_its_ticket(
+    settings, monkeypatch, event, make_user, client_for,
+):
+    settings.VOTE_INGESTION = {**settings.VOTE_INGESTION, 'MODE': 'queued'}
+    client = client_for(make_user('voter'))
+    create = IdempotencyKey.objects.create
+    attempts = []
+
+    def locked_once(**fields):
+        attempts.append(fields['key'])
+        if len(attempts) == 1:
+            raise OperationalError('database is locked')
+        return create(**fields)
+
+    monkeypatch.setattr(IdempotencyKey.objects, 'create', locked_once)
+
+    response = vote(client, event, event.candidates.first(), key='ballot-1')
+
+    assert len(attempts) == 2
+    assert response.status_code == 202
+    assert len(ingest.get_queue()) == 1
+    assert response.data['ticket'] == IdempotencyKey.objects.get().response_body['ticket']
@@ -0,0 +1,56 @@
+"""
+Cached unread-notification counts.
+
+A user's count is cached under their generation, a version shared by every
+worker process (voting.shared_state); any change to their notifications
+bumps it after commit, in whichever process made the change. A count
+computed before a write committed is therefore only ever stored under a
+generation that no later reader looks up, so concurrent creates and reads
+cannot leave a stale badge behind, whichever worker serves them. The counts
+themselves stay in each worker's local cache. Invalidating many users (a
+fan-out chunk) is one transaction on the shared store.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import shared_state
+from .models import Notification
+
+DEFAULTS = {
+    'TIMEOUT': 300,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'UNREAD_COUNTS', {}).get(name, DEFAULTS[name])
+
+
+def generation_key(user_id):
+    return f'unread-generation:{user_id}'
+
+
+def get_unread_count(user_id):
+    key = generation_key(user_id)
+    generation = shared_state.get_store().versions([key])[key]
+    count_key = f'unread-count:{user_id}:{generation}'
+    count = cache.get(count_key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(count_key, count, get_setting('TIMEOUT'))
+    return count
+
+
+def invalidate(user_ids):
+    """Drop the cached counts of ``user_ids`` once the current transaction commits."""
+    keys = [generation_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: shared_state.get_store().bump(keys))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_user(sender, instance, **kwargs):
+    invalidate([instance.user_id])
@@ -18,6 +18,7 @@ import {
   FaRedo,
   FaRegClock
 } from "react-icons/fa";
+import api from "../utils/api";
 
 // Mock data interfaces
 interface Candidate {
@@ -161,38 +162,31 @@ export const VoteResultComponent = ({ darkMode }: { darkMode: boolean }) => {
     return Math.max(0, Math.min(100, Math.floor((elapsed / totalDuration) * 100)));
   };
 
-  // Simulating live updates with setInterval
+  // Live updates pushed by the results stream (served by the ASGI app)
   useEffect(() => {
-    const interval = setInterval(() => {
-      // In a real app, you would fetch updated data from an API here
-      if (event.status === "ongoing") {
-        // Simulate a new vote
-        if (Math.random() > 0.7) {
-          const candidateIndex = Math.floor(Math.random() * event.candidates.length);
-          const updatedCandidates = [...event.candidates];
-          updatedCandidates[candidateIndex].votes += 1;
-          
-          const newVoter = {
-            id: event.recentVotes.length + 1,
-            voter: `Anonymous Voter ${Math.floor(Math.random() * 1000)}`,
-            candidate: updatedCandidates[candidateIndex].name,
-            time: "Just now",
-            avatar: `https://i.pravatar.cc/150?img=${Math.floor(Math.random() * 70)}`
-          };
-          
-          setEvent(prev => ({
-            ...prev,
-            totalVotes: prev.totalVotes + 1,
-            uniqueVoters: prev.uniqueVoters + (Math.random() > 0.3 ? 1 : 0),
-            candidates: updatedCandidates,
-            recentVotes: [newVoter, ...prev.recentVotes.slice(0, 5)]
-          }));
-        }
-      }
-    }, 5000);
+    if (event.status !== "ongoing") return;
+
+    const source = new EventSource(`${api.defaults.baseURL}events/${event.id}/results/stream/`);
+
+    const applyCounts = (counts: Record<string, number>, isDelta: boolean) => {
+      setEvent(prev => {
+        let added = 0;
+        const updatedCandidates = prev.candidates.map(candidate => {
+          const value = counts[String(candidate.id)];
+          if (value === undefined) return candidate;
+          const votes = isDelta ? candidate.votes + value : value;
+          added += votes - candidate.votes;
+          return { ...candidate, votes };
+        });
+        return { ...prev, totalVotes: prev.totalVotes + added, candidates: updatedCandidates };
+      });
+    };
+
+    source.addEventListener("snapshot", e => applyCounts(JSON.parse((e as MessageEvent).data).candidates, false));
+    source.addEventListener("delta", e => applyCounts(JSON.parse((e as MessageEvent).data).candidates, true));
 
-    return () => clearInterval(interval);
-  }, [event]);
+    return () => source.close();
+  }, [event.id, event.status]);
 
   const timeStatus = calculateTimeStatus();
   const progressPercentage = calculateProgress();